@@ -0,0 +1,149 @@
+'''
+Headless capture program
+
+This program:
+- Runs an experiment without the GUI from a settings file saved by capture.py (File -> Save / Save As)
+- Checks the settings and runs the stages in the same way as capture.py (see experiment.py)
+- Prints the progress and writes it to a JSON lines log file (one event per line, --log)
+- Can run with the simulated camera, lamps and scale of simulation.py (--simulate) on any computer,
+  faster than real time (--time-scale)
+- Logs the time spent in every hardware operation at the end (see hardware.Timings)
+- Stops the current capture series and the experiment on Ctrl+C (or when the SSH session is closed)
+
+Usage:
+    python capture_cli.py capture_settings.json output_dir [--log progress.jsonl]
+                          [--simulate [--time-scale 0.0] [--latency 0.02]]
+
+Purpose:
+- Starts experiments over SSH without a display and without loading the GUI
+- Allows the capture sequence to be tested without the Raspberry Pi hardware
+
+2026-10
+'''
+
+import argparse, json, os, signal, sys, time, threading
+from experiment import ExperimentRunner, parse_settings
+from hardware import open_hardware
+
+
+# Status descriptions (same as the GUI)
+CAPTURE_STATUS = {
+    "scale": "Scaling the sample...",
+    "init_camera": "Initializing camera...",
+    "led_capture": "Capturing LED images",
+    "noise_capture": "Capturing noise images...",
+    "preheat_lamp": "Preheating the lamp...",
+    "image_capture": "Capturing illuminated images...",
+    "idle": "Idle...",
+    "paused": "Paused (the next stage waits until resumed)",
+    "aborted": "Experiment aborted",
+    "complete": "Experiment completed",
+}
+LOG_NAME = "capture_log.jsonl"   # Default log file (saved inside the output directory)
+
+
+# Print the progress of the experiment and append it to the log file as JSON lines
+class ProgressLog:
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+        self.max_queue_depth = 0
+
+    def event(self, name, message=None, **fields):
+        line = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+            "elapsed_s": round(time.monotonic() - self.start, 3),
+            "event": name,
+            **fields
+        }
+        with self.lock:
+            if message:
+                print(f"[{line['elapsed_s']:9.1f} s] {message}", flush=True)
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(line) + "\n")
+
+    def status(self, status_key):
+        self.event("status", CAPTURE_STATUS.get(status_key, status_key), status=status_key)
+
+    def progress(self, done_stages, total_stages):
+        self.event("progress", f"Stages done: {done_stages} / {total_stages}", done=done_stages, total=total_stages)
+
+    def late(self, stage, late):
+        self.event("late_start", f"Stage {stage} started {late:.1f} s late", stage=stage, late_s=round(late, 3))
+
+    # Only the maximum is logged (the depth changes with every frame)
+    def queue_depth(self, depth):
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a capture experiment without the GUI.")
+    parser.add_argument("settings", help="settings JSON file saved by capture.py")
+    parser.add_argument("output_dir", help="capture result directory")
+    parser.add_argument("--log", help=f"JSON lines progress log (default: output_dir/{LOG_NAME})")
+    parser.add_argument("--simulate", action="store_true", help="use the simulated camera, lamps and scale")
+    parser.add_argument("--time-scale", type=float, default=0.0,
+                        help="real duration of the simulated waits (0 = no waiting, 1 = real time)")
+    parser.add_argument("--latency", type=float, default=0.02, help="frame latency of the simulated camera [s]")
+    args = parser.parse_args(argv)
+
+    with open(args.settings, "r") as json_file:
+        capture_settings = json.load(json_file)
+
+    try:
+        settings = parse_settings(capture_settings, args.output_dir)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    os.makedirs(settings["save_dir"], exist_ok=True)
+    log = ProgressLog(args.log or os.path.join(settings["save_dir"], LOG_NAME))
+
+    # The hardware modules are only imported here, so --simulate works without them
+    if args.simulate:
+        hardware = open_hardware(simulate=True, time_scale=args.time_scale, latency=args.latency)
+    else:
+        hardware = open_hardware()
+    runner = ExperimentRunner(settings, hardware, hardware.camera(), on_status=log.status, on_progress=log.progress,
+                              on_late=log.late, on_queue_depth=log.queue_depth)
+
+    log.event("start", f"Experiment: {len(settings['stages'])} stage(s), shutter speeds {settings['shutter_list']} "
+                       f"[µs], output {settings['save_dir']}",
+              settings=args.settings, save_dir=settings["save_dir"], stages=settings["stages"],
+              shutter_list=settings["shutter_list"], simulate=args.simulate)
+
+    # Stop the experiment on Ctrl+C, kill or a closed SSH session
+    def stop(signum, frame):
+        log.event("signal", f"Signal {signum} received, aborting...", signal=signum)
+        runner.abort()
+
+    for signum in (signal.SIGINT, signal.SIGTERM, getattr(signal, "SIGHUP", None)):
+        if signum is not None:
+            signal.signal(signum, stop)
+
+    # The experiment runs in a worker thread, so the main thread can handle signals while it waits
+    errors = []
+
+    def run():
+        try:
+            runner.run()
+        except Exception as e:
+            errors.append(e)
+            log.event("error", f"Error: {e}", error=repr(e))
+
+    start = time.monotonic()
+    thread = threading.Thread(target=run)
+    thread.start()
+    while thread.is_alive():
+        thread.join(0.5)
+
+    log.event("finish", f"Finished after {(time.monotonic() - start) / 60:.1f} minutes",
+              aborted=runner.aborted, error=bool(errors), duration_s=round(time.monotonic() - start, 3),
+              max_queue_depth=log.max_queue_depth, timings=hardware.timings.summary())
+    return 1 if runner.aborted or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+'''
+DNG writer
+
+This module:
+- Writes uncompressed single-strip Bayer (RGGB) DNG files with 16-bit samples, readable with rawpy
+- Is used by the simulated camera (simulation.py) and by Other Programs/synthetic_experiment.py
+
+2026-10
+'''
+
+import struct
+import numpy as np
+
+
+# Write a RAW frame (uint16 Bayer RGGB mosaic) with its black and white level and the camera names
+def write_dng(path, raw, black_level, white_level, make, model):
+    raw = np.ascontiguousarray(raw, dtype="<u2")
+    h, w = raw.shape
+    make = make.encode("ascii") + b"\0"
+    model = model.encode("ascii") + b"\0"
+
+    # TIFF/DNG tags: (tag, type, count, value); types: 1 BYTE, 2 ASCII, 3 SHORT, 4 LONG, 10 SRATIONAL
+    tags = [
+        (254, 4, 1, 0),                                  # NewSubFileType: main image
+        (256, 4, 1, w),                                  # ImageWidth
+        (257, 4, 1, h),                                  # ImageLength
+        (258, 3, 1, 16),                                 # BitsPerSample
+        (259, 3, 1, 1),                                  # Compression: none
+        (262, 3, 1, 32803),                              # PhotometricInterpretation: CFA
+        (271, 2, len(make), make),                       # Make
+        (272, 2, len(model), model),                     # Model
+        (273, 4, 1, None),                               # StripOffsets (set below)
+        (274, 3, 1, 1),                                  # Orientation
+        (277, 3, 1, 1),                                  # SamplesPerPixel
+        (278, 4, 1, h),                                  # RowsPerStrip
+        (279, 4, 1, raw.nbytes),                         # StripByteCounts
+        (284, 3, 1, 1),                                  # PlanarConfiguration
+        (33421, 3, 2, [2, 2]),                           # CFARepeatPatternDim
+        (33422, 1, 4, bytes([0, 1, 1, 2])),              # CFAPattern: RGGB
+        (50706, 1, 4, bytes([1, 4, 0, 0])),              # DNGVersion
+        (50708, 2, len(model), model),                   # UniqueCameraModel
+        (50714, 4, 1, black_level),                      # BlackLevel
+        (50717, 4, 1, white_level),                      # WhiteLevel
+        (50721, 10, 9, [1, 1, 0, 1, 0, 1, 0, 1, 1, 1, 0, 1, 0, 1, 0, 1, 1, 1]),  # ColorMatrix1 (identity)
+        (50778, 3, 1, 21),                               # CalibrationIlluminant1: D65
+    ]
+    formats = {1: "B", 2: "s", 3: "H", 4: "I", 10: "i"}
+    sizes = {1: 1, 2: 1, 3: 2, 4: 4, 10: 8}
+
+    ifd_offset = 8
+    extra_offset = ifd_offset + 2 + 12 * len(tags) + 4
+    extra = b""
+    entries = []
+
+    # Values longer than 4 bytes are stored after the IFD
+    for tag, typ, count, value in tags:
+        if value is None:
+            data = None
+        elif typ in (1, 2):
+            data = value
+        else:
+            values = value if isinstance(value, list) else [value]
+            fmt = formats[typ] * (2 * count if typ == 10 else count)
+            data = struct.pack("<" + fmt, *values)
+
+        if data is not None and sizes[typ] * count > 4:
+            entries.append((tag, typ, count, None, extra_offset + len(extra)))
+            extra += data + b"\0" * (len(data) % 2)
+        else:
+            entries.append((tag, typ, count, data, None))
+
+    data_offset = extra_offset + len(extra)
+
+    ifd = struct.pack("<H", len(tags))
+    for tag, typ, count, data, offset in entries:
+        if tag == 273:
+            data = struct.pack("<I", data_offset)
+        value = struct.pack("<I", offset) if offset is not None else (data + b"\0" * 4)[:4]
+        ifd += struct.pack("<HHI", tag, typ, count) + value
+    ifd += struct.pack("<I", 0)
+
+    with open(path, "wb") as f:
+        f.write(b"II*\0" + struct.pack("<I", ifd_offset))
+        f.write(ifd)
+        f.write(extra)
+        f.write(raw.tobytes())
@@ -0,0 +1,805 @@
+'''
+Experiment runner
+
+This module:
+- Runs the capture sequence of an experiment set up in capture.py: for every stage the weight
+  measurement (HX711), the noise, LED and illuminated images of every shutter speed
+- Starts every stage at a fixed time after the start of the experiment (absolute deadlines),
+  so the time needed for capturing and weighing does not add up over the stages
+- Reports stages which start late, and can be paused, resumed and aborted from another thread
+- Saves the planned and actual start time (relative to the start of the experiment, without the time spent
+  paused) and the duration of every stage to schedule.jsonl
+- Checks the capture settings saved by capture.py (parse_settings), shared by the GUI and capture_cli.py
+- Does not depend on the GUI or on the Raspberry Pi: the camera, lamps and scale come from hardware.py
+  (real or simulated hardware), waits use the clock of the hardware
+- Measures the time spent in every capture step and saves it to timing.json
+
+Purpose:
+- Keeps the GUI responsive during experiments that take several hours
+- Keeps the interval between stages equal to the time set by the user
+
+2026-10
+'''
+
+import json, os, time, threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Shutter sweep settings
+KEEP_CAMERA_RUNNING = True   # Configure and start the camera once per stage and only change ExposureTime
+EXPOSURE_TIMEOUT = 5.0       # [s] Maximum wait for a frame with the requested exposure time
+EXPOSURE_TOLERANCE = 0.01    # Relative difference allowed between the requested and reported exposure time
+EXPOSURE_TOLERANCE_US = 100  # [µs] Absolute difference allowed (exposure times are rounded to sensor lines)
+LED_EXPOSURE = 300000        # [µs] Exposure time of the LED images
+
+# Save pipeline settings
+SAVE_WORKERS = 2             # Threads encoding and writing the images (JPEG, DNG, JSON)
+SAVE_QUEUE_SIZE = 4          # Maximum captured frames waiting to be written (capture waits when full)
+MIN_PAUSE = 0.3              # [s] Minimum pause between captures (frames are written in the background)
+MANIFEST_NAME = "metadata.jsonl"  # Metadata of all images of a shutter folder, one JSON object per line
+MANIFEST_BATCH = 10          # Metadata lines collected before they are appended to the manifest
+
+# Scheduler settings
+LATE_TOLERANCE = 5.0         # [s] Stages starting later than this after their planned time are reported
+POLL_INTERVAL = 0.5          # [s] How often pause and abort requests are checked while waiting
+SCHEDULE_NAME = "schedule.jsonl"  # Planned and actual start time of every stage (saved inside the output directory)
+TIMING_NAME = "timing.json"  # Time spent in every hardware operation (saved inside the output directory)
+
+# Scale settings
+SCALE_TRIM = 3               # Readings removed from both ends before averaging
+SCALE_DELAY = 0.2            # [s] Pause between scale readings
+
+# DEFAULT camera and capture settings dictionary
+DEFAULTS = {
+    # Camera Settings
+    "shutter_speed": "",
+    "lens_position": "",
+    "colour_gain_red": "",
+    "colour_gain_blue": "",
+    "analog_gain": "",
+    "preheat": "",
+    # Illuminated Capture Settings
+    "illum_capture_check": False,
+    "image_capture": "",
+    "illum_raw": False,
+    "pause_between_capture": "",
+    "illuminated_image_name": "",
+    "lamp_drive": "External source",
+    # Noise Settings
+    "noise_capture_check": False,
+    "noise_raw": False,
+    "noise_image_capture": "",
+    "noise_image_name": "",
+    "pause_between_noise_capture": "",
+    # LED Settings
+    "led_capture_check": False,
+    "led1_combobox": "None",
+    "led2_combobox": "None",
+    "led_raw": False,
+    "led_image_count": "None",
+    "pause_between_led_capture": "None",
+    "led_image_name": "",
+    # Advanced Settings
+    "metadata": False,
+    "single_shutter": False,
+    "multiple_shutter": False,
+    "shutter_speed_from": "",
+    "shutter_speed_to": "",
+    "shutter_speed_by": "",
+    "number_experiments": "",
+    "time_between_experiments": "",
+    # Scale Settings
+    "scale_check": False,
+    "dat": "None",
+    "clk": "None",
+    "ref_unit": "",
+    "scale_num": "",
+}
+
+# GPIO pin mapping of the pin selections of the GUI (BCM numbering)
+GPIO_MAPPING = {
+    "GPIO2 (Pin 3)": 2,
+    "GPIO3 (Pin 5)": 3,
+    "GPIO4 (Pin 7)": 4,
+    "GPIO5 (Pin 29)": 5,
+    "GPIO6 (Pin 31)": 6,
+    "GPIO7 (Pin 26)": 7,
+    "GPIO8 (Pin 24)": 8,
+    "GPIO9 (Pin 21)": 9,
+    "GPIO10 (Pin 19)": 10,
+    "GPIO11 (Pin 23)": 11,
+    "GPIO12 (Pin 32)": 12,
+    "GPIO13 (Pin 33)": 13,
+    "GPIO14 (Pin 8)": 14,
+    "GPIO15 (Pin 10)": 15,
+    "GPIO16 (Pin 36)": 16,
+    "GPIO17 (Pin 11)": 17,
+    "GPIO18 (Pin 12)": 18,
+    "GPIO19 (Pin 35)": 19,
+    "GPIO20 (Pin 38)": 20,
+    "GPIO21 (Pin 40)": 21,
+    "GPIO22 (Pin 15)": 22,
+    "GPIO23 (Pin 16)": 23,
+    "GPIO24 (Pin 18)": 24,
+    "GPIO25 (Pin 22)": 25,
+    "GPIO26 (Pin 37)": 26,
+    "GPIO27 (Pin 13)": 27
+}
+
+# True if the reported exposure time of a frame belongs to the requested one: within the tolerance and,
+# after a change, closer to the requested than to the previous exposure time (a sweep step can be smaller
+# than the tolerance, then a frame still exposed with the previous time would be accepted)
+def exposure_reached(reported, exposure_time, previous=None):
+    tolerance = max(EXPOSURE_TOLERANCE_US, EXPOSURE_TOLERANCE * exposure_time)
+    if abs(reported - exposure_time) > tolerance:
+        return False
+    return previous is None or previous == exposure_time or abs(reported - exposure_time) < abs(reported - previous)
+
+# Ensure everything is JSON-serializable
+def convert(obj):
+    if isinstance(obj, (tuple, list)):
+        return list(obj)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return obj
+
+# Capture a series of images with the same settings.
+# Frames are copied out of the camera (Camera.capture_frame) and handed to a pool of writer threads
+# which encode and save them (bounded queue, capture waits when it is full).
+# The metadata of every image comes from its own frame and is appended to the manifest of the
+# folder (MANIFEST_NAME) in batches. The first line is written right away, so programs which follow
+# the experiment (apv_watcher.py) know the number of images of the series (image_count) from the start.
+# The time of every step is added to hardware.timings.
+class ImageCapture:
+
+    def __init__(self, save_dir, main_title, image_count, pause_time, hardware,
+                 camera=None, save_metadata=False, save_raw=False, requested_controls=None, on_queue_depth=None):
+
+        self.save_dir = save_dir
+        self.main_title = main_title
+        self.image_count = image_count
+        self.pause_time = pause_time
+        self.hardware = hardware
+        self.timings = hardware.timings
+        self.camera = camera
+        self.save_metadata = save_metadata
+        self.save_raw = save_raw
+        self.running = True
+        self.requested_controls = requested_controls or {}
+        self.on_queue_depth = on_queue_depth
+
+        self.slots = threading.BoundedSemaphore(SAVE_QUEUE_SIZE)
+        self.pending = 0
+        self.max_pending = 0
+        self.pending_lock = threading.Lock()
+
+        self.manifest_lines = []
+        self.manifest_lock = threading.Lock()
+        self.manifest_written = False
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        pool = ThreadPoolExecutor(max_workers=SAVE_WORKERS)
+        futures = []
+
+        try:
+            for i in range(self.image_count):
+                if not self.running:
+                    break
+
+                frame_start = self.hardware.clock()
+                filename = f"{self.main_title}{i}.jpg"
+                filepath = os.path.join(self.save_dir, filename)
+
+                if self.camera:
+                    # Backpressure: wait for a free place in the writer queue
+                    with self.timings.measure("queue_wait"):
+                        self.slots.acquire()
+
+                    # Copy the image buffers and the metadata, the camera can reuse its buffers right away.
+                    # The place is freed by frame_saved, or here if the frame never reaches the writer queue.
+                    try:
+                        with self.timings.measure("capture"):
+                            frame = self.camera.capture_frame(raw=self.save_raw)
+                        future = pool.submit(self.save_frame, filepath, frame)
+                    except BaseException:
+                        self.slots.release()
+                        raise
+
+                    self.change_pending(1)
+                    future.add_done_callback(self.frame_saved)
+                    futures.append(future)
+
+                print(f"{filename}: {filepath} (save queue: {self.pending})")
+
+                # Keep the captures evenly spaced, independent of the save time
+                self.hardware.sleep(frame_start + self.pause_time - self.hardware.clock())
+
+        finally:
+            # Wait until all frames are written (also when the capture failed, so the queued frames are kept)
+            with self.timings.measure("save_drain"):
+                pool.shutdown(wait=True)
+            self.flush_manifest()
+
+        for future in futures:
+            if future.exception() is not None:
+                print(f"Error saving image: {future.exception()}")
+
+        if futures:
+            print(f"Save queue: maximum {self.max_pending} of {SAVE_QUEUE_SIZE} frames")
+
+    def change_pending(self, change):
+        with self.pending_lock:
+            self.pending += change
+            self.max_pending = max(self.max_pending, self.pending)
+            depth = self.pending
+        if self.on_queue_depth:
+            self.on_queue_depth(depth)
+
+    def frame_saved(self, future):
+        self.change_pending(-1)
+        self.slots.release()
+
+    # Encode and write one frame (runs in a writer thread)
+    def save_frame(self, filepath, frame):
+        # Save JPEG images
+        with self.timings.measure("save_jpeg"):
+            self.camera.save_jpeg(frame, filepath)
+
+        # Save RAW(DNG) images
+        if frame.raw is not None:
+            with self.timings.measure("save_dng"):
+                self.camera.save_dng(frame, os.path.splitext(filepath)[0] + ".dng")
+
+        # Image Metadata Storage
+        if self.save_metadata:
+            line = json.dumps({
+                "name": os.path.splitext(os.path.basename(filepath))[0],
+                "image_count": self.image_count,
+                "requested": {k: convert(v) for k, v in self.requested_controls.items()},
+                "metadata": {k: convert(v) for k, v in frame.metadata.items()}
+            })
+
+            with self.manifest_lock:
+                self.manifest_lines.append(line)
+                full = len(self.manifest_lines) >= MANIFEST_BATCH or not self.manifest_written
+
+            if full:
+                self.flush_manifest()
+
+    # Append the collected metadata lines to the manifest of the folder
+    def flush_manifest(self):
+        with self.manifest_lock:
+            if self.manifest_lines:
+                with self.timings.measure("manifest"):
+                    with open(os.path.join(self.save_dir, MANIFEST_NAME), "a") as f:
+                        f.write("\n".join(self.manifest_lines) + "\n")
+                self.manifest_lines = []
+                self.manifest_written = True
+
+# Check the capture settings saved by capture.py (File -> Save / Save As, same keys as DEFAULTS)
+# and convert them into the settings of ExperimentRunner.
+# Raises ValueError with the message shown to the user for the first invalid setting.
+def parse_settings(capture_settings, save_dir):
+    values = dict(DEFAULTS, **capture_settings)
+
+    def text(key):
+        value = values.get(key)
+        return "" if value is None else str(value).strip()
+
+    # Convert a setting, check that it is set, is a valid number and (optionally) in range
+    def number(key, convert, missing, invalid, valid=None, out_of_range=None):
+        if not text(key):
+            raise ValueError(missing)
+        try:
+            value = convert(text(key))
+        except ValueError:
+            raise ValueError(invalid) from None
+        if valid is not None and not valid(value):
+            raise ValueError(out_of_range)
+        return value
+
+    # GPIO pin of a pin selection ("None"/"External source" = not chosen)
+    def pin(key, not_chosen, missing):
+        selection = text(key)
+        if selection == not_chosen:
+            raise ValueError(missing)
+        if selection not in GPIO_MAPPING:
+            raise ValueError(f"Invalid option selected: {selection}")
+        return GPIO_MAPPING[selection]
+
+    #---------General Camera Setting Check----------
+    shutter_speed = number("shutter_speed", int, "Please enter the shutter speed.",
+                           "Shutter speed must be an integer.", lambda v: 30 <= v <= 112_000_000,
+                           "Shutter speed must be between 30 µs and 112,000,000 µs (112 seconds).")
+    lens_position = number("lens_position", float, "Please enter the lens position.",
+                           "Lens position must be a number.", lambda v: 0 <= v <= 10,
+                           "Lens position must be between 0 and 10.")
+    colour_gain_red = number("colour_gain_red", float, "Please enter the red colour gain.",
+                             "Red colour gain must be a number.", lambda v: 1 <= v <= 8,
+                             "Red colour gain must be between 1 and 8.")
+    colour_gain_blue = number("colour_gain_blue", float, "Please enter the blue colour gain.",
+                              "Blue colour gain must be a number.", lambda v: 1 <= v <= 8,
+                              "Blue colour gain must be between 1 and 8 (inclusive).")
+    analog_gain = number("analog_gain", float, "Please enter the analogue gain.",
+                         "Analogue gain must be a number.", lambda v: 1 <= v <= 8,
+                         "Analogue gain must be between 1 and 8 (inclusive).")
+
+    # Capture Directory(Output Path) Check
+    if not save_dir or not str(save_dir).strip():
+        raise ValueError("Please choose capture result directory.")
+
+    settings = {
+        "save_dir": str(save_dir).strip(),
+        "analog_gain": analog_gain,
+        "colour_gains": (colour_gain_red, colour_gain_blue),
+        "lens_position": lens_position,
+        "save_metadata": bool(values["metadata"]),
+        "scale": None,
+        "noise": None,
+        "led": None,
+        "illuminated": None
+    }
+
+    #---------Illuminated Capture Setting Check----------
+    if values["illum_capture_check"]:
+        if not text("illuminated_image_name"):
+            raise ValueError("Please enter a file name prefix for the illuminated images")
+        image_count = number("image_capture", int,
+                             "Please choose the number of illuminated images to capture for every cycle.",
+                             "Invalid number format for illuminated images.", lambda v: v > 0,
+                             "Number of illuminated images must be greater than 0.")
+        pause_capture = number("pause_between_capture", float,
+                               f"Please enter the illuminated image capture pause (>{MIN_PAUSE} [s]).",
+                               "Invalid number format for illuminated image pause time.", lambda v: v > MIN_PAUSE,
+                               f"Pause time for illuminated images must be greater than {MIN_PAUSE} seconds")
+        preheat = number("preheat", int, "Please enter the lamp preheat time [s].",
+                         "Preheat time must be a valid number.", lambda v: 1 <= v <= 300,
+                         "Preheat time must be between 1 and 300 [s].")
+        settings["illuminated"] = {"title": text("illuminated_image_name"), "count": image_count,
+                                   "pause": pause_capture, "raw": bool(values["illum_raw"]), "preheat": preheat}
+
+    #---------Noise Capture Setting Check----------
+    if values["noise_capture_check"]:
+        if not text("noise_image_name"):
+            raise ValueError("Please enter a file name prefix for noise images.")
+        noise_image_count = number("noise_image_capture", int, "Please choose the number of noise images to capture.",
+                                   "Invalid number format for noise images.", lambda v: v > 0,
+                                   "Number of noise images must be greater than 0.")
+        pause_noise = number("pause_between_noise_capture", float,
+                             f"Please enter the noise image capture pause (>{MIN_PAUSE} [s]).",
+                             "Invalid number format for noise image pause time.", lambda v: v > MIN_PAUSE,
+                             f"Pause time for noise images must be greater than {MIN_PAUSE} seconds.")
+        settings["noise"] = {"title": text("noise_image_name"), "count": noise_image_count, "pause": pause_noise,
+                             "raw": bool(values["noise_raw"])}
+
+    #---------LED Capture Settings Check----------
+    if values["led_capture_check"]:
+        led1_pin = pin("led1_combobox", "None", "LED1 pin must be chosen for LED capture.")
+        led2_pin = pin("led2_combobox", "None", "LED2 pin must be chosen for LED capture.")
+        led_num = number("led_image_count", int, "Please enter the number of LED images to capture.",
+                         "LED image count must be a valid number.", lambda v: 1 <= v <= 10,
+                         "LED image count must be between 1 and 10.")
+        led_pause = number("pause_between_led_capture", int,
+                           "Please enter the time for pause between LED image capture.",
+                           "Pause between LED capture must be a valid number.", lambda v: 1 <= v <= 10,
+                           "Pause between LED image capture must be between 1 and 10 seconds.")
+        if not text("led_image_name"):
+            raise ValueError("Please enter a file name prefix for the LED images.")
+        settings["led"] = {"title": text("led_image_name"), "count": led_num, "pause": led_pause,
+                           "raw": bool(values["led_raw"]), "pins": (led1_pin, led2_pin)}
+
+    #---------Experiment Setting Check----------
+    time_experiments = number("time_between_experiments", float, "Please enter the time between experiments [min].",
+                              "Time between experiments must be a valid number", lambda v: 0 <= v <= 120,
+                              "Time between experiments must be between 0 and 120 minutes")
+    num_experiments = number("number_experiments", int, "Please enter the number of experiments.",
+                             "Number of experiments must be a valid number", lambda v: 1 <= v <= 100,
+                             "Number of experiments must be between 1 and 100")
+
+    # Differentiate single and multiple shutter speed capture
+    if values["multiple_shutter"]:
+        shutter_from = number("shutter_speed_from", int, "Please enter the shutter time FROM [µs].",
+                              "Shutter time FROM must be a valid number.", lambda v: 1 <= v <= 200000,
+                              "Shutter time FROM must be between 1 and 200000 [µs].")
+        shutter_to = number("shutter_speed_to", int, "Please enter the shutter time TO [µs].",
+                            "Shutter time TO must be a valid number.", lambda v: 1 <= v <= 200000,
+                            "Shutter time TO must be between 1 and 200000 [µs].")
+        shutter_by = number("shutter_speed_by", int, "Please enter the shutter time BY [µs].",
+                            "Shutter time BY must be a valid number.", lambda v: 1 <= v <= 200000,
+                            "Shutter time BY must be between 1 and 200000 [µs].")
+
+        # Shutter speed division check
+        if shutter_from >= shutter_to:
+            raise ValueError("Shutter time FROM must be less than TO.")
+        diff = shutter_to - shutter_from
+        if diff % shutter_by != 0:
+            raise ValueError(f"The difference between FROM and TO ({diff} [µs]) must be divisible by BY "
+                             f"({shutter_by} [µs]).")
+        shutter_list = list(range(shutter_from, shutter_to + shutter_by, shutter_by))
+    else:
+        shutter_list = [shutter_speed]
+
+    settings["stages"] = [time_experiments * i for i in range(num_experiments)]
+    settings["shutter_list"] = shutter_list
+
+    # The lamp pin is set up for every experiment
+    settings["lamp_pin"] = pin("lamp_drive", "External source",
+                               "GPIO pin must be chosen for illuminated image capture.")
+    if settings["illuminated"] is not None:
+        settings["illuminated"]["lamp_pin"] = settings["lamp_pin"]
+
+    #-------Scale Settings Input Check----------
+    if values["scale_check"]:
+        dat_pin = pin("dat", "None", "DAT pin must be chosen for scaling measurements.")
+        clk_pin = pin("clk", "None", "CLK pin must be chosen for scaling measurements.")
+        ref_unit = number("ref_unit", float, "Please enter the reference unit for the scaling measurements.",
+                          "Reference unit must be a valid number.")
+        scale_num = number("scale_num", int, "Please enter the number of scaling measurements to be done.",
+                           "Scale measurement number must be a valid number.", lambda v: 1 <= v <= 50,
+                           "Scale measurement number must be between 1 and 50.")
+        settings["scale"] = {"dat_pin": dat_pin, "clk_pin": clk_pin, "ref_unit": ref_unit, "num": scale_num}
+
+    return settings
+
+# Run all stages of an experiment.
+# settings: validated capture settings (see parse_settings), hardware: PiHardware or SimulatedHardware
+# (see hardware.open_hardware), camera: camera of the hardware (None = no camera).
+# Callbacks (called from the thread running the experiment): on_status(status_key),
+# on_progress(done_stages, total_stages), on_late(stage, seconds_late), on_queue_depth(frames)
+class ExperimentRunner:
+
+    def __init__(self, settings, hardware, camera, on_status=None, on_progress=None,
+                 on_late=None, on_queue_depth=None):
+
+        self.settings = settings
+        self.hardware = hardware
+        self.camera = camera
+        self.timings = hardware.timings
+        self.on_status = on_status
+        self.on_progress = on_progress
+        self.on_late = on_late
+        self.on_queue_depth = on_queue_depth
+
+        self.abort_event = threading.Event()
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        self.image_capture = None
+        self.exposure_time = None    # [µs] Exposure time last requested from the camera
+        self.lamp = None
+        self.leds = []
+
+    # Pause/resume/abort requests (from any thread). A pause takes effect before the next stage,
+    # an abort stops the current capture series and skips the remaining steps and stages.
+    def pause(self):
+        self.resume_event.clear()
+        self.report("paused")
+
+    def resume(self):
+        self.resume_event.set()
+
+    @property
+    def paused(self):
+        return not self.resume_event.is_set()
+
+    def abort(self):
+        self.abort_event.set()
+        self.resume_event.set()
+        if self.image_capture is not None:
+            self.image_capture.stop()
+
+    @property
+    def aborted(self):
+        return self.abort_event.is_set()
+
+    def report(self, status_key):
+        if self.on_status:
+            self.on_status(status_key)
+
+    # Physical wait (lamp preheat, settling) on the hardware clock, ends early on abort
+    def wait(self, seconds):
+        self.hardware.sleep(seconds, self.abort_event)
+
+    # Wait until a deadline (hardware.clock()), checking for pause and abort requests.
+    # Returns the time spent paused [s].
+    def wait_until(self, deadline):
+        clock = self.hardware.clock
+        paused_time = 0.0
+
+        while not self.aborted:
+            if self.paused:
+                pause_start = clock()
+                self.resume_event.wait()
+                paused_time += clock() - pause_start
+                deadline += clock() - pause_start
+                continue
+
+            remaining = deadline - clock()
+            if remaining <= 0:
+                break
+            self.wait(min(remaining, POLL_INTERVAL))
+
+        return paused_time
+
+    # Run all stages. The lamps are switched off and the camera and GPIO pins are released
+    # also when a stage fails (the exception is passed on to the caller).
+    def run(self):
+        try:
+            self.run_stages()
+        finally:
+            self.release_hardware()
+
+            # Time spent in the hardware operations
+            self.timings.report()
+            self.timings.save(os.path.join(self.settings["save_dir"], TIMING_NAME))
+
+    def run_stages(self):
+        settings = self.settings
+        stages = settings["stages"]
+        clock = self.hardware.clock
+        schedule_path = os.path.join(settings["save_dir"], SCHEDULE_NAME)
+
+        self.setup_lamps()
+        if self.on_progress:
+            self.on_progress(0, len(stages))
+
+        # Stage deadlines are fixed offsets from the start, moved back only by the time spent paused
+        start = clock()
+        paused_total = 0.0
+
+        for done_stages, stage in enumerate(stages):
+            planned = start + stage * 60
+            if self.aborted:
+                break
+            if done_stages > 0:
+                # The lamp is preheated before the illuminated images, not before the stage
+                self.report("idle")
+                print(f"Stage {stages[done_stages - 1]} done. Next stage in "
+                      f"{max(0.0, planned - clock()) / 60:.1f} minutes...")
+                paused = self.wait_until(planned)
+                paused_total += paused
+                start += paused
+                planned = start + stage * 60
+
+            if self.aborted:
+                break
+
+            stage_start = clock()
+            late = stage_start - planned
+            if late > LATE_TOLERANCE:
+                print(f"Warning: stage {stage} started {late:.1f} [s] late")
+                if self.on_late:
+                    self.on_late(stage, late)
+
+            with self.timings.measure("stage"):
+                self.run_stage(stage)
+
+            with open(schedule_path, "a") as f:
+                f.write(json.dumps({
+                    "stage": stage,
+                    "planned_s": round(planned - start, 3),
+                    "started_s": round(stage_start - start, 3),
+                    "late_s": round(late, 3),
+                    "duration_s": round(clock() - stage_start, 3),
+                    "paused_s": round(paused_total, 3),
+                    "wall_time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+                    "aborted": self.aborted
+                }) + "\n")
+
+            if self.on_progress:
+                self.on_progress(done_stages + 1, len(stages))
+
+        self.report("aborted" if self.aborted else "complete")
+
+    # Switch the lamp and the LEDs off, stop the camera and release the GPIO pins
+    def release_hardware(self):
+        try:
+            for lamp in [self.lamp] + self.leds:
+                if lamp is not None:
+                    self.switch(lamp, False)
+            if self.camera:
+                self.camera.stop()
+        finally:
+            self.hardware.cleanup()
+
+    # Set up the lamp and the LEDs (switched off)
+    def setup_lamps(self):
+        self.lamp = self.hardware.lamp(self.settings["lamp_pin"], "lamp")
+        if self.settings["led"] is not None:
+            self.leds = [self.hardware.lamp(pin, "led") for pin in self.settings["led"]["pins"]]
+
+    # Switch a lamp or LED (timed, the GPIO switching is usually much faster than the capture steps)
+    def switch(self, lamp, on):
+        with self.timings.measure("lamp"):
+            if on:
+                lamp.on()
+            else:
+                lamp.off()
+
+    # Configure the still pipeline at full sensor resolution with manual exposure and colour settings
+    def configure_still(self, exposure_time, raw=True):
+        with self.timings.measure("configure"):
+            self.camera.configure_still(self.requested_controls(exposure_time), raw=raw)
+            self.exposure_time = exposure_time
+
+    # Change the exposure time of the running camera and wait for the first frame
+    # whose metadata reports it (instead of a fixed sleep). New controls take effect a few frames later.
+    def set_exposure(self, exposure_time):
+        with self.timings.measure("set_exposure"):
+            previous, self.exposure_time = self.exposure_time, exposure_time
+            self.camera.set_controls({"ExposureTime": exposure_time})
+            deadline = self.hardware.clock() + EXPOSURE_TIMEOUT
+
+            while self.hardware.clock() < deadline:
+                metadata = self.camera.capture_metadata()
+                if exposure_reached(metadata.get("ExposureTime", 0), exposure_time, previous):
+                    return True
+
+        print(f"Warning: ExposureTime {exposure_time} [µs] not reached within {EXPOSURE_TIMEOUT} [s]")
+        return False
+
+    # Prepare the camera for a capture series: only change the exposure time of the running camera,
+    # or configure and start it for this series
+    def prepare_camera(self, keep_running, exposure_time, raw=True, settle=1.0):
+        if keep_running:
+            self.set_exposure(exposure_time)
+        elif self.camera:
+            self.configure_still(exposure_time, raw)
+            self.camera.start()
+            self.wait(settle)
+
+    # Capture a series of images (runs in the calling thread, can be stopped by abort())
+    def capture_images(self, folder, options, requested_controls=None):
+        self.image_capture = ImageCapture(
+            folder, options["title"], options["count"], options["pause"], self.hardware,
+            camera=self.camera,
+            save_metadata=self.settings["save_metadata"],
+            save_raw=options["raw"],
+            requested_controls=requested_controls,
+            on_queue_depth=self.on_queue_depth
+        )
+        if self.aborted:
+            self.image_capture.stop()
+        self.image_capture.run()
+        self.image_capture = None
+
+    def requested_controls(self, exposure_time):
+        return {
+            "ExposureTime": exposure_time,
+            "AnalogueGain": self.settings["analog_gain"],
+            "ColourGains": self.settings["colour_gains"],
+            "LensPosition": self.settings["lens_position"]
+        }
+
+    # Setup HX711 based scale, measure the weight and save it to <stage>/<stage>.json
+    def measure_weight(self, stage_folder, stage):
+        scale = self.settings["scale"]
+
+        hx = self.hardware.scale(scale["dat_pin"], scale["clk_pin"])
+        hx.set_reference_unit(scale["ref_unit"])
+
+        self.wait(1.0)
+
+        # Start the HX711 AD-converter module(weight scale)
+        hx.power_up()
+        self.wait(0.5)
+
+        # Discard unstable first reading
+        hx.read(1)
+
+        samples = []
+
+        for _ in range(scale["num"]):
+            with self.timings.measure("scale_read"):
+                reading = hx.read(1)
+            samples.append(reading)
+            self.wait(SCALE_DELAY)
+
+        sorted_samples = sorted(samples)
+
+        clean_samples = sorted_samples[SCALE_TRIM:-SCALE_TRIM]
+
+        weight = sum(clean_samples) / len(clean_samples)
+
+        # Power down to reduce noise
+        hx.power_down()
+
+        # Save to JSON
+        json_path = os.path.join(stage_folder, f"{stage}.json")
+        with open(json_path, "w") as f:
+            json.dump(
+                {
+                    "Weight(g)": round(abs(weight), 2),
+                    "Scale": {
+                        "num_samples": scale["num"],
+                        "trim": SCALE_TRIM,
+                        "delay_s": SCALE_DELAY,
+                        "raw_samples": samples,
+                        "clean_samples": clean_samples
+                    }
+                },
+                f,
+                indent=4
+            )
+
+    # Weight measurement and image capture of one stage
+    def run_stage(self, stage):
+        settings = self.settings
+        save_dir = settings["save_dir"]
+        shutter_list = settings["shutter_list"]
+        noise, led, illuminated = settings["noise"], settings["led"], settings["illuminated"]
+
+        stage_folder = os.path.join(save_dir, str(stage))
+        os.makedirs(stage_folder, exist_ok=True)
+
+        if settings["scale"] is not None:
+            self.report("scale")
+            with self.timings.measure("weighing"):
+                self.measure_weight(stage_folder, stage)
+
+        self.report("init_camera")
+
+        # Keep the camera running for the whole stage, only the exposure time is changed
+        keep_running = KEEP_CAMERA_RUNNING and self.camera is not None
+        if keep_running:
+            self.configure_still(shutter_list[0])
+            self.camera.start()
+
+        for shutter_temp in shutter_list:
+            if self.aborted:
+                break
+
+            shutter_folder = os.path.join(save_dir, str(stage), str(shutter_temp))
+            os.makedirs(shutter_folder, exist_ok=True)
+
+            if noise is not None:
+                self.prepare_camera(keep_running, shutter_temp)
+                self.report("noise_capture")
+                self.capture_images(shutter_folder, noise, self.requested_controls(shutter_temp))
+
+                if not keep_running and self.camera:
+                    self.camera.stop()
+
+            if led is not None and not self.aborted:
+                self.report("led_capture")
+                self.prepare_camera(keep_running, LED_EXPOSURE, raw=False)
+
+                for lamp in self.leds:
+                    self.switch(lamp, True)
+
+                self.wait(1.0)
+
+                self.capture_images(shutter_folder, led)
+
+                for lamp in self.leds:
+                    self.switch(lamp, False)
+
+                if not keep_running and self.camera:
+                    self.camera.stop()
+
+        if illuminated is not None and not self.aborted:
+            self.report("preheat_lamp")
+            self.switch(self.lamp, True)
+            self.wait(illuminated["preheat"])
+
+            self.report("image_capture")
+
+            for shutter_temp in shutter_list:
+                if self.aborted:
+                    break
+
+                shutter_folder = os.path.join(save_dir, str(stage), str(shutter_temp))
+                os.makedirs(shutter_folder, exist_ok=True)
+
+                self.prepare_camera(keep_running, shutter_temp, settle=2.0)
+                self.capture_images(shutter_folder, illuminated, self.requested_controls(shutter_temp))
+
+                if not keep_running and self.camera:
+                    self.camera.stop()
+
+            self.switch(self.lamp, False)
+
+        if keep_running:
+            self.camera.stop()
@@ -0,0 +1,284 @@
+'''
+Hardware abstraction layer
+
+This module:
+- Defines the camera, lamp and scale interfaces used by experiment.py, capture.py, capture_cli.py,
+  lamp_drift_capture_analysis.py and the hx711 scripts
+- Implements them with the Raspberry Pi hardware: camera module (Picamera2), lamp or LED switched by
+  a GPIO pin (RPi.GPIO) and load cell with the HX711 AD-converter module (hx711)
+- Opens the real or the simulated hardware (simulation.py) with open_hardware()
+- Measures the time spent in the hardware operations of an experiment (Timings)
+- Waits and clocks go through the hardware, so the simulated hardware can run faster than real time
+
+Purpose:
+- Allows the capture programs to be run, tested and benchmarked without the Raspberry Pi,
+  by changing one setting
+
+2026-10
+'''
+
+import json, threading, time
+from contextlib import contextmanager
+
+
+# Camera controls of every still configuration (manual exposure, no automatic white balance or processing)
+MANUAL_CONTROLS = {
+    "AeEnable": False,
+    "AwbEnable": False,
+    "Brightness": 0.0,
+    "Contrast": 1.0,
+    "Saturation": 1.0,
+    "Sharpness": 1.0,
+    "NoiseReductionMode": 0
+}
+
+# Time spent in each operation: number of calls, total, mean and maximum time
+class Timings:
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        with self.lock:
+            count, total, longest = self.stats.get(name, (0, 0.0, 0.0))
+            self.stats[name] = (count + 1, total + seconds, max(longest, seconds))
+
+    def summary(self):
+        with self.lock:
+            return {
+                name: {"count": count, "total_s": round(total, 4), "mean_ms": round(1000 * total / count, 3),
+                       "max_ms": round(1000 * longest, 3)}
+                for name, (count, total, longest) in sorted(self.stats.items())
+            }
+
+    def report(self):
+        for name, stats in self.summary().items():
+            print(f"{name:>12}: {stats['count']:6d} x {stats['mean_ms']:10.3f} ms "
+                  f"(max {stats['max_ms']:.3f} ms, total {stats['total_s']:.3f} s)")
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+# Frame copied out of the camera: main image buffer, RAW buffer (None if not requested),
+# metadata and the camera configuration it was captured with
+class Frame:
+
+    def __init__(self, main, raw, metadata, config):
+        self.main = main
+        self.raw = raw
+        self.metadata = metadata
+        self.config = config
+
+# Camera interface
+class Camera:
+
+    sensor_resolution = (0, 0)
+
+    # Still configuration at full sensor resolution with MANUAL_CONTROLS and the given controls
+    def configure_still(self, controls, raw=True, buffer_count=None):
+        raise NotImplementedError
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def close(self):
+        self.stop()
+
+    def set_controls(self, controls):
+        raise NotImplementedError
+
+    # Metadata of the next frame
+    def capture_metadata(self):
+        raise NotImplementedError
+
+    # Next frame, copied so the camera can reuse its buffers right away
+    def capture_frame(self, raw=False):
+        raise NotImplementedError
+
+    # Encode and write a frame (may run in a writer thread)
+    def save_jpeg(self, frame, path):
+        raise NotImplementedError
+
+    def save_dng(self, frame, path):
+        raise NotImplementedError
+
+# Lamp interface (halogen lamp or LED)
+class Lamp:
+
+    def on(self):
+        raise NotImplementedError
+
+    def off(self):
+        raise NotImplementedError
+
+# Scale interface: readings in grams (raw readings divided by the reference unit, minus the tare)
+class Scale:
+
+    def set_reference_unit(self, reference_unit):
+        raise NotImplementedError
+
+    def read(self, times=3):
+        raise NotImplementedError
+
+    def tare(self, times=15):
+        raise NotImplementedError
+
+    def power_up(self):
+        raise NotImplementedError
+
+    def power_down(self):
+        raise NotImplementedError
+
+    def reset(self):
+        self.power_down()
+        self.power_up()
+
+# Raspberry Pi camera module
+class PiCamera(Camera):
+
+    def __init__(self):
+        from picamera2 import Picamera2
+        self.picam2 = Picamera2()
+        self.sensor_resolution = self.picam2.sensor_resolution
+
+    def configure_still(self, controls, raw=True, buffer_count=None):
+        sensor_width, sensor_height = self.sensor_resolution
+        options = {"main": {"size": (sensor_width, sensor_height)}}
+        if raw:
+            options["raw"] = {"size": (sensor_width, sensor_height)}
+        if buffer_count is not None:
+            options["buffer_count"] = buffer_count
+
+        self.picam2.configure(
+            self.picam2.create_still_configuration(**options, controls=dict(MANUAL_CONTROLS, **controls))
+        )
+        self.picam2.set_controls({"ScalerCrop": (0, 0, sensor_width, sensor_height)})
+
+    def start(self):
+        self.picam2.start()
+
+    def stop(self):
+        self.picam2.stop()
+
+    def close(self):
+        self.picam2.stop()
+        self.picam2.close()
+
+    def set_controls(self, controls):
+        self.picam2.set_controls(controls)
+
+    def capture_metadata(self):
+        return self.picam2.capture_metadata()
+
+    def capture_frame(self, raw=False):
+        request = self.picam2.capture_request()
+        try:
+            config = self.picam2.camera_config
+            main = request.make_buffer("main")
+            raw_buffer = request.make_buffer("raw") if raw else None
+            metadata = request.get_metadata()
+        finally:
+            request.release()
+        return Frame(main, raw_buffer, metadata, config)
+
+    def save_jpeg(self, frame, path):
+        img = self.picam2.helpers.make_image(frame.main, frame.config["main"])
+        self.picam2.helpers.save(img, frame.metadata, path)
+
+    def save_dng(self, frame, path):
+        self.picam2.helpers.save_dng(frame.raw, frame.metadata, frame.config["raw"], path)
+
+# Lamp or LED switched by a GPIO pin (BCM numbering)
+class GPIOLamp(Lamp):
+
+    def __init__(self, gpio, pin):
+        self.gpio = gpio
+        self.pin = pin
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(pin, self.gpio.OUT, initial=self.gpio.LOW)
+
+    def on(self):
+        self.gpio.output(self.pin, self.gpio.HIGH)
+
+    def off(self):
+        self.gpio.output(self.pin, self.gpio.LOW)
+
+# Load cell with the HX711 AD-converter module
+class HX711Scale(Scale):
+
+    def __init__(self, dat_pin, clk_pin):
+        from hx711 import HX711
+        self.hx = HX711(dat_pin, clk_pin)
+        self.hx.set_reading_format("MSB", "MSB")
+
+    def set_reference_unit(self, reference_unit):
+        self.hx.set_reference_unit(reference_unit)
+
+    def read(self, times=3):
+        return self.hx.get_weight(times)
+
+    def tare(self, times=15):
+        self.hx.tare(times)
+
+    def power_up(self):
+        self.hx.power_up()
+
+    def power_down(self):
+        self.hx.power_down()
+
+    def reset(self):
+        self.hx.reset()
+
+# Raspberry Pi hardware: creates the camera, lamps and scales, waits in real time
+class PiHardware:
+
+    simulated = False
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self.gpio = GPIO
+        self.timings = Timings()
+
+    def camera(self):
+        return PiCamera()
+
+    # name: "lamp" or "led" (only used by the simulated hardware)
+    def lamp(self, pin, name="lamp"):
+        return GPIOLamp(self.gpio, pin)
+
+    def scale(self, dat_pin, clk_pin):
+        return HX711Scale(dat_pin, clk_pin)
+
+    # Clock [s] and wait (returns early when event is set) used for all physical waits
+    def clock(self):
+        return time.monotonic()
+
+    def sleep(self, seconds, event=None):
+        if event is not None:
+            event.wait(max(0.0, seconds))
+        elif seconds > 0:
+            time.sleep(seconds)
+
+    def cleanup(self):
+        self.gpio.cleanup()
+
+# Open the Raspberry Pi hardware, or the simulated hardware of simulation.py
+# (options: see simulation.SimulatedHardware). Hardware modules are only imported here.
+def open_hardware(simulate=False, **options):
+    if simulate:
+        from simulation import SimulatedHardware
+        return SimulatedHardware(**options)
+    return PiHardware()
@@ -0,0 +1,272 @@
+'''
+Simulated hardware
+
+This module:
+- Implements the camera, lamp and scale interfaces of hardware.py without the Raspberry Pi:
+  - SimulatedCamera: synthetic Bayer (RGGB) RAW frames of a sample on a dark tray, saved as DNG and JPEG
+    images, delivered after a configurable frame latency; new controls take effect CONTROL_DELAY frames later
+  - SimulatedLamp: lamp or LED, the brightness of the simulated images follows the lamps switched on
+  - SimulatedScale: noisy readings of a sample losing weight, with a drifting zero
+- Runs on a simulated clock: physical waits (exposure, lamp preheat, pauses, time between stages)
+  take TIME_SCALE times their real duration, the clock advances by their full duration
+
+Purpose:
+- Allows capture.py, capture_cli.py, lamp_drift_capture_analysis.py and the hx711 scripts to be run,
+  tested and benchmarked on any computer, faster than real time
+
+2026-10
+'''
+
+import threading, time
+import cv2 as cv
+import numpy as np
+import dng_writer
+from hardware import Camera, Frame, Lamp, Scale, Timings, MANUAL_CONTROLS
+
+
+TIME_SCALE = 0.0             # Real duration of the simulated waits (0.0 = no waiting, 1.0 = real time)
+
+# Camera settings
+SIM_RESOLUTION = (640, 480)  # [px] Sensor resolution of the simulated camera (width, height)
+FRAME_LATENCY = 0.02         # [s] Processing time of every frame (real time, added to the exposure time)
+CONTROL_DELAY = 3            # Frames captured with the old controls after set_controls (like the sensor pipeline)
+BLACK_LEVEL = 64             # Sensor black level [DN]
+WHITE_LEVEL = 1023           # 10-bit saturation level [DN]
+READ_NOISE = 2.0             # [DN] Standard deviation of the read noise
+DARK_SIGNAL = 1e-4           # [DN/µs] Dark signal (grows with the exposure time)
+SIGNAL = 0.03                # [DN/µs] Signal of a white surface with the lamp on
+BRIGHTNESS = {"lamp": 1.0, "led": 0.1}  # Brightness of the lamp and of every LED switched on
+JPEG_GAIN = 0.25             # JPEG value per RAW value above the black level
+SAMPLE_REFLECTANCE = 0.6     # Reflectance of the sample
+TRAY_REFLECTANCE = 0.05      # Reflectance of the background (tray)
+COLOUR = (1.0, 0.75, 0.55)   # Relative reflectance of the sample in the R, G and B channels
+
+# Scale settings
+SIM_REFERENCE_UNIT = 100.0   # Raw readings per gram of the simulated load cell
+SAMPLE_PLACED = 1.0          # [s] The sample is placed on the scale this long after the start (after taring)
+SCALE_WEIGHT = 35.0          # [g] Weight of the sample when placed on the scale
+SCALE_LOSS = 0.001           # [g/s] Weight lost by drying
+SCALE_NOISE = 0.05           # [g] Standard deviation of a single reading
+SCALE_DRIFT = 0.01           # [g] Standard deviation of the zero drift per reading (random walk)
+
+SEED = 0                     # Random seed (same seed = same images and readings)
+
+
+# Write a simulated RAW frame as DNG file (see dng_writer.py)
+def write_dng(path, raw):
+    dng_writer.write_dng(path, raw, BLACK_LEVEL, WHITE_LEVEL, "Simulated", "Simulated Camera")
+
+
+# JPEG image of a RAW frame (black level removal, gain and demosaicing)
+def jpeg_image(raw):
+    mosaic = np.clip((raw.astype(np.float32) - BLACK_LEVEL) * JPEG_GAIN, 0, 255).astype(np.uint8)
+    return cv.cvtColor(mosaic, cv.COLOR_BayerBG2BGR)     # OpenCV calls the RGGB pattern "BG"
+
+
+# Reflectance of every sensor pixel (RGGB mosaic): elliptical sample on the tray
+def reflectance_mosaic(width, height):
+    yy, xx = np.ogrid[:height, :width]
+    inside = ((yy - height / 2) / (0.35 * height)) ** 2 + ((xx - width / 2) / (0.45 * height)) ** 2 < 1
+
+    colour = np.empty((height, width), np.float32)
+    colour[0::2, 0::2] = COLOUR[0]
+    colour[0::2, 1::2] = COLOUR[1]
+    colour[1::2, 0::2] = COLOUR[1]
+    colour[1::2, 1::2] = COLOUR[2]
+    return np.where(inside, SAMPLE_REFLECTANCE * colour, TRAY_REFLECTANCE).astype(np.float32)
+
+
+# Simulated camera module. The main buffer of a frame is its RAW mosaic, it is demosaiced when the
+# JPEG image is saved (in the writer thread, like Picamera2.helpers.make_image).
+class SimulatedCamera(Camera):
+
+    def __init__(self, hardware, resolution=SIM_RESOLUTION, latency=FRAME_LATENCY, control_delay=CONTROL_DELAY):
+        self.hardware = hardware
+        self.sensor_resolution = tuple(resolution)
+        self.latency = latency
+        self.control_delay = control_delay
+        self.rng = np.random.default_rng(hardware.seed)
+        self.reflectance = reflectance_mosaic(*self.sensor_resolution)
+        self.config = None
+        self.controls = {"ExposureTime": 10000, "AnalogueGain": 1.0, "ColourGains": (1.0, 1.0), "LensPosition": 1.0}
+        self.frames = 0            # Frames delivered so far
+        self.pending = []          # (last frame with the old controls, controls) set but not applied yet
+        self.started = False
+        self.lock = threading.Lock()
+
+    # The controls of the configuration apply from the first frame after start
+    def configure_still(self, controls, raw=True, buffer_count=None):
+        self.config = {"main": {"size": self.sensor_resolution},
+                       "raw": {"size": self.sensor_resolution} if raw else None,
+                       "buffer_count": buffer_count}
+        with self.lock:
+            self.pending = []
+            self.controls.update(MANUAL_CONTROLS, **controls)
+
+    def start(self):
+        if self.config is None:
+            raise RuntimeError("Camera must be configured before it is started")
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def set_controls(self, controls):
+        with self.lock:
+            self.pending.append((self.frames + self.control_delay, dict(controls)))
+
+    # Wait for the next frame (exposure on the simulated clock plus the processing latency) and return its metadata
+    def next_frame(self):
+        if not self.started:
+            raise RuntimeError("Camera is not running")
+
+        with self.lock:
+            self.frames += 1
+            while self.pending and self.pending[0][0] < self.frames:
+                self.controls.update(self.pending.pop(0)[1])
+            controls = dict(self.controls)
+
+        self.hardware.sleep(controls["ExposureTime"] / 1e6)
+        time.sleep(self.latency)
+
+        return {
+            "ExposureTime": int(controls["ExposureTime"]),
+            "AnalogueGain": float(controls["AnalogueGain"]),
+            "DigitalGain": 1.0,
+            "ColourGains": tuple(controls["ColourGains"]),
+            "LensPosition": float(controls["LensPosition"]),
+            "FrameDuration": int(controls["ExposureTime"] + self.latency * 1e6),
+            "SensorTimestamp": int(self.hardware.clock() * 1e9),
+            "Lux": round(400.0 * self.hardware.light(), 3)
+        }
+
+    def capture_metadata(self):
+        return self.next_frame()
+
+    def capture_frame(self, raw=False):
+        metadata = self.next_frame()
+        exposure = metadata["ExposureTime"]
+
+        signal = BLACK_LEVEL + DARK_SIGNAL * exposure
+        signal = signal + SIGNAL * exposure * self.hardware.light() * metadata["AnalogueGain"] * self.reflectance
+        signal += self.rng.normal(0, READ_NOISE, self.reflectance.shape).astype(np.float32)
+        mosaic = np.clip(np.rint(signal), 0, WHITE_LEVEL).astype(np.uint16)
+        return Frame(mosaic, mosaic if raw else None, metadata, self.config)
+
+    def save_jpeg(self, frame, path):
+        cv.imwrite(path, jpeg_image(frame.main))
+
+    def save_dng(self, frame, path):
+        write_dng(path, frame.raw)
+
+
+# Simulated lamp or LED (name: key of BRIGHTNESS)
+class SimulatedLamp(Lamp):
+
+    def __init__(self, hardware, pin, name="lamp"):
+        self.hardware = hardware
+        self.pin = pin
+        self.brightness = BRIGHTNESS[name]
+        hardware.lamps[pin] = 0.0
+
+    def on(self):
+        self.hardware.lamps[self.pin] = self.brightness
+
+    def off(self):
+        self.hardware.lamps[self.pin] = 0.0
+
+
+# Simulated load cell with HX711: the sample is placed SAMPLE_PLACED [s] after the start and loses
+# SCALE_LOSS [g/s], the zero point drifts (random walk shared by all scales of the hardware)
+class SimulatedScale(Scale):
+
+    def __init__(self, hardware, dat_pin, clk_pin):
+        self.hardware = hardware
+        self.reference_unit = 1.0
+        self.offset = 0.0
+        self.powered = True
+
+    def set_reference_unit(self, reference_unit):
+        if reference_unit == 0:
+            raise ValueError("The reference unit can't be 0")
+        self.reference_unit = reference_unit
+
+    # One raw reading: weight of the sample plus zero drift and noise, in load cell units
+    def read_raw(self):
+        hardware = self.hardware
+        with hardware.lock:
+            hardware.drift += hardware.rng.normal(0, SCALE_DRIFT)
+            noise = hardware.rng.normal(0, SCALE_NOISE)
+            drift = hardware.drift
+
+        elapsed = hardware.clock() - hardware.start - SAMPLE_PLACED
+        weight = max(0.0, SCALE_WEIGHT - SCALE_LOSS * elapsed) if elapsed >= 0 else 0.0
+        return (weight + drift + noise) * SIM_REFERENCE_UNIT
+
+    def read_average(self, times):
+        return sum(self.read_raw() for _ in range(times)) / times
+
+    def read(self, times=3):
+        return (self.read_average(times) - self.offset) / self.reference_unit
+
+    def tare(self, times=15):
+        self.offset = self.read_average(times)
+
+    def power_up(self):
+        self.powered = True
+
+    def power_down(self):
+        self.powered = False
+
+
+# Simulated hardware: creates the simulated camera, lamps and scales, runs the simulated clock
+class SimulatedHardware:
+
+    simulated = True
+
+    def __init__(self, time_scale=TIME_SCALE, latency=FRAME_LATENCY, resolution=SIM_RESOLUTION, seed=SEED):
+        self.time_scale = time_scale
+        self.latency = latency
+        self.resolution = resolution
+        self.seed = seed
+        self.timings = Timings()
+        self.lamps = {}
+        self.rng = np.random.default_rng(seed)
+        self.drift = 0.0
+        self.skipped = 0.0
+        self.lock = threading.Lock()
+        self.start = self.clock()
+
+    def camera(self):
+        return SimulatedCamera(self, self.resolution, self.latency)
+
+    def lamp(self, pin, name="lamp"):
+        return SimulatedLamp(self, pin, name)
+
+    def scale(self, dat_pin, clk_pin):
+        return SimulatedScale(self, dat_pin, clk_pin)
+
+    # Simulated clock: real time plus the part of the waits which was skipped
+    def clock(self):
+        return time.monotonic() + self.skipped
+
+    # Wait TIME_SCALE times the duration (returns early when event is set), the clock advances by the duration
+    def sleep(self, seconds, event=None):
+        seconds = max(0.0, seconds)
+        start = time.monotonic()
+        if event is not None:
+            interrupted = event.wait(seconds * self.time_scale)
+        else:
+            time.sleep(seconds * self.time_scale)
+            interrupted = False
+
+        if not interrupted:
+            with self.lock:
+                self.skipped += max(0.0, seconds - (time.monotonic() - start))
+
+    # Illumination of the simulated images (sum of the brightness of all lamps switched on)
+    def light(self):
+        return sum(self.lamps.values())
+
+    def cleanup(self):
+        self.lamps = {}
@@ -0,0 +1,38 @@
+'''
+Test of the exposure change of experiment.py on the simulated camera (simulation.py)
+
+This test:
+- Changes the exposure time of the running camera in steps smaller than the exposure tolerance
+  (the simulated camera applies new controls CONTROL_DELAY frames late, like the sensor pipeline)
+- Checks that set_exposure waits for a frame with the new exposure time, so the following frames
+  are not captured with the previous one
+
+Usage:
+    python -m pytest test_experiment.py
+
+2026-10
+'''
+
+from experiment import ExperimentRunner, EXPOSURE_TOLERANCE_US
+from hardware import open_hardware
+
+SETTINGS = {"analog_gain": 1.0, "colour_gains": (1.0, 1.0), "lens_position": 1.0}
+
+
+def test_small_exposure_step_waits_for_new_frame():
+    hardware = open_hardware(simulate=True, time_scale=0.0, latency=0.0, resolution=(64, 48))
+    camera = hardware.camera()
+    runner = ExperimentRunner(SETTINGS, hardware, camera)
+
+    runner.configure_still(10000)
+    camera.start()
+    assert camera.capture_metadata()["ExposureTime"] == 10000
+
+    # Every step is inside the tolerance of the previous exposure time
+    for exposure_time in (10050, 10100, 10150):
+        assert exposure_time - runner.exposure_time <= EXPOSURE_TOLERANCE_US
+        assert runner.set_exposure(exposure_time)
+        assert camera.capture_metadata()["ExposureTime"] == exposure_time
+
+    camera.stop()
+    hardware.cleanup()
@@ -0,0 +1,214 @@
+"""
+Region statistics benchmark program
+
+This program:
+- Creates a synthetic dark-frame corrected RAW image with the resolution of the Raspberry Pi
+  Camera Module 3 (4608 x 2592) and inside/outside/full region masks of a shrinking sample
+- Computes the APV of every region and Bayer channel with different reduction methods:
+  - fancy indexing: boolean mask indexing of every channel and region (previous raw_stats_with_mask)
+  - label bincount: region/Bayer label image reduced with np.bincount (raw_stats_for_regions),
+    without and with the histograms of the robust statistics (ROBUST_STATS)
+- Checks that all methods give the same means (within floating-point tolerance)
+- Reports the run time and the peak memory allocated by each method
+- Compares the float32 and the low-memory integer dark-frame correction (load_corrected_raw) of a synthetic
+  uint16 RAW/noise frame pair, each in a separate process, checks that both give identical statistics
+  and reports the run time and the peak resident memory (RSS) of each process
+
+Purpose:
+- Allows the user to compare the speed and memory use of the APV calculation methods
+  before running them on large experiments or on the Raspberry Pi
+
+Date: 2026-10
+"""
+
+import time
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import apv_calculator
+from apv_calculator import (build_region_masks, raw_stats_for_regions, correct_raw_float,
+                            correct_raw_integer, peak_rss, BLACK_LEVEL)
+
+WIDTH = 4608           # Image width [px]
+HEIGHT = 2592          # Image height [px]
+REPEATS = 5            # Number of runs of each method (the fastest run is reported)
+TOLERANCE = 1e-3       # Maximum allowed difference between the means of the methods
+
+
+# Synthetic dark-frame corrected RAW image and region masks (sample shrinks between mask0 and mask_t)
+def synthetic_frame(width=WIDTH, height=HEIGHT, seed=0):
+    rng = np.random.default_rng(seed)
+    yy, xx = np.ogrid[:height, :width]
+    r2 = (yy - height / 2) ** 2 + (xx - width / 2) ** 2
+
+    mask0 = r2 < (0.35 * height) ** 2
+    mask_t = r2 < (0.32 * height) ** 2
+
+    img = rng.normal(20, 3, (height, width)).astype(np.float32)
+    img[mask_t] += 300
+    np.clip(img, 0, None, out=img)
+
+    inside, outside, full = build_region_masks(mask_t, mask0)
+    return img, {"inside": inside, "outside": outside, "full": full}
+
+
+# Previous implementation: copies of every channel and region are made with boolean fancy indexing
+def fancy_indexing_stats(img, regions):
+    h, w = img.shape
+    stats = {}
+
+    for region_name, mask in regions.items():
+        R  = img[0:h:2, 0:w:2][mask[0:h:2, 0:w:2]]
+        G1 = img[0:h:2, 1:w:2][mask[0:h:2, 1:w:2]]
+        G2 = img[1:h:2, 0:w:2][mask[1:h:2, 0:w:2]]
+        B  = img[1:h:2, 1:w:2][mask[1:h:2, 1:w:2]]
+
+        stats[region_name] = {
+            "mean_raw": img[mask].mean(),
+            "R_mean": R.mean(),
+            "G1_mean": G1.mean(),
+            "G2_mean": G2.mean(),
+            "G_mean": np.mean([G1.mean(), G2.mean()]),
+            "B_mean": B.mean()
+        }
+
+    return stats
+
+
+# raw_stats_for_regions with the robust statistics (histograms) switched off or on.
+# Only the first one does the same work as fancy indexing.
+def label_bincount_stats(img, regions, robust=False):
+    previous = apv_calculator.ROBUST_STATS
+    apv_calculator.ROBUST_STATS = robust
+    try:
+        return raw_stats_for_regions(img, regions)
+    finally:
+        apv_calculator.ROBUST_STATS = previous
+
+def label_bincount_robust_stats(img, regions):
+    return label_bincount_stats(img, regions, robust=True)
+
+
+# Reduction methods to compare (the first one is used as the reference)
+METHODS = {
+    "fancy indexing": fancy_indexing_stats,
+    "label bincount": label_bincount_stats,
+    "bincount + histogram": label_bincount_robust_stats,
+}
+
+
+# Run a method REPEATS times and measure the fastest run and the peak allocated memory
+def measure(method, img, regions, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        stats = method(img, regions)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    method(img, regions)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return stats, best, peak
+
+
+# Largest difference between the means of two results
+def max_difference(stats_a, stats_b):
+    return max(
+        abs(float(stats_a[region][key]) - float(stats_b[region][key]))
+        for region in stats_a for key in stats_a[region]
+    )
+
+
+def run_benchmark(methods=METHODS, width=WIDTH, height=HEIGHT):
+    img, regions = synthetic_frame(width, height)
+    frame_mb = img.nbytes / 1024 ** 2
+
+    print(f"Image: {width} x {height} float32 ({frame_mb:.1f} MB), regions: {', '.join(regions)}\n")
+    print(f"{'Method':<20}{'Time [ms]':>12}{'Peak memory [MB]':>20}{'Max diff':>12}")
+
+    results = {}
+    reference = None
+
+    for name, method in methods.items():
+        stats, seconds, peak = measure(method, img, regions)
+        if reference is None:
+            reference = stats
+        diff = max_difference(reference, stats)
+        results[name] = {"time_s": seconds, "peak_bytes": peak, "max_diff": diff}
+
+        print(f"{name:<20}{seconds * 1000:>12.1f}{peak / 1024 ** 2:>20.1f}{diff:>12.2e}")
+
+        if diff > TOLERANCE:
+            print(f"Warning: {name} differs from {next(iter(methods))} by {diff}")
+
+    return results
+
+
+# Dark-frame correction methods to compare (the first one is used as the reference)
+CORRECTION_METHODS = {
+    "float32": correct_raw_float,
+    "integer (low memory)": correct_raw_integer,
+}
+
+
+# Synthetic uint16 RAW frame (10-bit values with black level) and dark (noise) frame
+def synthetic_raw_pair(width=WIDTH, height=HEIGHT, seed=0):
+    rng = np.random.default_rng(seed)
+    raw = rng.integers(BLACK_LEVEL, 1024, (height, width), dtype=np.uint16)
+    noise = rng.integers(BLACK_LEVEL - 4, BLACK_LEVEL + 24, (height, width), dtype=np.uint16)
+    return raw, noise
+
+
+# Run one correction method in a fresh process, so that its peak RSS is not hidden by earlier runs
+def correction_job(name, width, height):
+    raw, noise = synthetic_raw_pair(width, height)
+    baseline, _ = peak_rss()
+
+    start = time.perf_counter()
+    img = CORRECTION_METHODS[name](raw, noise)
+    seconds = time.perf_counter() - start
+
+    # Measured before the region masks are created, which need more memory than the correction itself
+    peak, _ = peak_rss()
+    _, regions = synthetic_frame(width, height)
+    return raw_stats_for_regions(img, regions), seconds, baseline, peak
+
+
+def run_correction_benchmark(methods=CORRECTION_METHODS, width=WIDTH, height=HEIGHT):
+    frame_mb = width * height * 2 / 1024 ** 2
+
+    print(f"\nDark-frame correction: {width} x {height} uint16 RAW and noise frames ({frame_mb:.1f} MB each)\n")
+    print(f"{'Method':<24}{'Time [ms]':>12}{'Peak RSS [MB]':>16}{'Above inputs [MB]':>20}{'Max diff':>12}")
+
+    results = {}
+    reference = None
+    context = multiprocessing.get_context("spawn")
+
+    for name in methods:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            stats, seconds, baseline, peak = pool.submit(correction_job, name, width, height).result()
+
+        if reference is None:
+            reference = stats
+        diff = max_difference(reference, stats)
+        results[name] = {"time_s": seconds, "peak_rss_bytes": peak, "max_diff": diff}
+
+        if peak is None:
+            print(f"{name:<24}{seconds * 1000:>12.1f}{'n/a':>16}{'n/a':>20}{diff:>12.2e}")
+        else:
+            print(f"{name:<24}{seconds * 1000:>12.1f}{peak / 1024 ** 2:>16.1f}"
+                  f"{(peak - baseline) / 1024 ** 2:>20.1f}{diff:>12.2e}")
+
+        # Both corrections work on integers, so the statistics must be identical
+        if diff != 0:
+            print(f"Warning: {name} differs from {next(iter(methods))} by {diff}")
+
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmark()
+    run_correction_benchmark()
@@ -4,9 +4,23 @@ Average Pixel Value (APV) calculator
 This program:
 - Reads .jpg and .dng images (noise and illuminated) acquired from experiments conducted with capture.py
 - Computes a reference mask from the .jpg images
+  (optionally on a downscaled image, refined at full resolution around the sample edge (MASK_SCALE)),
+  or directly from the .dng images without decoding any .jpg image (MASK_SOURCE = "raw")
 - Applies this reference mask to divide both .jpg and .dng images into three regions 
   (inside the sample, outside the sample, and the total area without shrinkage)
 - Calculates the APV of the individual regions and outputs the results in CSV format
+- Can derive robust statistics (median, percentiles, trimmed mean, saturated pixel count) of every region and
+  Bayer channel from one 1024-bin histogram of the 10-bit RAW values (ROBUST_STATS)
+- Can save the APV of every Bayer channel on a grid of GRID_TILE x GRID_TILE pixel tiles, together with the
+  sample mask coverage of every tile, to one compressed array file per time point (GRID_OUTPUT)
+- Can combine all captured frames (n0..nN with f0..fN) of every time point with a streaming (Welford)
+  mean/variance and output the standard error of every mean (AVERAGE_FRAMES)
+- Can subtract a cached master dark frame (average of all noise frames of the experiment with the same
+  exposure time and analogue gain, see master_dark.py) instead of the single f0 frame (MASTER_DARK)
+- Can distribute the time points and shutter speeds over several worker processes (NUM_WORKERS)
+- Can update an existing raw_stats.csv incrementally, computing only new or changed time points (INCREMENTAL)
+- Performs the dark-frame correction with integers, in row chunks, to keep the peak memory close to
+  the size of one frame when the analysis runs on the Raspberry Pi (LOW_MEMORY), and reports the peak RSS
 
 Purpose:
 - Allows the user to observe the optical changes of the plant-based meat sample over time
@@ -16,10 +30,20 @@ Date: 2026-03
 """
 
 import os
+import sys
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import cv2
-import rawpy
 import numpy as np
 import pandas as pd
+from raw_cache import read_raw_visible
+from master_dark import master_dark_for, master_dark_identity
+
+try:
+    import resource           # Peak memory (RSS) report, not available on Windows
+except ImportError:
+    resource = None
 
 # Edge and shrinkage detection parameters taken from image.py
 
@@ -31,19 +55,50 @@ EDGE_KERNEL = (3, 3)         # Kernel size for morphological gradient
 AREA_MIN = 700000            # Minimum contour area to be considered valid
 AREA_MAX = 9000000           # Maximum contour area to be considered valid
 BLACK_LEVEL = 64             # Sensor black level offset (RAW calibration)
+LOW_MEMORY = True            # Integer dark-frame correction (uint16 result, about one frame of peak memory)
+CORRECTION_CHUNK_ROWS = 64   # Image rows corrected at a time by the integer dark-frame correction
+
+ROBUST_STATS = False         # Add median, percentiles, trimmed mean and saturated pixel count columns
+HIST_BINS = 1024             # Histogram bins (one per 10-bit RAW value)
+PERCENTILES = (5, 95)        # Percentiles added to the median (columns p5, p95, ...)
+TRIM_FRACTION = 0.05         # Fraction of the pixels removed from each end for the trimmed mean
+SATURATION_LEVEL = 1023 - BLACK_LEVEL - 16  # Corrected RAW value above which pixels count as saturated
+                                            # (white level minus black level and a margin for the dark signal)
+
+MASK_SCALE = 1               # Downscale factor for sample detection (1 = full resolution, 2 or 4 = faster)
+MASK_BAND = 8                # [px] Width of the band around the upscaled contour refined at full resolution
+REFINE_TILE = 64             # [px] Tile size used for the full resolution refinement of the band
+
+MASK_SOURCE = "jpeg"         # Images used for sample detection: "jpeg" (n0/f0.jpg) or "raw" (n0/f0.dng)
+RAW_THRESH_VALUE = 40        # Threshold for RAW sample detection (2x2 binned RAW value after dark-frame correction)
+
+NUM_WORKERS = 1              # Number of worker processes for batch processing (1 = serial processing)
+MASTER_DARK = False          # Subtract the master dark frame instead of the single noise frame (f0)
+AVERAGE_FRAMES = False       # Average the APV of all frames (n0..nN) of a time point, not only n0
+GRID_OUTPUT = False          # Save the per-tile APV grid of every time point (GRID_DIRNAME/grid_<time>_<shutter>.npz)
+GRID_TILE = 32               # [px per Bayer channel] Tile size of the APV grid (64 x 64 sensor pixels)
+INCREMENTAL = False          # Only compute rows which are missing from (or outdated in) the existing CSV file
+
+OUT_CSV_NAME = "raw_stats.csv"        # Name of the output CSV file (saved inside root_dir)
+MASK_CACHE_DIRNAME = "mask_cache"     # Folder inside root_dir in which reference masks are cached (incremental mode)
+DARK_STATE_NAME = "master_dark_state.json"   # Master dark frames used by the CSV rows (inside MASK_CACHE_DIRNAME)
+GRID_DIRNAME = "apv_grid"             # Folder inside root_dir in which the APV grids are saved
 
 root_dir = r"C:\Users\kbalc\Desktop\uni\bachelor_project\measurements\3.2-3-6\3-1"
 
 
-# Create a binary mask of the detected sample region and subtract noise before processing with JPEG files.
-def get_mask(img, noise):
+# Subtract background/noise image (if provided) and convert to grayscale (JPEG files).
+def gray_image(img, noise):
 
     # Subtract background/noise image if provided
     if noise is not None:
         img = cv2.subtract(img, noise)
 
     # Convert to grayscale for processing
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+# Threshold the grayscale image and highlight the edges of the thresholded areas.
+def edge_image(gray):
 
     # Smooth image to reduce noise before thresholding
     gray = cv2.GaussianBlur(gray, GAUSSIAN_KERNEL, SIGMA)
@@ -55,23 +110,40 @@ def get_mask(img, noise):
     kernel = cv2.getStructuringElement(cv2.MORPH_RECT, EDGE_KERNEL)
 
     # Use morphological gradient to highlight edges
-    thresh = cv2.morphologyEx(thresh, cv2.MORPH_GRADIENT, kernel)
+    return cv2.morphologyEx(thresh, cv2.MORPH_GRADIENT, kernel)
+
+# Select the largest contour within the valid area range (None if no valid contour is found)
+def find_sample_contour(edges, area_min=AREA_MIN, area_max=AREA_MAX):
 
     # Find contours in the processed binary image
-    contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    contours, _ = cv2.findContours(edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
 
     # Keep only contours within valid area range
-    valid = [c for c in contours if AREA_MIN < cv2.contourArea(c) < AREA_MAX]
+    valid = [c for c in contours if area_min < cv2.contourArea(c) < area_max]
 
     # If no valid contour found, return None
     if not valid:
         return None
 
     # Select the largest valid contour
-    contour = max(valid, key=cv2.contourArea)
+    return max(valid, key=cv2.contourArea)
+
+# Create a binary mask of the detected sample region and subtract noise before processing with JPEG files.
+# With scale > 1 the sample is detected on a downscaled image (see get_mask_pyramid).
+def get_mask(img, noise, scale=None):
+
+    scale = MASK_SCALE if scale is None else scale
+    if scale > 1:
+        return get_mask_pyramid(img, noise, scale)
+
+    edges = edge_image(gray_image(img, noise))
+    contour = find_sample_contour(edges, AREA_MIN, AREA_MAX)
+
+    if contour is None:
+        return None
 
     # Create empty mask
-    mask = np.zeros(gray.shape, np.uint8)
+    mask = np.zeros(edges.shape, np.uint8)
 
     # Fill selected contour into mask
     cv2.drawContours(mask, [contour], -1, 255, -1)
@@ -79,6 +151,129 @@ def get_mask(img, noise):
     # Return boolean mask
     return mask.astype(bool)
 
+# Detect the sample contour on an image downscaled by "scale" (area limits scaled by scale^2),
+# fill the upscaled contour at full resolution and refine the mask in a narrow band around it.
+def get_mask_pyramid(img, noise, scale, band=None):
+
+    band = MASK_BAND if band is None else band
+
+    # Noise subtraction and grayscale conversion are cheap, so they are done at full resolution
+    gray = gray_image(img, noise)
+    h, w = gray.shape
+
+    # Downscale the grayscale image (pixel averaging)
+    small = cv2.resize(gray, (w // scale, h // scale), interpolation=cv2.INTER_AREA)
+
+    contour = find_sample_contour(edge_image(small), AREA_MIN / scale ** 2, AREA_MAX / scale ** 2)
+
+    if contour is None:
+        return None
+
+    # Map the contour points to the centers of the corresponding full resolution pixels
+    contour = np.round(contour * scale + (scale - 1) / 2).astype(np.int32)
+
+    # Fill the upscaled contour
+    mask = np.zeros((h, w), np.uint8)
+    cv2.drawContours(mask, [contour], -1, 255, -1)
+
+    # Recompute the band of pixels around the upscaled contour at full resolution
+    refine_band(gray, mask, contour, band, REFINE_TILE, THRESH_VALUE)
+
+    return mask.astype(bool)
+
+# Tiles (y0, y1, x0, x1) which a band of "band" pixels around the contour passes through:
+# draw the contour on the tile grid and grow it by enough tiles to cover the band width
+def band_tiles(contour, shape, band=None, tile=None):
+
+    band = MASK_BAND if band is None else band
+    tile = REFINE_TILE if tile is None else tile
+    h, w = shape
+    tiles = np.zeros((-(-h // tile), -(-w // tile)), np.uint8)
+    cv2.drawContours(tiles, [contour // tile], -1, 1, 1)
+    grow = 2 * (-(-band // tile)) + 1
+    tiles = cv2.dilate(tiles, np.ones((grow, grow), np.uint8))
+
+    return [(ty * tile, min(h, (ty + 1) * tile), tx * tile, min(w, (tx + 1) * tile)) for ty, tx in np.argwhere(tiles)]
+
+# Recompute the mask inside the band at full resolution. Filling the outer contour of the morphological
+# gradient equals dilating the thresholded image with EDGE_KERNEL, so only the tiles which the band passes
+# through are blurred, thresholded and dilated (with a margin for the blur and dilation kernels).
+def refine_band(gray, mask, contour, band=None, tile=None, threshold=None):
+
+    band = MASK_BAND if band is None else band
+    tile = REFINE_TILE if tile is None else tile
+    threshold = THRESH_VALUE if threshold is None else threshold
+    h, w = mask.shape
+
+    # Band of pixels within "band" pixels of the contour
+    band_mask = np.zeros((h, w), np.uint8)
+    cv2.drawContours(band_mask, [contour], -1, 255, 2 * band + 1)
+
+    margin = max(GAUSSIAN_KERNEL) // 2 + max(EDGE_KERNEL) // 2 + 1
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, EDGE_KERNEL)
+
+    for y0, y1, x0, x1 in band_tiles(contour, (h, w), band, tile):
+        Y0, Y1 = max(0, y0 - margin), min(h, y1 + margin)
+        X0, X1 = max(0, x0 - margin), min(w, x1 + margin)
+
+        blurred = cv2.GaussianBlur(gray[Y0:Y1, X0:X1], GAUSSIAN_KERNEL, SIGMA)
+        _, thresh = cv2.threshold(blurred, threshold, THRESH_MAX, cv2.THRESH_BINARY)
+        refined = cv2.dilate(thresh, kernel)[y0 - Y0:y1 - Y0, x0 - X0:x1 - X0]
+
+        in_band = band_mask[y0:y1, x0:x1] > 0
+        mask[y0:y1, x0:x1][in_band] = refined[in_band]
+
+# Bin every 2x2 Bayer block (R, G1, G2, B) of a RAW image into one luminance value (half resolution)
+def bin_bayer(img):
+    h, w = img.shape
+    h, w = h - h % 2, w - w % 2
+
+    # Accumulate in float32 (uint16 images could overflow)
+    lum = img[0:h:2, 0:w:2].astype(np.float32)
+    lum += img[0:h:2, 1:w:2]
+    lum += img[1:h:2, 0:w:2]
+    lum += img[1:h:2, 1:w:2]
+    lum *= 0.25
+    return lum
+
+# Create a binary mask of the detected sample region from a dark-frame corrected RAW image.
+# The threshold/edge/contour steps used for the JPEG images are applied to the 2x2 binned luminance plane
+# (binning already averages the noise, so no extra blur is applied; area limits are divided by 4).
+# The filled contour is eroded back to the thresholded area, expanded to full resolution and dilated
+# by EDGE_KERNEL there, which gives the same one pixel edge margin as the JPEG mask.
+def get_mask_raw(img):
+
+    lum = bin_bayer(img)
+
+    # Apply binary threshold (RAW units) to segment object from background
+    _, thresh = cv2.threshold(lum, RAW_THRESH_VALUE, THRESH_MAX, cv2.THRESH_BINARY)
+
+    # Use morphological gradient to highlight edges
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, EDGE_KERNEL)
+    edges = cv2.morphologyEx(thresh.astype(np.uint8), cv2.MORPH_GRADIENT, kernel)
+
+    contour = find_sample_contour(edges, AREA_MIN / 4, AREA_MAX / 4)
+
+    if contour is None:
+        return None
+
+    # Fill selected contour into the binned mask and remove the edge ring added by the gradient
+    binned = np.zeros(edges.shape, np.uint8)
+    cv2.drawContours(binned, [contour], -1, 255, -1)
+    binned = cv2.erode(binned, kernel)
+
+    # Expand every binned pixel to its 2x2 block and add the edge margin at full resolution
+    h, w = binned.shape
+    mask = np.zeros(img.shape, np.uint8)
+    mask[:2 * h, :2 * w] = binned.repeat(2, axis=0).repeat(2, axis=1)
+
+    return cv2.dilate(mask, kernel).astype(bool)
+
+# Intersection over union of two boolean masks (1.0 if both are empty)
+def mask_iou(mask_a, mask_b):
+    union = np.count_nonzero(mask_a | mask_b)
+    return np.count_nonzero(mask_a & mask_b) / union if union else 1.0
+
 # Build logical region masks: inside (current sample area), outside (outside the sample area)
 # and full (everything except shrinkage region)
 
@@ -98,12 +293,10 @@ def build_region_masks(mask_t, mask0):
 
     return inside, outside, full
 
-# Separate Bayer channels (R, G1, G2, B) and compute average pixel values (APV) of the individual regions.
-def raw_stats_with_mask(dng_path, mask, noise_path=None):
+# Dark-frame correction with float32 arrays (black level and RAW noise subtraction)
+def correct_raw_float(raw, noise=None):
 
-    # Load RAW image
-    with rawpy.imread(dng_path) as raw:
-        img = raw.raw_image_visible.astype(np.float32)
+    img = raw.astype(np.float32)
 
     # Subtract black level calibration offset
     img -= BLACK_LEVEL
@@ -112,118 +305,741 @@ def raw_stats_with_mask(dng_path, mask, noise_path=None):
     img = np.clip(img, 0, None)
 
     # Subtract RAW noise
-    if noise_path and os.path.exists(noise_path):
-        with rawpy.imread(noise_path) as raw_f:
-            noise = raw_f.raw_image_visible.astype(np.float32)
+    if noise is not None:
+        noise = noise.astype(np.float32)
         noise -= BLACK_LEVEL
         img = np.clip(img - noise, 0, None)
 
+    return img
+
+# Same dark-frame correction with integer arithmetic. The result is never negative, so it is stored as uint16
+# and only CORRECTION_CHUNK_ROWS rows of int32 are used as scratch space: the peak memory stays close to the
+# size of one uint16 frame. All values are integers, so the statistics are identical to the float32 path.
+# A float noise frame (master dark frame) is subtracted in float32 chunks and gives a float32 result.
+def correct_raw_integer(raw, noise=None, chunk_rows=None):
+
+    chunk_rows = CORRECTION_CHUNK_ROWS if chunk_rows is None else chunk_rows
+    h, w = raw.shape
+    work_type = np.float32 if noise is not None and noise.dtype.kind == "f" else np.int32
+    img = np.empty((h, w), np.float32 if work_type is np.float32 else np.uint16)
+    scratch = np.empty((chunk_rows, w), work_type)
+
+    for y in range(0, h, chunk_rows):
+        rows = min(chunk_rows, h - y)
+        s = scratch[:rows]
+
+        # Subtract black level calibration offset and clip negative values
+        np.subtract(raw[y:y + rows], BLACK_LEVEL, out=s, dtype=work_type)
+        np.maximum(s, 0, out=s)
+
+        # Subtract RAW noise (noise - BLACK_LEVEL) and clip negative values
+        if noise is not None:
+            np.subtract(s, noise[y:y + rows], out=s, dtype=work_type)
+            s += BLACK_LEVEL
+            np.maximum(s, 0, out=s)
+
+        img[y:y + rows] = s
+
+    return img
+
+# Load a RAW(DNG) image and perform dark-frame correction (black level and RAW noise subtraction) once
+def load_corrected_raw(dng_path, noise_path=None):
+
+    # Load RAW images (decoded once and then read from the RAW cache)
+    raw = read_raw_visible(dng_path)
+    noise = None
+    if noise_path and os.path.exists(noise_path):
+        noise = master_dark_for(noise_path) if MASTER_DARK else read_raw_visible(noise_path)
+
+    if LOW_MEMORY:
+        return correct_raw_integer(raw, noise)
+    return correct_raw_float(raw, noise)
+
+# Bayer channel offsets (row, column) inside every 2x2 block of the sensor
+BAYER_CHANNELS = {
+    "R": (0, 0),
+    "G1": (0, 1),
+    "G2": (1, 0),
+    "B": (1, 1),
+}
+
+BINCOUNT_CHUNK_ROWS = 64     # Image rows reduced per np.bincount call (limits the size of temporary arrays)
+
+# Sum and count the pixels of every combination of regions and Bayer channels with np.bincount.
+# Every pixel gets a small integer label: bits 0-1 hold the Bayer channel (row % 2 * 2 + column % 2)
+# and bit 2 + i is set if the pixel belongs to region i. The image is reduced in blocks of rows,
+# so the labels are never larger than BINCOUNT_CHUNK_ROWS rows of uint8.
+# The gain over boolean indexing of every region and channel is memory (about 7 MB instead of 88 MB peak
+# at 12 MP), not speed: the run time depends on the machine and can be higher with histograms=True
+# (see apv_benchmark.py).
+# Returns two arrays of shape (2 ** number of regions, 4): sums and pixel counts per label.
+# With histograms=True a third array of shape (2 ** number of regions, 4, HIST_BINS) holds the histogram
+# of the (rounded) pixel values of every label, built with the same labels in the same pass
+# (the pixel counts are then taken from the histograms).
+def region_label_sums(img, masks, chunk_rows=BINCOUNT_CHUNK_ROWS, histograms=False):
+
+    if len(masks) > 6:
+        raise ValueError("At most 6 regions can be encoded into the uint8 label image")
+
     h, w = img.shape
+    n_bins = 4 << len(masks)
+    chunk_rows = max(2, chunk_rows - chunk_rows % 2)   # Even, so every chunk starts on an R/G1 row
+
+    # Bayer channel label of a block of rows (identical for every chunk)
+    channel_labels = ((np.arange(chunk_rows)[:, None] % 2) * 2 + np.arange(w)[None, :] % 2).astype(np.uint8)
+
+    labels = np.empty((chunk_rows, w), np.uint8)
+    region_bits = np.empty((chunk_rows, w), np.uint8)
+    sums = np.zeros(n_bins, np.float64)
+    counts = np.zeros(n_bins, np.int64)
+    hist = np.zeros(n_bins * HIST_BINS, np.int64) if histograms else None
 
-    # Extract Bayer channels
-    R  = img[0:h:2, 0:w:2][mask[0:h:2, 0:w:2]]
-    G1 = img[0:h:2, 1:w:2][mask[0:h:2, 1:w:2]]
-    G2 = img[1:h:2, 0:w:2][mask[1:h:2, 0:w:2]]
-    B  = img[1:h:2, 1:w:2][mask[1:h:2, 1:w:2]]
+    for y in range(0, h, chunk_rows):
+        rows = min(chunk_rows, h - y)
+        lab = labels[:rows]
+        bits = region_bits[:rows]
+
+        lab[...] = channel_labels[:rows]
+        for i, mask in enumerate(masks):
+            np.left_shift(mask[y:y + rows].view(np.uint8), i + 2, out=bits)
+            lab |= bits
+
+        lab = lab.ravel()
+        values = img[y:y + rows].ravel()
+        sums += np.bincount(lab, weights=values, minlength=n_bins)
+
+        # Histogram of every label: bin index label * HIST_BINS + pixel value
+        if not histograms:
+            counts += np.bincount(lab, minlength=n_bins)
+        else:
+            if values.dtype.kind == "f":
+                values = np.rint(values)      # Master dark corrected images are not integers
+            index = np.clip(values, 0, HIST_BINS - 1).astype(np.int32)
+            index += lab.astype(np.int32) * HIST_BINS
+            hist += np.bincount(index, minlength=n_bins * HIST_BINS)
+
+    if histograms:
+        hist = hist.reshape(-1, 4, HIST_BINS)
+        return sums.reshape(-1, 4), hist.sum(axis=2), hist
+    return sums.reshape(-1, 4), counts.reshape(-1, 4)
+
+# Robust statistics of a histogram of integer pixel values, in O(number of bins):
+# nearest-rank percentiles (same as np.percentile(..., method="inverted_cdf")), the mean after removing
+# int(TRIM_FRACTION * N) pixels from each end (same as scipy.stats.trim_mean) and the saturated pixel count
+def histogram_stats(hist):
+    total = int(hist.sum())
+    cdf = np.cumsum(hist)
+    values = np.arange(len(hist))
+
+    def percentile(q):
+        return float(np.searchsorted(cdf, max(q / 100 * total, 1))) if total else np.nan
+
+    # Pixels of every bin whose rank lies in (k, N - k]
+    k = int(TRIM_FRACTION * total)
+    kept = np.clip(np.minimum(cdf, total - k) - np.maximum(cdf - hist, k), 0, None)
+    kept_total = kept.sum()
+
+    stats = {"median": percentile(50)}
+    for q in PERCENTILES:
+        stats[f"p{q:g}"] = percentile(q)
+    stats["trimmed_mean"] = float(kept @ values / kept_total) if kept_total else np.nan
+    stats["saturated"] = int(hist[SATURATION_LEVEL:].sum())
+
+    return stats
+
+# Compute the APV of every region and Bayer channel (R, G1, G2, B) of a dark-frame corrected RAW image.
+# All sums and counts come from region_label_sums, so no per-region or per-channel copies of the image are made.
+def raw_stats_for_regions(img, regions):
+
+    names = list(regions)
+    masks = [regions[name] for name in names]
+    if ROBUST_STATS:
+        label_sums, label_counts, label_hist = region_label_sums(img, masks, histograms=True)
+    else:
+        label_sums, label_counts = region_label_sums(img, masks)
+    combinations = np.arange(label_sums.shape[0])
+
+    stats = {}
+
+    for i, region_name in enumerate(names):
+
+        # Add up all region combinations which contain this region
+        member = (combinations >> i) & 1 == 1
+        sums = label_sums[member].sum(axis=0)
+        counts = label_counts[member].sum(axis=0)
+
+        # Channel means (NaN for empty regions, same as the mean of an empty array)
+        means = {c: sums[k] / counts[k] if counts[k] else np.nan for k, c in enumerate(BAYER_CHANNELS)}
+        total_count = counts.sum()
+
+        # Dictionary of mean intensities
+        stats[region_name] = {
+            "mean_raw": sums.sum() / total_count if total_count else np.nan,  # Mean over all masked pixels
+            "R_mean": means["R"],                                                 # Red channel mean
+            "G1_mean": means["G1"],                                               # Green channel 1 mean
+            "G2_mean": means["G2"],                                               # Green channel 2 mean
+            "G_mean": (means["G1"] + means["G2"]) / 2,                            # Combined green mean
+            "B_mean": means["B"]                                                  # Blue channel mean
+        }
+
+        if ROBUST_STATS:
+            stats[region_name] = insert_robust_stats(stats[region_name], label_hist[member].sum(axis=0))
+
+    return stats
+
+# Add the robust statistics of every channel next to its mean (median_raw after mean_raw, R_median after R_mean, ...).
+# hist holds the histograms of the four Bayer channels of a region.
+def insert_robust_stats(region_stats, hist):
+    channel_hist = {
+        "raw": hist.sum(axis=0),
+        "R": hist[0],
+        "G1": hist[1],
+        "G2": hist[2],
+        "G": hist[1] + hist[2],
+        "B": hist[3]
+    }
+
+    result = {}
+    for key, value in region_stats.items():
+        result[key] = value
+
+        if key == "mean_raw":
+            for name, v in histogram_stats(channel_hist["raw"]).items():
+                result[f"{name}_raw"] = v
+        else:
+            channel = key[:-len("_mean")]
+            for name, v in histogram_stats(channel_hist[channel]).items():
+                result[f"{channel}_{name}"] = v
+
+    return result
+
+# Separate Bayer channels (R, G1, G2, B) and compute average pixel values (APV) of a single region.
+def raw_stats_with_mask(dng_path, mask, noise_path=None):
+    img = load_corrected_raw(dng_path, noise_path)
+    return raw_stats_for_regions(img, {"region": mask})["region"]
+
+# Sum every tile x tile block of a 2D array with a reshape (partial tiles at the right and bottom edge are ignored)
+def tile_sums(channel, tile):
+    gh, gw = channel.shape[0] // tile, channel.shape[1] // tile
+    return channel[:gh * tile, :gw * tile].reshape(gh, tile, gw, tile).sum(axis=(1, 3), dtype=np.float64)
+
+# APV grid of a dark-frame corrected RAW image: mean of every Bayer channel per tile (all pixels and sample
+# pixels only, NaN where a tile contains no sample) and the fraction of every tile covered by the sample mask.
+# Arrays have the shape (4, rows, columns) (channels in BAYER_CHANNELS order) and (rows, columns).
+def tile_grid(img, mask, tile=None):
+    tile = GRID_TILE if tile is None else tile
+    apv = []
+    sample_apv = []
+    coverage = None
+
+    for dy, dx in BAYER_CHANNELS.values():
+        channel = img[dy::2, dx::2]
+        channel_mask = mask[dy::2, dx::2]
+
+        mask_counts = tile_sums(channel_mask, tile)
+        apv.append(tile_sums(channel, tile) / (tile * tile))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sample_apv.append(tile_sums(np.where(channel_mask, channel, 0), tile) / mask_counts)
+
+        coverage = mask_counts if coverage is None else coverage + mask_counts
 
-    # Return dictionary of mean intensities
     return {
-        "mean_raw": img[mask].mean(),                 # Mean over all masked pixels
-        "R_mean": R.mean(),                           # Red channel mean
-        "G1_mean": G1.mean(),                         # Green channel 1 mean
-        "G2_mean": G2.mean(),                         # Green channel 2 mean
-        "G_mean": np.mean([G1.mean(), G2.mean()]),    # Combined green mean
-        "B_mean": B.mean()                            # Blue channel mean
+        "apv": np.array(apv, np.float32),
+        "sample_apv": np.array(sample_apv, np.float32),
+        "coverage": (coverage / (4 * tile * tile)).astype(np.float32),
+        "tile": tile
     }
 
+def grid_path(root_dir, t, shutter):
+    return os.path.join(root_dir, GRID_DIRNAME, f"grid_{t}_{shutter}.npz")
+
+# Save the APV grid of a time point (averaged over all frames of the time point)
+def save_tile_grid(root_dir, t, shutter, grids):
+    os.makedirs(os.path.join(root_dir, GRID_DIRNAME), exist_ok=True)
+    np.savez_compressed(
+        grid_path(root_dir, t, shutter),
+        apv=np.mean([g["apv"] for g in grids], axis=0),
+        sample_apv=np.mean([g["sample_apv"] for g in grids], axis=0),
+        coverage=grids[0]["coverage"],
+        tile=grids[0]["tile"],
+        time_min=float(t),
+        shutter_us=int(shutter),
+        channels=list(BAYER_CHANNELS)
+    )
+
+# Load the saved APV grids of one shutter speed (no DNG decoding needed).
+# Returns the times [min] and arrays of shape (times, 4, rows, columns) and (times, rows, columns).
+def load_tile_grids(root_dir, shutter):
+    times, apv, sample_apv, coverage = [], [], [], []
+    for t in list_time_folders(root_dir):
+        path = grid_path(root_dir, t, shutter)
+        if not os.path.exists(path):
+            continue
+        with np.load(path) as data:
+            times.append(float(data["time_min"]))
+            apv.append(data["apv"])
+            sample_apv.append(data["sample_apv"])
+            coverage.append(data["coverage"])
+    return np.array(times), np.array(apv), np.array(sample_apv), np.array(coverage)
+
+# Streaming (Welford) mean and variance of a vector of statistics, updated one frame at a time
+class RunningStats:
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.count += 1
+
+        if self.mean is None:
+            self.mean = values.copy()
+            self.m2 = np.zeros_like(values)
+            return
+
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+
+    # Standard error of the mean (NaN with fewer than two frames)
+    def standard_error(self):
+        if self.count < 2:
+            return np.full_like(self.mean, np.nan)
+        return np.sqrt(self.m2 / (self.count - 1) / self.count)
+
+# Illuminated RAW frames (n0.dng, n1.dng, ...) of a (time, shutter) folder, each paired with the noise frame
+# of the same index (f0.dng if there are fewer noise frames than illuminated frames)
+def list_frames(root_dir, t, shutter):
+    folder = os.path.join(root_dir, t, shutter)
+    f0_dng = os.path.join(folder, "f0.dng")
+    frames = []
+
+    i = 0
+    while os.path.exists(os.path.join(folder, f"n{i}.dng")):
+        f_dng = os.path.join(folder, f"f{i}.dng")
+        frames.append((os.path.join(folder, f"n{i}.dng"), f_dng if os.path.exists(f_dng) else f0_dng))
+        i += 1
+
+    return frames
+
 # Collect all time folders
-time_folders = sorted(
-    [f for f in os.listdir(root_dir)
-     if os.path.isdir(os.path.join(root_dir, f)) and f.replace('.', '', 1).isdigit()],
-    key=lambda x: float(x)   # Sort numerically
-)
+def list_time_folders(root_dir):
+    return sorted(
+        [f for f in os.listdir(root_dir)
+         if os.path.isdir(os.path.join(root_dir, f)) and f.replace('.', '', 1).isdigit()],
+        key=lambda x: float(x)   # Sort numerically
+    )
 
 # Collect all shutter subfolders across time folders
-shutters = sorted(
-    {s for t in time_folders
-     for s in os.listdir(os.path.join(root_dir, t))
-     if os.path.isdir(os.path.join(root_dir, t, s)) and s.isdigit()},
-    key=int  # Sort numerically
-)
-
-rows = []
-
-for shutter in shutters:
-    print(f"\nProcessing shutter {shutter}")
-	
-	# Build reference mask from the first time point
-    t0 = time_folders[0]
+def list_shutters(root_dir, time_folders):
+    return sorted(
+        {s for t in time_folders
+         for s in os.listdir(os.path.join(root_dir, t))
+         if os.path.isdir(os.path.join(root_dir, t, s)) and s.isdigit()},
+        key=int  # Sort numerically
+    )
+
+# Detect the sample mask of a (time, shutter) folder from the JPEG images.
+# Returns None if no sample is detected.
+def jpeg_mask(root_dir, t, shutter):
+
+    n0_jpg = os.path.join(root_dir, t, shutter, "n0.jpg")
+    f0_jpg = os.path.join(root_dir, t, shutter, "f0.jpg")
 
-    n0_jpg_0 = os.path.join(root_dir, t0, shutter, "n0.jpg")
-    f0_jpg_0 = os.path.join(root_dir, t0, shutter, "f0.jpg")
+    # Load images for mask computation
+    img_n = cv2.imread(n0_jpg)
+    img_f = cv2.imread(f0_jpg) if os.path.exists(f0_jpg) else None
 
-    # Load reference JPG images
-    img_n0 = cv2.imread(n0_jpg_0)
-    img_f0 = cv2.imread(f0_jpg_0) if os.path.exists(f0_jpg_0) else None
+    return get_mask(img_n, img_f)
+
+# Build reference mask from the first time point
+def build_reference_mask(root_dir, t0, shutter):
+
+    if MASK_SOURCE == "raw":
+        n0_dng_0 = os.path.join(root_dir, t0, shutter, "n0.dng")
+        f0_dng_0 = os.path.join(root_dir, t0, shutter, "f0.dng")
+        return get_mask_raw(load_corrected_raw(n0_dng_0, f0_dng_0))
 
     # Generate reference mask from JPEG images.
-    mask0 = get_mask(img_n0, img_f0)
+    return jpeg_mask(root_dir, t0, shutter)
 
-    # Process each time point using the reference mask
-    for t in time_folders:
+# Compute the CSV row of a single (time, shutter) image pair using the reference mask.
+# Returns None if the images are missing or no sample is detected.
+def process_time_point(root_dir, t, shutter, mask0):
 
-        # Build file paths
-        n0_jpg = os.path.join(root_dir, t, shutter, "n0.jpg")
-        f0_jpg = os.path.join(root_dir, t, shutter, "f0.jpg")
-        n0_dng = os.path.join(root_dir, t, shutter, "n0.dng")
-        f0_dng = os.path.join(root_dir, t, shutter, "f0.dng")
+    # Build file paths
+    n0_jpg = os.path.join(root_dir, t, shutter, "n0.jpg")
+    n0_dng = os.path.join(root_dir, t, shutter, "n0.dng")
+    f0_dng = os.path.join(root_dir, t, shutter, "f0.dng")
 
+    if MASK_SOURCE == "raw":
         # Skip if main image does not exist
-        if not os.path.exists(n0_jpg):
-            continue
+        if not os.path.exists(n0_dng):
+            return None
 
-        # Load images for mask computation
-        img_n = cv2.imread(n0_jpg)
-        img_f = cv2.imread(f0_jpg) if os.path.exists(f0_jpg) else None
+        # Decode and dark-frame correct the RAW image pair once and detect the sample in it
+        img_raw = load_corrected_raw(n0_dng, f0_dng)
+        mask_t = get_mask_raw(img_raw)
+    else:
+        # Skip if main image does not exist
+        if not os.path.exists(n0_jpg):
+            return None
 
         # Build mask for current time point
-        mask_t = get_mask(img_n, img_f)
+        mask_t = jpeg_mask(root_dir, t, shutter)
+        img_raw = None
 
-        if mask_t is None:
-            continue
+    if mask_t is None:
+        return None
 
-        # Build logical regions (inside, outside, full)
-        inside, outside, full = build_region_masks(mask_t, mask0)
+    # Build logical regions (inside, outside, full)
+    inside, outside, full = build_region_masks(mask_t, mask0)
 
-        # Compute RAW statistics for each region
-        inside_stats  = raw_stats_with_mask(n0_dng, inside,  f0_dng)
-        outside_stats = raw_stats_with_mask(n0_dng, outside, f0_dng)
-        full_stats    = raw_stats_with_mask(n0_dng, full,    f0_dng)
+    # Decode and dark-frame correct the RAW image pair once, then compute the statistics of all regions
+    if img_raw is None:
+        img_raw = load_corrected_raw(n0_dng, f0_dng)
 
-        # Create row entry
-        row = {
-            "Time_min": float(t),         # Time in minutes
-            "Shutter_us": int(shutter)    # Shutter speed in microseconds
-        }
+    regions = {
+        "inside": inside,
+        "outside": outside,
+        "full": full
+    }
+    region_stats = raw_stats_for_regions(img_raw, regions)
+    grids = [tile_grid(img_raw, mask_t)] if GRID_OUTPUT else []
+
+    # Create row entry
+    row = {
+        "Time_min": float(t),         # Time in minutes
+        "Shutter_us": int(shutter)    # Shutter speed in microseconds
+    }
+
+    if not AVERAGE_FRAMES:
+        # Append region statistics to row dictionary (inside_*, outside_*, full_*)
+        for region_name, stats in region_stats.items():
+            for k, v in stats.items():
+                row[f"{region_name}_{k}"] = v
+
+        if grids:
+            save_tile_grid(root_dir, t, shutter, grids)
+
+        return row
+
+    # Combine the statistics of all frames with the same masks. Only one frame is loaded at a time,
+    # the running mean/variance of the statistics is the only accumulated state.
+    keys = [(region_name, k) for region_name, stats in region_stats.items() for k in stats]
+    running = RunningStats()
+    running.add([region_stats[r][k] for r, k in keys])
+    del img_raw
+
+    for n_dng, f_dng in list_frames(root_dir, t, shutter)[1:]:
+        frame = load_corrected_raw(n_dng, f_dng)
+        frame_stats = raw_stats_for_regions(frame, regions)
+        running.add([frame_stats[r][k] for r, k in keys])
+        if GRID_OUTPUT:
+            grids.append(tile_grid(frame, mask_t))
+        del frame
+
+    if grids:
+        save_tile_grid(root_dir, t, shutter, grids)
+
+    row["Frames"] = running.count     # Number of averaged frames
+
+    # Append the mean and the standard error of every statistic (inside_*, inside_*_sem, ...)
+    for (region_name, k), mean, sem in zip(keys, running.mean, running.standard_error()):
+        row[f"{region_name}_{k}"] = mean
+        row[f"{region_name}_{k}_sem"] = sem
+
+    return row
+
+# Masks are sent to the worker processes bit-packed (8 pixels per byte) to keep the transfer small
+def pack_mask(mask):
+    if mask is None:
+        return None
+    return np.packbits(mask), mask.shape
+
+def unpack_mask(packed):
+    if packed is None:
+        return None
+    bits, shape = packed
+    return np.unpackbits(bits, count=shape[0] * shape[1]).reshape(shape).astype(bool)
+
+# Processing parameters stored with the cached reference masks.
+# If any of them change, the cached masks and all existing rows are considered outdated.
+PROCESSING_PARAMETERS = ("GAUSSIAN_KERNEL", "SIGMA", "THRESH_VALUE", "THRESH_MAX", "EDGE_KERNEL",
+                         "AREA_MIN", "AREA_MAX", "BLACK_LEVEL", "MASK_SCALE", "MASK_BAND",
+                         "MASK_SOURCE", "RAW_THRESH_VALUE", "AVERAGE_FRAMES", "MASTER_DARK",
+                         "ROBUST_STATS", "PERCENTILES", "TRIM_FRACTION", "SATURATION_LEVEL", "GRID_OUTPUT", "GRID_TILE")
+
+# Options copied into every worker process. Spawned workers re-import this module with the default values,
+# so options changed at runtime (by another program or after the import) have to be sent to them.
+WORKER_OPTIONS = PROCESSING_PARAMETERS + ("LOW_MEMORY", "CORRECTION_CHUNK_ROWS", "HIST_BINS", "REFINE_TILE")
+
+def processing_parameters():
+    return json.dumps([globals()[name] for name in PROCESSING_PARAMETERS])
+
+def worker_options():
+    return {name: globals()[name] for name in WORKER_OPTIONS}
+
+# Image required for a CSV row of a (time, shutter) pair (the time point is skipped without it)
+def main_image_path(root_dir, t, shutter):
+    return os.path.join(root_dir, t, shutter, "n0.dng" if MASK_SOURCE == "raw" else "n0.jpg")
+
+# Latest modification time of the images of a (time, shutter) pair (all averaged frames included)
+def input_mtime(root_dir, t, shutter):
+    paths = [os.path.join(root_dir, t, shutter, name) for name in ("n0.jpg", "f0.jpg", "n0.dng", "f0.dng")]
+    if AVERAGE_FRAMES:
+        paths += [p for frame in list_frames(root_dir, t, shutter) for p in frame]
+    return max((os.path.getmtime(p) for p in paths if os.path.exists(p)), default=0.0)
+
+# Identity of the master dark frames used for a (time, shutter) pair (None without MASTER_DARK).
+# A row is outdated when a noise frame with the same settings is added, removed or changed anywhere in the
+# experiment, since the master dark frame then changes for all time points.
+def dark_identity(root_dir, t, shutter):
+    if not MASTER_DARK:
+        return None
+
+    noise_paths = {os.path.join(root_dir, t, shutter, "f0.dng")}
+    if AVERAGE_FRAMES:
+        noise_paths.update(f for _, f in list_frames(root_dir, t, shutter))
+    return sorted(master_dark_identity(p) for p in noise_paths if os.path.exists(p))
+
+def dark_state_path(root_dir):
+    return os.path.join(root_dir, MASK_CACHE_DIRNAME, DARK_STATE_NAME)
+
+# Master dark identities of the existing CSV rows, keyed by "<time>|<shutter>"
+def load_dark_state(root_dir):
+    path = dark_state_path(root_dir)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_dark_state(root_dir, state):
+    os.makedirs(os.path.join(root_dir, MASK_CACHE_DIRNAME), exist_ok=True)
+    with open(dark_state_path(root_dir), "w") as f:
+        json.dump(state, f, indent=1)
+
+def reference_mask_cache_path(root_dir, shutter):
+    return os.path.join(root_dir, MASK_CACHE_DIRNAME, f"mask0_{shutter}.npz")
+
+# Load a cached reference mask. Returns None if there is no cached mask or if it is outdated
+# (different reference time point, changed reference images or changed processing parameters).
+def load_cached_reference_mask(root_dir, t0, shutter):
+    path = reference_mask_cache_path(root_dir, shutter)
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path) as data:
+        if (str(data["params"]) != processing_parameters()
+                or str(data["t0"]) != t0
+                or float(data["source_mtime"]) != input_mtime(root_dir, t0, shutter)):
+            return None
+        return unpack_mask((data["bits"], tuple(data["shape"])))
+
+def save_cached_reference_mask(root_dir, t0, shutter, mask):
+    os.makedirs(os.path.join(root_dir, MASK_CACHE_DIRNAME), exist_ok=True)
+    bits, shape = pack_mask(mask)
+    np.savez(
+        reference_mask_cache_path(root_dir, shutter),
+        bits=bits,
+        shape=np.array(shape),
+        params=processing_parameters(),
+        t0=t0,
+        source_mtime=input_mtime(root_dir, t0, shutter)
+    )
+
+# Load the rows of an existing CSV file, keyed by (Time_min, Shutter_us)
+def load_existing_rows(out_csv):
+    existing = {}
+    for row in pd.read_csv(out_csv).to_dict("records"):
+        existing[(float(row["Time_min"]), int(row["Shutter_us"]))] = row
+    return existing
+
+# Reference masks shared with every worker process (set once per worker by init_worker)
+_worker_root_dir = None
+_worker_masks = {}
+
+# Apply the options of the parent process, then run the initializer of the pool (if any)
+def init_process(options, initializer, initargs):
+    globals().update(options)
+    if initializer is not None:
+        initializer(*initargs)
+
+def init_worker(root_dir, packed_masks):
+    global _worker_root_dir, _worker_masks
+    _worker_root_dir = root_dir
+    _worker_masks = {shutter: unpack_mask(packed) for shutter, packed in packed_masks.items()}
+
+def reference_mask_job(args):
+    root_dir, t0, shutter = args
+    return pack_mask(build_reference_mask(root_dir, t0, shutter))
+
+def time_point_job(job):
+    t, shutter = job
+    return process_time_point(_worker_root_dir, t, shutter, _worker_masks[shutter])
+
+# rawpy (OpenMP) can deadlock in forked processes, so worker processes are always spawned.
+# The current options of this module are applied in every worker before the initializer runs.
+def create_pool(num_workers, initializer=None, initargs=()):
+    return ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_process, initargs=(worker_options(), initializer, initargs))
+
+# Build the reference masks of the given shutters (in parallel if num_workers > 1)
+def build_reference_masks(root_dir, t0, shutters, num_workers=NUM_WORKERS):
+    if num_workers <= 1 or len(shutters) <= 1:
+        return {shutter: build_reference_mask(root_dir, t0, shutter) for shutter in shutters}
+
+    with create_pool(num_workers) as pool:
+        packed = pool.map(reference_mask_job, [(root_dir, t0, shutter) for shutter in shutters])
+        return {shutter: unpack_mask(p) for shutter, p in zip(shutters, packed)}
+
+# Compute the rows of the given (time, shutter) jobs, either serially or with a pool of worker processes.
+# Results are returned in job order in both modes (None for skipped time points).
+def run_jobs(root_dir, jobs, masks, num_workers=NUM_WORKERS):
+
+    if not jobs:
+        return []
+
+    if num_workers <= 1:
+        results = []
+        current_shutter = None
+
+        for t, shutter in jobs:
+            if shutter != current_shutter:
+                print(f"\nProcessing shutter {shutter}")
+                current_shutter = shutter
+            results.append(process_time_point(root_dir, t, shutter, masks[shutter]))
+
+        return results
+
+    print(f"\nProcessing {len(jobs)} time point(s) with {num_workers} worker processes")
+
+    # Send the reference masks to each worker once, then distribute the (time, shutter) jobs.
+    # map() yields the results in submission order, which keeps the serial row order.
+    packed_masks = {shutter: pack_mask(masks[shutter]) for shutter in {s for _, s in jobs}}
+    chunksize = max(1, len(jobs) // (num_workers * 4))
+    results = []
+
+    with create_pool(num_workers, init_worker, (root_dir, packed_masks)) as pool:
+        for (t, shutter), row in zip(jobs, pool.map(time_point_job, jobs, chunksize=chunksize)):
+            print(f"Processed time {t}, shutter {shutter}")
+            results.append(row)
+
+    return results
+
+# Process every (time, shutter) pair of an experiment and return the CSV rows ordered by shutter and time.
+# In incremental mode the existing CSV rows are reused unless they are missing or outdated
+# (newer images than the CSV file, a rebuilt reference mask or, with MASTER_DARK, a changed master dark frame).
+# Time points without a detected sample are kept as rows with empty (NaN) values.
+def process_experiment(root_dir, num_workers=NUM_WORKERS, incremental=INCREMENTAL):
+
+    time_folders = list_time_folders(root_dir)
+    shutters = list_shutters(root_dir, time_folders)
+    t0 = time_folders[0]
+
+    out_csv = os.path.join(root_dir, OUT_CSV_NAME)
+    existing = {}
+    csv_mtime = 0.0
+
+    if incremental and os.path.exists(out_csv):
+        existing = load_existing_rows(out_csv)
+        csv_mtime = os.path.getmtime(out_csv)
+
+    # Reuse cached reference masks in incremental mode, build the missing ones
+    masks = {}
+    if incremental:
+        for shutter in shutters:
+            masks[shutter] = load_cached_reference_mask(root_dir, t0, shutter)
+
+    rebuilt = [shutter for shutter in shutters if masks.get(shutter) is None]
+    masks.update(build_reference_masks(root_dir, t0, rebuilt, num_workers))
+
+    if incremental:
+        for shutter in rebuilt:
+            if masks[shutter] is not None:
+                save_cached_reference_mask(root_dir, t0, shutter, masks[shutter])
+
+    # Select the (time, shutter) pairs which have to be computed. With MASTER_DARK, the identity of the master
+    # dark frames of every row is stored and rows computed with another master dark frame are outdated.
+    track_dark = incremental and MASTER_DARK
+    old_dark_state = load_dark_state(root_dir) if track_dark else {}
+    dark_state = {}
+    jobs = []
+    for shutter in shutters:
+        for t in time_folders:
+            key = f"{t}|{shutter}"
+            if track_dark:
+                dark_state[key] = dark_identity(root_dir, t, shutter)
+            up_to_date = (
+                shutter not in rebuilt
+                and (float(t), int(shutter)) in existing
+                and input_mtime(root_dir, t, shutter) <= csv_mtime
+                and old_dark_state.get(key) == dark_state.get(key)
+            )
+            if not up_to_date:
+                jobs.append((t, shutter))
+
+    if incremental:
+        print(f"{len(jobs)} of {len(shutters) * len(time_folders)} time point(s) need to be computed")
+
+    new_rows = dict(zip(jobs, run_jobs(root_dir, jobs, masks, num_workers)))
+
+    # Time points without a detected sample are recorded with empty (NaN) values in incremental mode,
+    # so they are not computed again by every following run
+    if incremental:
+        for t, shutter in jobs:
+            if new_rows[(t, shutter)] is None and os.path.exists(main_image_path(root_dir, t, shutter)):
+                new_rows[(t, shutter)] = {"Time_min": float(t), "Shutter_us": int(shutter)}
+
+    if track_dark:
+        save_dark_state(root_dir, dark_state)
+
+    # Merge new and existing rows
+    rows = []
+    for shutter in shutters:
+        for t in time_folders:
+            if (t, shutter) in new_rows:
+                row = new_rows[(t, shutter)]
+            else:
+                row = existing.get((float(t), int(shutter)))
+            if row is not None:
+                rows.append(row)
+
+    return rows
+
+
+# Peak resident memory (RSS) of this process and of the largest worker process in bytes (None if unknown)
+def peak_rss():
+    if resource is None:
+        return None, None
+
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return own, workers
 
-        # Append region statistics to row dictionary
-        for k, v in inside_stats.items():
-            row[f"inside_{k}"] = v
-        for k, v in outside_stats.items():
-            row[f"outside_{k}"] = v
-        for k, v in full_stats.items():
-            row[f"full_{k}"] = v
 
-        rows.append(row)
+if __name__ == "__main__":
 
+    rows = process_experiment(root_dir, NUM_WORKERS, INCREMENTAL)
 
-# Sort and save results to CSV
-df = pd.DataFrame(rows)
+    # Sort and save results to CSV
+    df = pd.DataFrame(rows)
 
-df = df.sort_values(["Shutter_us", "Time_min"])
+    df = df.sort_values(["Shutter_us", "Time_min"])
 
-out_csv = os.path.join(root_dir, "raw_stats.csv")
-df.to_csv(out_csv, index=False)
+    out_csv = os.path.join(root_dir, OUT_CSV_NAME)
+    df.to_csv(out_csv, index=False)
 
+    print("Saved to:", out_csv)
 
-print("Saved to:", out_csv)
+    own, workers = peak_rss()
+    if own is not None:
+        print(f"Peak memory (RSS): {own / 1024 ** 2:.1f} MB"
+              + (f", largest worker: {workers / 1024 ** 2:.1f} MB" if workers else ""))
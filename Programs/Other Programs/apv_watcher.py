@@ -0,0 +1,222 @@
+"""
+Live Average Pixel Value (APV) watcher
+
+This program:
+- Watches the output directory of an experiment while capture.py is still running
+- Detects newly completed <stage>/<shutter>/ folders (n0 images fully written, all frames n0..nN of the series
+  with AVERAGE_FRAMES)
+- Computes the APV of the inside, outside and full regions with the functions of apv_calculator.py
+  as soon as each folder is complete and appends the rows to raw_stats.csv
+- Master dark frames (MASTER_DARK in apv_calculator.py) are built from the noise frames captured so far,
+  so the row of the last stage equals the one of apv_calculator.py, earlier rows use fewer noise frames
+- Uses inotify on Linux (Raspberry Pi) and falls back to polling the directory on other systems
+- Sorts raw_stats.csv by shutter speed and time when it is stopped (Ctrl+C)
+
+Purpose:
+- Lets the user follow the drying curves of the sample during the experiment
+  instead of waiting until the whole experiment has finished
+
+Date: 2026-10
+"""
+
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import pandas as pd
+import apv_calculator as apv
+from master_dark import rescan_groups, read_manifest
+
+root_dir = r"file_path"    # Output directory of the experiment (the one selected in capture.py)
+
+POLL_INTERVAL = 2.0        # [s] Interval at which the directory is scanned when inotify is not available
+SETTLE_TIME = 2.0          # [s] Images must be unchanged for this long before they are considered complete
+
+# inotify event flags (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+# Watch a directory tree with the Linux inotify API (through ctypes, no extra packages needed)
+class InotifyWatcher:
+
+    def __init__(self, root):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+
+        # Watch the root directory and every existing stage/shutter folder
+        self.add_watch(root)
+        for dirpath, dirnames, _ in os.walk(root):
+            for d in dirnames:
+                self.add_watch(os.path.join(dirpath, d))
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd >= 0:
+            self.watches[wd] = path
+
+    # Wait until something changes in the directory tree (or the timeout expires)
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+
+            # Newly created stage/shutter folders must be watched as well
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and wd in self.watches:
+                self.add_watch(os.path.join(self.watches[wd], os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+# Fallback for systems without inotify: simply wait and scan the directory again
+class PollingWatcher:
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, POLL_INTERVAL))
+
+    def close(self):
+        pass
+
+
+def create_watcher(root):
+    if sys.platform.startswith("linux"):
+        try:
+            watcher = InotifyWatcher(root)
+            print("Watching with inotify")
+            return watcher
+        except (OSError, AttributeError) as e:
+            print(f"inotify not available ({e}), polling every {POLL_INTERVAL} s")
+    else:
+        print(f"Polling every {POLL_INTERVAL} s")
+    return PollingWatcher()
+
+
+# Number of illuminated frames (n0..) of the series of a shutter folder, from the metadata manifest
+# (capture.py writes the line of the first frame right away). None if the folder has no manifest.
+def expected_frames(shutter_path):
+    for name, entry in read_manifest(shutter_path).items():
+        if name and name.startswith("n") and name[1:].isdigit() and "image_count" in entry:
+            return int(entry["image_count"])
+    return None
+
+
+# A shutter folder is complete when n0.dng (and n0.jpg, unless the sample is detected from the RAW images)
+# exist and nothing in the folder (e.g. further averaged frames) has changed for SETTLE_TIME seconds.
+# Frames are averaged (AVERAGE_FRAMES) only when all frames of the series exist, since the pause between
+# two frames can be longer than SETTLE_TIME (without a manifest, only the settle time is checked).
+def is_complete(shutter_path, now):
+    if apv.AVERAGE_FRAMES:
+        count = expected_frames(shutter_path)
+        if count is not None and not all(os.path.exists(os.path.join(shutter_path, f"n{i}.dng"))
+                                         for i in range(count)):
+            return False
+
+    names = ("n0.dng",) if apv.MASK_SOURCE == "raw" else ("n0.jpg", "n0.dng")
+    paths = [os.path.join(shutter_path, name) for name in names]
+    try:
+        if not all(os.path.exists(p) for p in paths):
+            return False
+        last_change = max(os.path.getmtime(os.path.join(shutter_path, name)) for name in os.listdir(shutter_path))
+    except OSError:
+        return False
+    return now - last_change >= SETTLE_TIME
+
+
+# Find the (time, shutter) folders which are complete but not processed yet
+def find_ready(root, done, now):
+    ready = []
+    for t in apv.list_time_folders(root):
+        for shutter in apv.list_shutters(root, [t]):
+            if (float(t), int(shutter)) in done:
+                continue
+            if is_complete(os.path.join(root, t, shutter), now):
+                ready.append((t, shutter))
+    return ready
+
+
+# Append a single row to the CSV file (the header is written together with the first row)
+def append_row(out_csv, row):
+    write_header = not os.path.exists(out_csv) or os.path.getsize(out_csv) == 0
+    pd.DataFrame([row]).to_csv(out_csv, mode="a", header=write_header, index=False)
+
+
+# Compute the rows of the complete folders which are not processed yet and append them to the CSV file.
+# The noise frames of new folders change the master dark frames, so the dark frame groups are scanned again
+# and every row uses the noise frames of all stages captured so far (like apv_calculator.py run at that time).
+def process_ready(root, out_csv, done, masks, now):
+    ready = find_ready(root, done, now)
+    if ready:
+        rescan_groups(root)
+
+    for t, shutter in ready:
+
+        # Reference masks are built from the first time point
+        if shutter not in masks:
+            t0 = apv.list_time_folders(root)[0]
+            masks[shutter] = apv.build_reference_mask(root, t0, shutter)
+            if masks[shutter] is None:
+                print(f"Warning: no sample detected in the reference image of shutter {shutter}")
+
+        done.add((float(t), int(shutter)))
+        if masks[shutter] is None:
+            continue
+
+        row = apv.process_time_point(root, t, shutter, masks[shutter])
+        if row is None:
+            print(f"Time {t}, shutter {shutter}: no sample detected")
+            continue
+
+        append_row(out_csv, row)
+        print(f"Time {t}, shutter {shutter}: inside APV {row['inside_mean_raw']:.2f}")
+
+
+def watch(root):
+
+    out_csv = os.path.join(root, apv.OUT_CSV_NAME)
+
+    # Rows which already exist in the CSV file (e.g. when the watcher is restarted) are not computed again
+    done = set(apv.load_existing_rows(out_csv)) if os.path.exists(out_csv) else set()
+
+    masks = {}              # Reference mask of every shutter
+    watcher = create_watcher(root)
+
+    print(f"Watching {root} (Ctrl+C to stop)")
+
+    try:
+        while True:
+            process_ready(root, out_csv, done, masks, time.time())
+            watcher.wait(SETTLE_TIME)
+
+    except KeyboardInterrupt:
+        print("\nStopping...")
+
+    finally:
+        watcher.close()
+
+    # Sort the streamed rows like apv_calculator.py does
+    if os.path.exists(out_csv):
+        df = pd.read_csv(out_csv).sort_values(["Shutter_us", "Time_min"])
+        df.to_csv(out_csv, index=False)
+        print("Saved to:", out_csv)
+
+
+if __name__ == "__main__":
+    watch(root_dir)
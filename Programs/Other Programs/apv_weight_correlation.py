@@ -0,0 +1,209 @@
+"""
+APV-weight correlation program
+
+This program:
+- Loads the weight of every stage of one or more experiments conducted with capture.py from the stage .json files
+  (reported weight and statistics of the raw scale samples: median, standard deviation and trimmed mean)
+- Loads the region statistics (raw_stats.csv) computed by apv_calculator.py for the same experiments
+  (one column per statistic and shutter speed, e.g. inside_R_mean_20000)
+- Joins both on the stage time by interpolating them onto a common time grid (GRID_STEP minutes)
+- Computes for every region/channel column, vectorized over all columns at once:
+  - the lagged correlation with the weight (APV shifted by -MAX_LAG..MAX_LAG grid steps)
+  - the rolling correlation with the weight (ROLLING_WINDOW grid points)
+- Saves the joined series and the rolling correlation of every experiment inside its directory and the
+  lagged correlations of all experiments to one CSV file in output_dir
+
+Purpose:
+- Replaces the manual correlation of weight_data.csv and raw_stats.csv in spreadsheets, for many experiments at once
+
+Date: 2026-10
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from apv_calculator import OUT_CSV_NAME, list_time_folders
+
+root_dirs = [r"file_path"]         # Directories of the experiments
+output_dir = r"file_path"          # Directory of the combined lagged correlation CSV
+WEIGHT_COLUMN = "Weight_g"         # Weight series to correlate with (any column of load_weights)
+GRID_STEP = 20.0                   # [min] Step of the common time grid
+MAX_LAG = 3                        # Largest lag [grid steps] of the lagged correlation
+ROLLING_WINDOW = 5                 # Grid points of the rolling correlation
+MIN_POINTS = 3                     # Minimum number of valid points of a correlation
+EXCLUDED_SUFFIXES = ("_sem", "_saturated", "_saturated_raw")   # raw_stats.csv columns which are not correlated
+JOINED_CSV_NAME = "apv_weight_joined.csv"      # Joined series (saved inside every experiment directory)
+ROLLING_CSV_NAME = "apv_weight_rolling.csv"    # Rolling correlation (saved inside every experiment directory)
+LAGGED_CSV_NAME = "apv_weight_lagged.csv"      # Lagged correlation of all experiments (saved inside output_dir)
+
+
+# Weight of every stage from the stage .json files (<time>/<time>.json) written by capture.py
+def load_weights(root_dir):
+    rows = []
+    for t in list_time_folders(root_dir):
+        json_path = os.path.join(root_dir, t, f"{t}.json")
+        if not os.path.isfile(json_path):
+            continue
+
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        scale = data.get("Scale", {})
+        samples = np.sort(np.asarray(scale.get("raw_samples", []), float))
+        trim = scale.get("trim", 0)
+        trimmed = samples[trim:len(samples) - trim]
+
+        rows.append({
+            "Time_min": float(t),
+            "Weight_g": data.get("Weight(g)", np.nan),                                  # Reported weight
+            "Weight_median_g": np.median(samples) if samples.size else np.nan,          # Median of the raw samples
+            "Weight_std_g": samples.std(ddof=1) if samples.size > 1 else np.nan,        # Scale noise
+            "Weight_trimmed_g": trimmed.mean() if trimmed.size else np.nan,             # Trimmed mean (as capture.py)
+            "Weight_samples": samples.size
+        })
+
+    return pd.DataFrame(rows)
+
+
+# Region statistics as one row per stage time and one column per statistic and shutter speed
+def load_apv(root_dir):
+    df = pd.read_csv(os.path.join(root_dir, OUT_CSV_NAME))
+    columns = [c for c in df.columns if c not in ("Time_min", "Shutter_us", "Frames")
+               and not c.endswith(EXCLUDED_SUFFIXES)]
+
+    wide = df.pivot_table(index="Time_min", columns="Shutter_us", values=columns, aggfunc="mean")
+    wide.columns = [f"{column}_{shutter}" for column, shutter in wide.columns]
+    return wide.sort_index()
+
+
+# Linear interpolation of every column of values (N, C) from times (N,) onto grid (G,) with one index lookup
+# (grid points outside of the measured times are NaN)
+def interpolate(times, values, grid):
+    if len(times) < 2:
+        return np.full((len(grid), values.shape[1]), np.nan)
+
+    i = np.clip(np.searchsorted(times, grid, side="right") - 1, 0, len(times) - 2)
+    frac = ((grid - times[i]) / (times[i + 1] - times[i]))[:, None]
+    out = values[i] * (1 - frac) + values[i + 1] * frac
+    out[(grid < times[0]) | (grid > times[-1])] = np.nan
+    return out
+
+
+# Sums needed for the Pearson correlation of x (G,) with every column of Y (G, C), ignoring NaN pairs.
+# The series are centered first, which keeps the sums of squares accurate.
+def correlation_sums(x, Y):
+    valid = np.isfinite(x)[:, None] & np.isfinite(Y)
+    with np.errstate(invalid="ignore"):
+        x = x - np.nanmean(x) if np.isfinite(x).any() else x
+        Y = Y - np.nanmean(np.where(valid, Y, np.nan), axis=0) if valid.any() else Y
+    xv = np.where(valid, x[:, None], 0.0)
+    yv = np.where(valid, Y, 0.0)
+    return np.stack([valid.astype(float), xv, yv, xv * xv, yv * yv, xv * yv])
+
+
+# Pearson correlation from sums of shape (6, ...)
+# (NaN with fewer than MIN_POINTS valid pairs or a constant series)
+def pearson(sums):
+    n, sx, sy, sxx, syy, sxy = sums
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+    r[(n < MIN_POINTS) | (var_x <= 1e-12 * sxx) | (var_y <= 1e-12 * syy)] = np.nan
+    return r
+
+
+# Correlation of x with every column of Y shifted by each lag (Y later than x for positive lags)
+# Returns an array of shape (lags, C)
+def lagged_correlation(x, Y, max_lag=MAX_LAG):
+    lags = np.arange(-max_lag, max_lag + 1)
+    r = np.full((len(lags), Y.shape[1]), np.nan)
+
+    for i, lag in enumerate(lags):
+        if abs(lag) >= len(x):
+            continue
+        xs, Ys = (x[:len(x) - lag], Y[lag:]) if lag >= 0 else (x[-lag:], Y[:len(x) + lag])
+        r[i] = pearson(correlation_sums(xs, Ys).sum(axis=1))
+
+    return lags, r
+
+
+# Correlation of x with every column of Y over a moving window, from cumulative sums
+# Returns an array of shape (G - window + 1, C) (window i covers the grid points i .. i + window - 1)
+def rolling_correlation(x, Y, window=ROLLING_WINDOW):
+    if len(x) < window:
+        return np.empty((0, Y.shape[1]))
+
+    sums = correlation_sums(x, Y)
+    cumulative = np.concatenate([np.zeros_like(sums[:, :1]), np.cumsum(sums, axis=1)], axis=1)
+    return pearson(cumulative[:, window:] - cumulative[:, :-window])
+
+
+# Join the weight and APV series of one experiment on a common time grid
+def join_experiment(root_dir, step=GRID_STEP):
+    weights = load_weights(root_dir)
+    apv = load_apv(root_dir)
+    if weights.empty or apv.empty:
+        raise ValueError(f"No weight or APV data found in: {root_dir}")
+
+    # Grid over the time range covered by both series
+    start = max(weights["Time_min"].min(), apv.index.min())
+    end = min(weights["Time_min"].max(), apv.index.max())
+    grid = np.arange(start, end + step / 2, step)
+
+    weight_columns = [c for c in weights.columns if c != "Time_min"]
+    joined = pd.concat([
+        pd.DataFrame({"Time_min": grid}),
+        pd.DataFrame(interpolate(weights["Time_min"].to_numpy(float), weights[weight_columns].to_numpy(float), grid),
+                     columns=weight_columns),
+        pd.DataFrame(interpolate(apv.index.to_numpy(float), apv.to_numpy(float), grid), columns=apv.columns)
+    ], axis=1)
+
+    return joined, list(apv.columns)
+
+
+def correlate_experiments(root_dirs, output_dir):
+    lagged_rows = []
+
+    for root_dir in root_dirs:
+        name = os.path.basename(os.path.normpath(root_dir))
+        joined, apv_columns = join_experiment(root_dir)
+        joined.to_csv(os.path.join(root_dir, JOINED_CSV_NAME), index=False)
+
+        x = joined[WEIGHT_COLUMN].to_numpy(float)
+        Y = joined[apv_columns].to_numpy(float)
+
+        # Rolling correlation, reported at the center of every window
+        rolling = rolling_correlation(x, Y)
+        centers = joined["Time_min"].to_numpy()[ROLLING_WINDOW // 2:][:len(rolling)]
+        rolling_df = pd.DataFrame(rolling, columns=apv_columns)
+        rolling_df.insert(0, "Time_min", centers)
+        rolling_df.to_csv(os.path.join(root_dir, ROLLING_CSV_NAME), index=False)
+
+        lags, r = lagged_correlation(x, Y)
+        for i, lag in enumerate(lags):
+            for column, value in zip(apv_columns, r[i]):
+                lagged_rows.append({"Experiment": name, "Column": column, "Lag_min": lag * GRID_STEP, "r": value})
+
+        # Strongest correlation at zero lag
+        zero = r[lags == 0][0]
+        if np.isfinite(zero).any():
+            best = int(np.nanargmax(np.abs(zero)))
+            print(f"{name}: {len(joined)} grid points, strongest correlation "
+                  f"{apv_columns[best]} (r = {zero[best]:.3f})")
+        else:
+            print(f"{name}: {len(joined)} grid points, not enough points for a correlation")
+
+    lagged = pd.DataFrame(lagged_rows)
+    os.makedirs(output_dir, exist_ok=True)
+    out_csv = os.path.join(output_dir, LAGGED_CSV_NAME)
+    lagged.to_csv(out_csv, index=False)
+
+    print("\nSaved to:", out_csv)
+    return lagged
+
+
+if __name__ == "__main__":
+    correlate_experiments(root_dirs, output_dir)
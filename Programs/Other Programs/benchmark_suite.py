@@ -0,0 +1,366 @@
+"""
+Analysis benchmark suite
+
+This program:
+- Generates synthetic experiments (synthetic_experiment.py) for every image size in SIZES and stage count
+  in STAGE_COUNTS (generated once and reused by later runs)
+- Runs the analysis hot paths on them, every run in a fresh worker process:
+  - get_mask, build_region_masks and raw_stats_with_mask of apv_calculator.py, and the whole
+    apv_calculator.py batch processing (process_experiment)
+  - the difference map generators (sample_diff_img_generator.py, water_diff_image_generator(raw).py),
+    the GIF builder (gif_generator.py) and the extractors (metadata_extractor.py, weight_extractor.py),
+    which are run as scripts with their directory settings pointed to the synthetic data
+- Measures the wall time (fastest of REPEATS runs), the peak resident memory (RSS) and the throughput (frames/s)
+- Appends the results to a JSON history file and flags every result that is more than REGRESSION_THRESHOLD
+  slower or larger than in the previous run with the same settings on the same host
+
+Purpose:
+- Lets the user notice slowdowns of the analysis programs after a change, before a long reprocessing job
+
+Date: 2026-10
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+import platform
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+work_dir = r"file_path"                         # Synthetic data and benchmark history are stored here
+
+SIZES = ((1152, 648), (2304, 1296), (4608, 2592))   # Image sizes (width, height)
+STAGE_COUNTS = (5, 20)                          # Number of stages of the synthetic experiments
+REPEATS = 3                                     # Runs of every case (the fastest run is reported)
+REGRESSION_THRESHOLD = 0.2                      # Flag results more than 20 % slower (or larger) than before
+HISTORY_NAME = "benchmark_history.json"         # History file (inside work_dir)
+DATA_DIRNAME = "data"                           # Synthetic experiments (inside work_dir)
+CASES = None                                    # Names of the cases to run (None = all cases)
+FONT_PATH = "arial.ttf"                         # TrueType font of the GIF time stamps
+
+PROGRAM_DIR = os.path.dirname(os.path.abspath(__file__))
+WATER_VOLUMES = ("0ml", "48ml")                 # Volume folders of the synthetic water cell experiment
+WATER_EXPOSURES = ("50000", "100000", "150000") # Exposure folders used by water_diff_image_generator(raw).py
+
+
+# Generate the synthetic experiment (and water cell images) of a size and stage count if they do not exist yet
+def dataset(work_dir, width, height, stages):
+    import synthetic_experiment
+
+    path = os.path.join(work_dir, DATA_DIRNAME, f"{width}x{height}_{stages}")
+    done = os.path.join(path, ".complete")
+
+    if not os.path.exists(done):
+        shutil.rmtree(path, ignore_errors=True)
+        synthetic_experiment.generate_experiment(os.path.join(path, "experiment"), width, height, stages)
+        water_cell_dataset(os.path.join(path, "water"), width, height)
+        open(done, "w").close()
+
+    return path
+
+
+# Water cell images in the layout of water_diff_image_generator(raw).py: <exposure>/<volume>/<exposure>/w0, f0.dng
+def water_cell_dataset(path, width, height):
+    import numpy as np
+    import synthetic_experiment as syn
+
+    rng = np.random.default_rng(syn.SEED)
+    reflectance = np.full((height, width), syn.TRAY_REFLECTANCE, np.float32)
+
+    for exposure in WATER_EXPOSURES:
+        for i, volume in enumerate(WATER_VOLUMES):
+            folder = os.path.join(path, exposure, volume, exposure)
+            os.makedirs(folder, exist_ok=True)
+            lamp = 1.0 - 0.1 * i      # Water absorbs part of the light
+            syn.write_dng(os.path.join(folder, "w0.dng"), syn.raw_frame(rng, reflectance, int(exposure), lamp))
+            syn.write_dng(os.path.join(folder, "f0.dng"), syn.raw_frame(rng, reflectance, int(exposure), 0.0))
+
+
+# Image pairs (n0, f0) of the first shutter speed of every stage
+def image_pairs(experiment, ext):
+    import apv_calculator as apv
+
+    time_folders = apv.list_time_folders(experiment)
+    shutter = apv.list_shutters(experiment, time_folders)[0]
+    return [(os.path.join(experiment, t, shutter, f"n0.{ext}"), os.path.join(experiment, t, shutter, f"f0.{ext}"))
+            for t in time_folders]
+
+
+# Run a program file as a script with some of its module-level settings replaced.
+# Calls which wait for the user (image windows, plots) are removed.
+def run_script(name, settings):
+    path = os.path.join(PROGRAM_DIR, name)
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+
+    source = re.sub(r"^(\s*)(cv2\.waitKey|cv2\.destroyAllWindows|plt\.show)\(.*\)\s*$", r"\1pass",
+                    source, flags=re.MULTILINE)
+
+    for key, value in settings.items():
+        source, n = re.subn(rf"^{key}\s*=.*$", f"{key} = {value!r}", source, count=1, flags=re.MULTILINE)
+        if n == 0:
+            raise ValueError(f"Setting {key} not found in {name}")
+
+    exec(compile(source, path, "exec"), {"__name__": "__main__", "__file__": path})
+
+
+# Benchmark cases: setup(data) prepares the inputs (not timed), run(state) is timed and returns the number
+# of processed frames (image pairs)
+
+def setup_get_mask(data):
+    return image_pairs(os.path.join(data, "experiment"), "jpg")
+
+def run_get_mask(pairs):
+    import cv2
+    from apv_calculator import get_mask
+
+    for n0, f0 in pairs:
+        get_mask(cv2.imread(n0), cv2.imread(f0))
+    return len(pairs)
+
+def setup_region_masks(data):
+    import cv2
+    from apv_calculator import get_mask
+
+    return [get_mask(cv2.imread(n0), cv2.imread(f0)) for n0, f0 in image_pairs(os.path.join(data, "experiment"), "jpg")]
+
+def run_region_masks(masks):
+    from apv_calculator import build_region_masks
+
+    for mask_t in masks:
+        build_region_masks(mask_t, masks[0])
+    return len(masks)
+
+def setup_raw_stats(data):
+    import cv2
+    from apv_calculator import get_mask
+
+    pairs = image_pairs(os.path.join(data, "experiment"), "jpg")
+    mask0 = get_mask(cv2.imread(pairs[0][0]), cv2.imread(pairs[0][1]))
+    return mask0, image_pairs(os.path.join(data, "experiment"), "dng")
+
+def run_raw_stats(state):
+    from apv_calculator import raw_stats_with_mask
+
+    mask0, pairs = state
+    for n0, f0 in pairs:
+        raw_stats_with_mask(n0, mask0, f0)
+    return len(pairs)
+
+def setup_apv_calculator(data):
+    return os.path.join(data, "experiment")
+
+def run_apv_calculator(experiment):
+    from apv_calculator import process_experiment
+
+    return len(process_experiment(experiment, 1, False))
+
+def setup_sample_diff(data):
+    out_dir = os.path.join(data, "diff_output")
+    for color in ("red", "blue"):
+        os.makedirs(os.path.join(out_dir, color), exist_ok=True)
+    return os.path.join(data, "experiment"), out_dir
+
+def run_sample_diff(state):
+    experiment, out_dir = state
+    run_script("sample_diff_img_generator.py", {
+        "root_dir": experiment,
+        "output_dir_red": os.path.join(out_dir, "red"),
+        "output_dir_blue": os.path.join(out_dir, "blue")
+    })
+    return len(image_pairs(experiment, "jpg"))
+
+def setup_water_diff(data):
+    return os.path.join(data, "water")
+
+def run_water_diff(water):
+    run_script("water_diff_image_generator(raw).py", {"root_dir": water})
+    return len(WATER_EXPOSURES) * len(WATER_VOLUMES)
+
+# The GIF builder combines the illuminated JPEG images of every stage (named <time>_<name>.jpg)
+def setup_gif(data):
+    out_dir = os.path.join(data, "gif_input")
+    os.makedirs(out_dir, exist_ok=True)
+    for n0, _ in image_pairs(os.path.join(data, "experiment"), "jpg"):
+        time_name = os.path.basename(os.path.dirname(os.path.dirname(n0)))
+        shutil.copyfile(n0, os.path.join(out_dir, f"{time_name}_n0.jpg"))
+    return out_dir
+
+def run_gif(out_dir):
+    run_script("gif_generator.py", {"root_dir": out_dir, "font_path": FONT_PATH})
+    return len(glob.glob(os.path.join(out_dir, "*.jpg")))
+
+def run_metadata_extractor(experiment):
+    run_script("metadata_extractor.py", {"root_dir": experiment})
+    return len(image_pairs(experiment, "jpg"))
+
+def run_weight_extractor(experiment):
+    run_script("weight_extractor.py", {"root_dir": experiment})
+    return len(image_pairs(experiment, "jpg"))
+
+
+BENCHMARK_CASES = {
+    "get_mask": (setup_get_mask, run_get_mask),
+    "build_region_masks": (setup_region_masks, run_region_masks),
+    "raw_stats_with_mask": (setup_raw_stats, run_raw_stats),
+    "apv_calculator": (setup_apv_calculator, run_apv_calculator),
+    "sample_diff_img_generator": (setup_sample_diff, run_sample_diff),
+    "water_diff_image_generator": (setup_water_diff, run_water_diff),
+    "gif_generator": (setup_gif, run_gif),
+    "metadata_extractor": (setup_apv_calculator, run_metadata_extractor),
+    "weight_extractor": (setup_apv_calculator, run_weight_extractor),
+}
+
+
+# Run one case in the current (fresh worker) process. DNG files are decoded on every run (no RAW cache),
+# so repeated runs measure the same work. The sample area limits of apv_calculator.py are set for the full
+# sensor size and are scaled to the image size.
+def case_job(name, data, width, height):
+    import raw_cache
+    import apv_calculator as apv
+    import synthetic_experiment as syn
+
+    raw_cache.CACHE_ENABLED = False
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    area_scale = width * height / (syn.WIDTH * syn.HEIGHT)
+    apv.AREA_MIN, apv.AREA_MAX = apv.AREA_MIN * area_scale, apv.AREA_MAX * area_scale
+    setup, run = BENCHMARK_CASES[name]
+
+    try:
+        state = setup(data)
+        start = time.perf_counter()
+        frames = run(state)
+        seconds = time.perf_counter() - start
+    except Exception as e:
+        return {"status": f"error: {type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+
+    peak, _ = apv.peak_rss()
+    return {
+        "status": "ok",
+        "time_s": seconds,
+        "peak_rss_bytes": peak,
+        "frames": frames,
+        "frames_per_s": frames / seconds if seconds > 0 else None
+    }
+
+
+# Run a case REPEATS times, each time in a new process (so the peak RSS belongs to that case only).
+# Reports the fastest run and the lowest peak RSS.
+def measure_case(name, data, width, height, repeats=REPEATS):
+    context = multiprocessing.get_context("spawn")
+    results = []
+
+    for _ in range(repeats):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(case_job, name, data, width, height).result()
+        if result["status"] != "ok":
+            return result
+        results.append(result)
+
+    best = min(results, key=lambda r: r["time_s"])
+    peaks = [r["peak_rss_bytes"] for r in results if r["peak_rss_bytes"] is not None]
+    return dict(best, peak_rss_bytes=min(peaks) if peaks else None)
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+# Identifies the machine a run was measured on (name, architecture and CPU count). Results of other
+# machines (or of the same machine name with other hardware) are not compared.
+def host_id():
+    return f"{platform.node()}|{platform.machine()}|{os.cpu_count()}"
+
+
+# Latest earlier result of every case key measured on the given host
+def previous_results(history, host):
+    previous = {}
+    for run in history:
+        if run.get("host_id") != host:
+            continue
+        for key, result in run["results"].items():
+            if result.get("status") == "ok":
+                previous[key] = result
+    return previous
+
+
+# Compare a result with the previous one; returns a list of regression descriptions
+def find_regressions(result, previous, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    if previous is None or result.get("status") != "ok":
+        return regressions
+
+    for metric in ("time_s", "peak_rss_bytes"):
+        old, new = previous.get(metric), result.get(metric)
+        if old and new and new > old * (1 + threshold):
+            regressions.append(f"{metric} {old:.4g} -> {new:.4g} (+{100 * (new / old - 1):.0f} %)")
+
+    return regressions
+
+
+def run_suite(work_dir, sizes=SIZES, stage_counts=STAGE_COUNTS, cases=CASES):
+    history_path = os.path.join(work_dir, HISTORY_NAME)
+    history = load_history(history_path)
+    host = host_id()
+    previous = previous_results(history, host)
+    cases = list(BENCHMARK_CASES) if cases is None else cases
+
+    results = {}
+    flagged = []
+
+    print(f"{'Case':<30}{'Size':>12}{'Stages':>8}{'Time [s]':>10}{'Frames/s':>10}{'Peak RSS [MB]':>15}")
+
+    for width, height in sizes:
+        for stages in stage_counts:
+            data = dataset(work_dir, width, height, stages)
+
+            for name in cases:
+                key = f"{name}|{width}x{height}|{stages}"
+                result = measure_case(name, data, width, height)
+                results[key] = result
+
+                if result["status"] != "ok":
+                    print(f"{name:<30}{f'{width}x{height}':>12}{stages:>8}  {result['status']}")
+                    continue
+
+                peak = result["peak_rss_bytes"]
+                print(f"{name:<30}{f'{width}x{height}':>12}{stages:>8}{result['time_s']:>10.3f}"
+                      f"{result['frames_per_s']:>10.2f}{peak / 1024 ** 2 if peak else float('nan'):>15.1f}")
+
+                for regression in find_regressions(result, previous.get(key)):
+                    flagged.append(f"{key}: {regression}")
+
+    # Append this run to the history
+    history.append({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "host_id": host,
+        "python": platform.python_version(),
+        "repeats": REPEATS,
+        "results": {key: {k: v for k, v in r.items() if k != "traceback"} for key, r in results.items()}
+    })
+    with open(history_path, "w") as f:
+        json.dump(history, f, indent=2)
+
+    if flagged:
+        print(f"\nRegressions (more than {100 * REGRESSION_THRESHOLD:.0f} % worse than the previous run on this host):")
+        for line in flagged:
+            print("  " + line)
+    else:
+        print("\nNo regressions")
+
+    print("History saved to:", history_path)
+    return results, flagged
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, PROGRAM_DIR)
+    run_suite(work_dir)
@@ -0,0 +1,146 @@
+"""
+Shutter linearity and saturation fit program
+
+This program:
+- Loads the region statistics (raw_stats.csv) of an experiment computed by apv_calculator.py, where every stage
+  was captured at several shutter speeds (shutter_from..shutter_to, step shutter_by in capture.py)
+- Fits APV = intercept + slope * ExposureTime for every stage, region (inside, outside, full) and channel
+  (raw, R, G1, G2, G, B) with one vectorized least-squares solve: the fits of all stages, series and
+  shutter speed ranges are computed at once from cumulative sums over the sorted shutter speeds
+- Finds the onset of saturation: the first shutter speed whose APV falls more than SATURATION_TOLERANCE below
+  the line fitted to the shorter shutter speeds, or whose region has more than MAX_SATURATED_PIXELS saturated
+  pixels (saturated columns of apv_calculator.py with ROBUST_STATS); this and all longer shutter speeds are
+  left out of the fit
+- Saves the slope (signal per us), intercept, saturation onset and number of fitted shutter speeds of every
+  stage and series to exposure_fit.csv inside root_dir
+
+Purpose:
+- Gives one exposure-normalized signal (slope) per stage and series instead of a separate APV series
+  for every shutter speed, and shows which shutter speeds are in the linear range of the sensor
+
+Date: 2026-10
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from apv_calculator import OUT_CSV_NAME
+
+root_dir = r"file_path"            # Directory of the experiment (with raw_stats.csv)
+REGIONS = ("inside", "outside", "full")
+CHANNELS = ("raw", "R", "G1", "G2", "G", "B")
+MIN_POINTS = 2                     # Minimum number of shutter speeds of a fit
+SATURATION_TOLERANCE = 0.05        # APV more than 5 % below the extrapolated line = saturated
+MAX_SATURATED_PIXELS = 0           # Shutter speeds with more saturated pixels in the region are left out
+OUT_FIT_NAME = "exposure_fit.csv"  # Name of the output CSV file (saved inside root_dir)
+
+
+# Column names of the APV and of the saturated pixel count of a series (e.g. inside_R_mean, inside_R_saturated)
+def series_columns(region, channel):
+    if channel == "raw":
+        return f"{region}_mean_raw", f"{region}_saturated_raw"
+    return f"{region}_{channel}_mean", f"{region}_{channel}_saturated"
+
+
+# Arrange the statistics as arrays of shape (stages, shutters, series): APV and saturated flags (NaN/False
+# where a stage has no row for a shutter speed or a column is missing)
+def sweep_arrays(df, series):
+    times = np.sort(df["Time_min"].unique())
+    shutters = np.sort(df["Shutter_us"].unique())
+
+    apv = np.full((len(times), len(shutters), len(series)), np.nan)
+    saturated = np.zeros(apv.shape, bool)
+
+    ti = np.searchsorted(times, df["Time_min"].to_numpy())
+    si = np.searchsorted(shutters, df["Shutter_us"].to_numpy())
+
+    for k, (mean_col, sat_col) in enumerate(series.values()):
+        if mean_col in df:
+            apv[ti, si, k] = df[mean_col].to_numpy(float)
+        if sat_col in df:
+            saturated[ti, si, k] = df[sat_col].to_numpy(float) > MAX_SATURATED_PIXELS
+
+    return times, shutters.astype(float), apv, saturated
+
+
+# Least-squares lines through the first m shutter speeds, for every m at once (axis 1).
+# x: shutter speeds (S,), y: APV (T, S, K) with NaN for missing values.
+# Returns slope, intercept and number of points of shape (T, S + 1, K); index m = fit of the first m speeds.
+def prefix_fits(x, y):
+    valid = np.isfinite(y)
+    xc = x - x.mean()                       # Centered for numerical stability
+    xv = np.where(valid, xc[None, :, None], 0.0)
+    yv = np.where(valid, y, 0.0)
+
+    def cumulative(a):
+        return np.concatenate([np.zeros_like(a[:, :1]), np.cumsum(a, axis=1)], axis=1)
+
+    n = cumulative(valid.astype(float))
+    sx, sy = cumulative(xv), cumulative(yv)
+    sxx, sxy = cumulative(xv * xv), cumulative(xv * yv)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        intercept = (sy - slope * sx) / n - slope * x.mean()
+
+    few = n < MIN_POINTS
+    slope[few] = np.nan
+    intercept[few] = np.nan
+    return slope, intercept, n
+
+
+# Fit every stage and series; returns slope, intercept, saturation onset [us] (NaN = none) and
+# number of fitted points, each of shape (stages, series)
+def fit_sweep(shutters, apv, saturated):
+    slope, intercept, n = prefix_fits(shutters, apv)
+
+    # APV of every shutter speed predicted by the line through all shorter shutter speeds
+    predicted = intercept[:, :-1] + slope[:, :-1] * shutters[None, :, None]
+    with np.errstate(invalid="ignore"):
+        below = apv < predicted * (1 - SATURATION_TOLERANCE)
+    onset_flags = below | saturated
+
+    # Index of the first saturated shutter speed (len(shutters) = no saturation)
+    onset = np.where(onset_flags.any(axis=1), onset_flags.argmax(axis=1), len(shutters))
+
+    index = onset[:, None, :]
+    fit_slope = np.take_along_axis(slope, index, axis=1)[:, 0]
+    fit_intercept = np.take_along_axis(intercept, index, axis=1)[:, 0]
+    points = np.take_along_axis(n, index, axis=1)[:, 0].astype(int)
+    onset_us = np.where(onset < len(shutters), shutters[np.minimum(onset, len(shutters) - 1)], np.nan)
+
+    return fit_slope, fit_intercept, onset_us, points
+
+
+def exposure_fit(root_dir):
+    df = pd.read_csv(os.path.join(root_dir, OUT_CSV_NAME))
+
+    series = {f"{region}_{channel}": series_columns(region, channel) for region in REGIONS for channel in CHANNELS}
+    series = {name: cols for name, cols in series.items() if cols[0] in df}
+
+    times, shutters, apv, saturated = sweep_arrays(df, series)
+    print(f"{len(times)} stage(s), {len(shutters)} shutter speed(s), {len(series)} series")
+    if len(shutters) < MIN_POINTS:
+        print(f"At least {MIN_POINTS} shutter speeds are needed for a fit")
+
+    slope, intercept, onset_us, points = fit_sweep(shutters, apv, saturated)
+
+    result = {"Time_min": times}
+    for k, name in enumerate(series):
+        result[f"{name}_slope"] = slope[:, k]                  # APV per us of exposure time
+        result[f"{name}_intercept"] = intercept[:, k]          # APV at zero exposure time
+        result[f"{name}_saturation_us"] = onset_us[:, k]       # First saturated shutter speed (NaN = none)
+        result[f"{name}_points"] = points[:, k]                # Number of fitted shutter speeds
+
+    out = pd.DataFrame(result)
+    out_csv = os.path.join(root_dir, OUT_FIT_NAME)
+    out.to_csv(out_csv, index=False)
+
+    saturated_stages = np.isfinite(onset_us).any(axis=1).sum()
+    print(f"Saturation found in {saturated_stages} of {len(times)} stage(s)")
+    print("Saved to:", out_csv)
+    return out
+
+
+if __name__ == "__main__":
+    exposure_fit(root_dir)
@@ -4,6 +4,7 @@ Standalone mass measurement module using the HX711 24-bit ADC and load cell.
 This program:
 - Uses a reference unit derived from hx711_scale_calibration.py
 - Provides real time measurements from the HX711 based scale
+- Can run with the simulated scale of simulation.py (SIMULATE, see Capture Software/hardware.py)
 
 Purpose:
 - Measurement of plant-based sample mass before and after experimental cycles.
@@ -12,13 +13,18 @@ Purpose:
 Date: 2025-10
 """
 
-import time
-import RPi.GPIO as GPIO
-from hx711 import HX711
+import os
+import sys
+
+# hardware.py and simulation.py are in the Capture Software folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Capture Software"))
+from hardware import open_hardware
+
+SIMULATE = False  # Use the simulated scale of simulation.py (no Raspberry Pi needed)
 
 # Setup HX711
-hx = HX711(17, 27)
-hx.set_reading_format("MSB", "MSB")
+hardware = open_hardware(SIMULATE, time_scale=1.0)
+hx = hardware.scale(17, 27)
 hx.set_reference_unit(2817)  # Use your calculated reference unit here
 hx.reset()
 hx.tare()
@@ -29,15 +35,17 @@ print("Press Ctrl+C to exit")
 # Take three measurements, find their average and print it
 try:
     while True:
-        weight = hx.get_weight(3) # Can be adjusted
+        with hardware.timings.measure("read"):
+            weight = hx.read(3) # Can be adjusted
         print(f"Weight {weight:.2f}g")
         
         hx.power_down()
         hx.power_up()
-        time.sleep(0.2)
+        hardware.sleep(0.2)
 
 # Shut down upon interrupt
 except KeyboardInterrupt:
     print("\nExiting...")
 
-    GPIO.cleanup()
+    hardware.timings.report()
+    hardware.cleanup()
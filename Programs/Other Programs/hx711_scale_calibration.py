@@ -3,6 +3,7 @@ Calibration module for the HX711-based load cell measurement system
 
 This program:
 - Determines the reference unit required to convert raw HX711 ADC readings into mass values (grams).
+- Can run with the simulated scale of simulation.py (SIMULATE, see Capture Software/hardware.py)
 
 Purpose:
 - Establish accurate raw-to-mass conversion
@@ -12,13 +13,18 @@ Purpose:
 Date: 2025-10
 """
 
-import time
-import RPi.GPIO as GPIO
-from hx711 import HX711
+import os
+import sys
+
+# hardware.py and simulation.py are in the Capture Software folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Capture Software"))
+from hardware import open_hardware
+
+SIMULATE = False  # Use the simulated scale of simulation.py (no Raspberry Pi needed)
 
 # Setup HX711
-hx = HX711(17, 27) # (DAT,CLK)
-hx.set_reading_format("MSB", "MSB")
+hardware = open_hardware(SIMULATE, time_scale=1.0)
+hx = hardware.scale(17, 27) # (DAT,CLK)
 hx.set_reference_unit(1)
 hx.reset()
 hx.tare()
@@ -33,10 +39,10 @@ known_weight = int(input())
 print("Collecting samples...")
 samples = []
 for i in range(num_samples):
-    reading = hx.get_weight(1)
+    reading = hx.read(1)
     samples.append(reading)
     print(f"{i+1}: {reading}")
-    time.sleep(0.2)
+    hardware.sleep(0.2)
 
 # Remove outliers to avoid changes due to errors
 samples.sort()
@@ -51,4 +57,4 @@ print(f"Reference unit: {reference_unit:.2f}")
 print(f"\nAdd this to your script:")
 print(f"hx.set_reference_unit({reference_unit:.2f})")
 
-GPIO.cleanup()
\ No newline at end of file
+hardware.cleanup()
\ No newline at end of file
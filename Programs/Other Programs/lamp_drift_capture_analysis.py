@@ -5,6 +5,7 @@ This program:
 - Captures images of a given area illuminated by a light source(halogen lamp) at given intervals over time
 - Calculates the average pixel values (APV) of the images and outputs this data into a CSV file
 - Can perform capture and analysis separately
+- Can run with the simulated camera and lamp of simulation.py (SIMULATE, see Capture Software/hardware.py)
 
 Purpose:
 - Used to test the APV drift properties of the light source used in the experiments
@@ -13,15 +14,20 @@ Purpose:
 Date: 2026-02
 """
 
-import time
-# import RPi.GPIO as GPIO
-# from picamera2 import Picamera2
 import os
 import re
-import rawpy
+import sys
 import numpy as np
 import pandas as pd
 import cv2
+from raw_cache import read_raw_visible
+
+# hardware.py and simulation.py are in the Capture Software folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Capture Software"))
+from hardware import open_hardware
+
+SIMULATE = False  # Use the simulated camera and lamp of simulation.py (no Raspberry Pi needed)
+SIMULATED_TIME_SCALE = 0.0  # Real duration of the simulated waits (0.0 = no waiting)
 
 base_dir = os.getcwd()
 dng_output_folder = os.path.join(base_dir, "light_source_drift_images")
@@ -35,10 +41,8 @@ print("3 - Analysis only")
 
 mode = input("Enter 1, 2, or 3: ").strip()
 
-# Set GPIO settings of the light source
+# GPIO pin of the light source
 light_source_pin = 4 # GPIO pin which is used to turn on the light source(halogen lamp, LED and etc.)
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(light_source_pin, GPIO.OUT)
 
 # Capture with these settings
 total_time = 240 # Total time for the experiment
@@ -47,60 +51,57 @@ num_pics = total_time // interval
 
 # Use try/finally to prevent hardware crashes
 def perform_capture():
+    hardware = open_hardware(SIMULATE, time_scale=SIMULATED_TIME_SCALE)
+    timings = hardware.timings
+    lamp = hardware.lamp(light_source_pin)
+
     try:
         # Turn off the camera in case it is turned on
-        picam2 = None
-        GPIO.output(light_source_pin, GPIO.HIGH)
+        camera = None
+        lamp.on()
 
         # Initialize the camera
-        picam2 = Picamera2()
-
-        sensor_width, sensor_height = picam2.sensor_resolution
-
-        config = picam2.create_still_configuration(
-            raw={"size": (sensor_width, sensor_height)},
-            buffer_count=2,
-            controls={
-                "AeEnable": False,
-                "AwbEnable": False,
-                "Brightness": 0.0,
-                "Contrast": 1.0,
-                "Saturation": 1.0,
-                "Sharpness": 1.0,
-                "NoiseReductionMode": 0,
+        camera = hardware.camera()
+
+        camera.configure_still(
+            {
                 "ExposureTime": 150000, # [us]
                 "AnalogueGain": 1.0,
                 "ColourGains": (1.0, 1.0),
                 "LensPosition": 10.0
-            }
+            },
+            raw=True,
+            buffer_count=2
         )
 
-        picam2.configure(config)
-        picam2.start()
-        time.sleep(1.0)  # Allow camera to stabilise
+        camera.start()
+        hardware.sleep(1.0)  # Allow camera to stabilise
 
         # Start time count
-        start_time = time.time()
+        start_time = hardware.clock()
 
         for i in range(num_pics):
-            timestamp = time.time() - start_time
+            timestamp = hardware.clock() - start_time
 
             # Save RAW(DNG) images based on their time stamp
             filename = os.path.join(dng_output_folder, f"image_{timestamp:.1f}s.dng")
 
             # Capture  images
-            picam2.capture_file(filename, name="raw")
+            with timings.measure("capture"):
+                frame = camera.capture_frame(raw=True)
+            with timings.measure("save_dng"):
+                camera.save_dng(frame, filename)
             print(f"Captured RAW {filename}")
-            time.sleep(interval)
+            hardware.sleep(interval)
 
     # Turn the camera off
     finally:
-        if picam2:
-            picam2.stop()
-            picam2.close()
+        if camera:
+            camera.close()
 
-        GPIO.output(light_source_pin, GPIO.LOW) # Turn of the light source
-        GPIO.cleanup()
+        lamp.off() # Turn of the light source
+        hardware.cleanup()
+        timings.report()
         print("Capture finished.")
 
 def perform_analysis():
@@ -124,11 +125,10 @@ def perform_analysis():
 
         # Calculate the average pixel values of the individual DNG images
         try:
-            with rawpy.imread(dng_path) as raw:
-                raw_img = raw.raw_image_visible.astype(np.float32)
-                raw_img -= black_level
-                raw_img = np.clip(raw_img, 0, None)
-                raw_mean = raw_img.mean()
+            raw_img = read_raw_visible(dng_path).astype(np.float32)
+            raw_img -= black_level
+            raw_img = np.clip(raw_img, 0, None)
+            raw_mean = raw_img.mean()
 
         except Exception as e:
             print(f"Skipping {filename}: {e}")
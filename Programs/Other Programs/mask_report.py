@@ -0,0 +1,110 @@
+"""
+Sample mask accuracy report program
+
+This program:
+- Loads the illuminated (n0) and noise (f0) JPEG images of every time point and shutter speed
+  of an experiment conducted with capture.py
+- Detects the sample mask with the full resolution method of apv_calculator.py (get_mask),
+  with the faster reduced-resolution (pyramid) method for every scale in REPORT_SCALES
+  and from the dark-frame corrected RAW (n0/f0.dng) images (get_mask_raw, if COMPARE_RAW is set)
+- Compares the masks (intersection over union (IoU) and area difference) and the detection times
+- Saves the comparison to mask_accuracy.csv inside root_dir and prints a summary
+
+Purpose:
+- Lets the user check whether the faster pyramid mask detection (MASK_SCALE in apv_calculator.py)
+  and the RAW-based detection (MASK_SOURCE = "raw") agree well enough with the JPEG-based detection
+  for the images of a given experiment (and to tune RAW_THRESH_VALUE)
+
+Date: 2026-10
+"""
+
+import os
+import time
+import cv2
+import numpy as np
+import pandas as pd
+from apv_calculator import (list_time_folders, list_shutters, get_mask, get_mask_raw,
+                            load_corrected_raw, mask_iou)
+
+root_dir = r"file_path"       # Directory of the experiment
+REPORT_SCALES = (2, 4)        # Downscale factors compared with the full resolution mask
+COMPARE_RAW = True            # Also compare the mask detected from the RAW(DNG) images
+
+
+# Detect a mask and measure the detection time
+def timed(detect, *args):
+    start = time.perf_counter()
+    mask = detect(*args)
+    return mask, time.perf_counter() - start
+
+
+# Mask of the RAW image pair (decoding and dark-frame correction are included in the time)
+def raw_mask(n0_dng, f0_dng):
+    return get_mask_raw(load_corrected_raw(n0_dng, f0_dng))
+
+
+def mask_report(root_dir, scales=REPORT_SCALES, compare_raw=COMPARE_RAW):
+    time_folders = list_time_folders(root_dir)
+    rows = []
+
+    for shutter in list_shutters(root_dir, time_folders):
+        for t in time_folders:
+            n0_jpg = os.path.join(root_dir, t, shutter, "n0.jpg")
+            f0_jpg = os.path.join(root_dir, t, shutter, "f0.jpg")
+
+            if not os.path.exists(n0_jpg):
+                continue
+
+            img = cv2.imread(n0_jpg)
+            noise = cv2.imread(f0_jpg) if os.path.exists(f0_jpg) else None
+
+            mask_full, time_full = timed(get_mask, img, noise, 1)
+
+            if mask_full is None:
+                print(f"Time {t}, shutter {shutter}: no sample detected at full resolution")
+                continue
+
+            area_full = int(np.count_nonzero(mask_full))
+
+            # Masks to compare with the full resolution JPEG mask
+            methods = {f"pyramid x{scale}": (get_mask, img, noise, scale) for scale in scales}
+
+            n0_dng = os.path.join(root_dir, t, shutter, "n0.dng")
+            f0_dng = os.path.join(root_dir, t, shutter, "f0.dng")
+            if compare_raw and os.path.exists(n0_dng):
+                methods["raw"] = (raw_mask, n0_dng, f0_dng)
+
+            for method, (detect, *args) in methods.items():
+                mask, seconds = timed(detect, *args)
+                area = int(np.count_nonzero(mask)) if mask is not None else 0
+
+                rows.append({
+                    "Time_min": float(t),
+                    "Shutter_us": int(shutter),
+                    "Method": method,
+                    "IoU": mask_iou(mask_full, mask) if mask is not None else 0.0,
+                    "Area_full_px": area_full,
+                    "Area_px": area,
+                    "Area_diff_pct": 100 * (area - area_full) / area_full,
+                    "Time_full_s": time_full,
+                    "Time_s": seconds,
+                    "Speedup": time_full / seconds if seconds > 0 else np.nan
+                })
+
+    df = pd.DataFrame(rows)
+    out_csv = os.path.join(root_dir, "mask_accuracy.csv")
+    df.to_csv(out_csv, index=False)
+
+    # Summary of every method
+    if not df.empty:
+        print(f"\n{'Method':<14}{'Mean IoU':>10}{'Min IoU':>10}{'Max |area diff| [%]':>22}{'Mean speedup':>14}")
+        for method, group in df.groupby("Method", sort=False):
+            print(f"{method:<14}{group['IoU'].mean():>10.4f}{group['IoU'].min():>10.4f}"
+                  f"{group['Area_diff_pct'].abs().max():>22.3f}{group['Speedup'].mean():>14.2f}")
+
+    print("\nSaved to:", out_csv)
+    return df
+
+
+if __name__ == "__main__":
+    mask_report(root_dir)
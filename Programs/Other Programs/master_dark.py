@@ -0,0 +1,229 @@
+"""
+Master dark-frame module
+
+This module:
+- Groups the noise (dark) frames of an experiment conducted with capture.py (f0, f1, ... of every time and
+  shutter folder) by their capture settings (ExposureTime, AnalogueGain), read from the metadata manifest of the
+  shutter folder or from the older per-image metadata (.json) files (the shutter folder name is used if there
+  is no metadata)
+- Averages all dark frames of a group into one float32 master dark frame, one frame at a time
+- Stores every master dark frame once per experiment (root_dir/master_dark) and reuses it until
+  one of its input frames is added, removed or changed
+- Works with RAW(DNG) frames (visible sensor data, through the RAW cache) and with JPEG frames
+
+Purpose:
+- Dark-frame correction with a single f0 frame adds the read noise of that frame to every result;
+  the master dark frame averages it out and is decoded only once
+- Used by apv_calculator.py, sample_diff_img_generator.py and water_diff_image_generator(raw).py
+
+Date: 2026-10
+"""
+
+import os
+import json
+import hashlib
+import cv2
+import numpy as np
+from raw_cache import read_raw_visible
+
+MASTER_DARK_DIRNAME = "master_dark"   # Folder (inside the experiment directory) of the master dark frames
+DARK_PREFIX = "f"                     # Name prefix of the noise frames (f0, f1, ...)
+GAIN_DECIMALS = 2                     # AnalogueGain is rounded before grouping
+MANIFEST_NAME = "metadata.jsonl"      # Metadata manifest of a shutter folder (one JSON object per image and line)
+
+# Master dark frames already loaded by this process, keyed by (cache_dir, name), and dark frame groups
+# of the experiments already scanned by this process (frames added later are only used after rescan_groups),
+# and manifests already read, keyed by path (with their modification time)
+_loaded = {}
+_groups = {}
+_manifests = {}
+
+
+# Load a dark frame as float32 (RAW: visible sensor data, JPEG: BGR image)
+def load_frame(path):
+    if path.lower().endswith(".dng"):
+        return read_raw_visible(path).astype(np.float32)
+
+    img = cv2.imread(path)
+    if img is None:
+        raise ValueError(f"Could not read image: {path}")
+    return img.astype(np.float32)
+
+
+# Entries of the metadata manifest of a folder, keyed by image name (f0, n0, ...).
+# Incomplete lines (capture interrupted while writing) are skipped.
+def read_manifest(folder):
+    path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+
+    mtime = os.stat(path).st_mtime_ns
+    if path in _manifests and _manifests[path][0] == mtime:
+        return _manifests[path][1]
+
+    entries = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry.get("name")] = entry
+
+    _manifests[path] = (mtime, entries)
+    return entries
+
+
+# Camera metadata of an image: from its own metadata file (f0.dng -> f0.json, older experiments)
+# or from its line in the manifest of the folder
+def frame_metadata(path):
+    json_path = os.path.splitext(path)[0] + ".json"
+    if os.path.exists(json_path):
+        with open(json_path) as f:
+            return json.load(f).get("metadata", {})
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    return read_manifest(os.path.dirname(path)).get(name, {}).get("metadata", {})
+
+
+# Capture settings (ExposureTime, AnalogueGain) of a frame from its metadata.
+# Without metadata, the shutter folder name is used as exposure time.
+def frame_settings(path):
+    metadata = frame_metadata(path)
+    exposure = metadata.get("ExposureTime")
+    gain = metadata.get("AnalogueGain")
+    if exposure is not None:
+        return int(exposure), round(float(gain), GAIN_DECIMALS) if gain is not None else None
+
+    shutter = os.path.basename(os.path.dirname(path))
+    return (int(shutter) if shutter.isdigit() else None), None
+
+
+# File name of a master dark frame
+def master_dark_name(settings, ext):
+    exposure, gain = settings
+    return f"dark_{exposure}us_gain{gain}_{ext.strip('.').lower()}"
+
+
+# Identity of the input frames (the master dark frame is rebuilt when it changes)
+def frames_identity(paths):
+    identity = []
+    for path in sorted(paths):
+        st = os.stat(path)
+        identity.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+    return identity
+
+
+# Average dark frames one at a time (only the float32 sum and one frame are kept in memory)
+def average_frames(paths):
+    total = None
+    for path in paths:
+        frame = load_frame(path)
+        if total is None:
+            total = frame
+        else:
+            total += frame
+    total /= len(paths)
+    return total
+
+
+# Return the master dark frame of the given dark frames, building it only if it is missing or outdated
+def master_dark(paths, cache_dir, name):
+    if not paths:
+        return None
+
+    key = (os.path.abspath(cache_dir), name)
+    identity = frames_identity(paths)
+
+    if key in _loaded and _loaded[key][0] == identity:
+        return _loaded[key][1]
+
+    npy_path = os.path.join(cache_dir, name + ".npy")
+    info_path = os.path.join(cache_dir, name + ".json")
+
+    dark = None
+    if os.path.exists(npy_path) and os.path.exists(info_path):
+        try:
+            with open(info_path) as f:
+                if json.load(f) == identity:
+                    dark = np.load(npy_path, mmap_mode="r")
+        except (OSError, ValueError):
+            # Damaged cache file, build again
+            dark = None
+
+    if dark is None:
+        print(f"Building master dark frame {name} from {len(paths)} frame(s)")
+        dark = average_frames(paths)
+
+        # Write to temporary files and move them into place, so other processes never read partial files
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f".{os.getpid()}.tmp"
+        with open(npy_path + tmp, "wb") as f:
+            np.save(f, dark)
+        with open(info_path + tmp, "w") as f:
+            json.dump(identity, f)
+        os.replace(npy_path + tmp, npy_path)
+        os.replace(info_path + tmp, info_path)
+
+    _loaded[key] = (identity, dark)
+    return dark
+
+
+# Group the dark frames (<time>/<shutter>/f<i>.<ext>) of an experiment by their capture settings
+def dark_frame_groups(root_dir, ext=".dng"):
+    groups = {}
+
+    for t in os.listdir(root_dir):
+        time_path = os.path.join(root_dir, t)
+        if not os.path.isdir(time_path) or not t.replace('.', '', 1).isdigit():
+            continue
+
+        for shutter in os.listdir(time_path):
+            shutter_path = os.path.join(time_path, shutter)
+            if not os.path.isdir(shutter_path) or not shutter.isdigit():
+                continue
+
+            for name in os.listdir(shutter_path):
+                stem, file_ext = os.path.splitext(name)
+                if (file_ext.lower() == ext and stem.startswith(DARK_PREFIX)
+                        and stem[len(DARK_PREFIX):].isdigit()):
+                    path = os.path.join(shutter_path, name)
+                    groups.setdefault(frame_settings(path), []).append(path)
+
+    return groups
+
+
+# Experiment directory, capture settings and all dark frames of the experiment with the same settings
+# as a dark frame of an experiment conducted with capture.py (<root_dir>/<time>/<shutter>/f0.dng)
+def dark_frame_group(noise_path):
+    root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(noise_path))))
+    ext = os.path.splitext(noise_path)[1].lower()
+    settings = frame_settings(noise_path)
+
+    if (root_dir, ext) not in _groups:
+        _groups[(root_dir, ext)] = dark_frame_groups(root_dir, ext)
+
+    return root_dir, settings, _groups[(root_dir, ext)].get(settings, [noise_path])
+
+
+# Master dark frame for a dark frame of an experiment conducted with capture.py:
+# average of all dark frames of the experiment with the same settings
+def master_dark_for(noise_path):
+    root_dir, settings, paths = dark_frame_group(noise_path)
+    ext = os.path.splitext(noise_path)[1]
+    return master_dark(paths, os.path.join(root_dir, MASTER_DARK_DIRNAME), master_dark_name(settings, ext))
+
+
+# Identity of the master dark frame of master_dark_for(noise_path) (hash of the paths, sizes and modification
+# times of its dark frames): changes when a dark frame with the same settings is added, removed or changed
+def master_dark_identity(noise_path):
+    _, _, paths = dark_frame_group(noise_path)
+    return hashlib.sha1(json.dumps(frames_identity(paths)).encode("utf-8")).hexdigest()
+
+
+# Forget the scanned dark frame groups of an experiment, so the next master_dark_for call scans it again
+# (used by programs which run while the experiment is still captured, e.g. apv_watcher.py)
+def rescan_groups(root_dir):
+    root_dir = os.path.abspath(root_dir)
+    for key in [key for key in _groups if key[0] == root_dir]:
+        del _groups[key]
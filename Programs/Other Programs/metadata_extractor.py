@@ -2,7 +2,8 @@
 Metadata extractor program
 
 This program:
-- Loads .json files from each experiment cycle
+- Loads the metadata manifest (metadata.jsonl, one line per image) of each experiment cycle,
+  or the .json file of each image for experiments captured before the manifest was introduced
 - Extracts metadata for user-selected parameters
 - Saves the extracted data to .csv files
 
@@ -20,6 +21,7 @@ import csv
 # Metadata(.json) file path
 root_dir = r"root_dir_path"
 json_names = ["f0.json", "l0.json", "n0.json"]
+manifest_name = "metadata.jsonl"
 
 # Save CSV files inside root_dir
 output_files = {
@@ -84,16 +86,31 @@ for time_dir in time_dirs:
         except ValueError:
             continue
 
+        # Read the manifest of the folder in one pass (entries keyed by image name)
+        manifest = {}
+        manifest_path = os.path.join(shutter_path, manifest_name)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    manifest[entry.get("name")] = entry
+
         for json_name in json_names:
+            image_name = os.path.splitext(json_name)[0]
             json_path = os.path.join(shutter_path, json_name)
 
-            # Data extraction for .json files that exist
-            if not os.path.isfile(json_path):
+            # Data extraction from the manifest, or from .json files that exist (older experiments)
+            if image_name in manifest:
+                data = manifest[image_name]
+            elif os.path.isfile(json_path):
+                with open(json_path) as file:
+                    data = json.load(file)
+            else:
                 continue
 
-            with open(json_path) as file:
-                data = json.load(file)
-
             m = data.get("metadata", {})
 
             row = [
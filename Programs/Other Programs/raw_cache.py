@@ -0,0 +1,124 @@
+"""
+Decoded RAW(DNG) image cache module
+
+This module:
+- Decodes RAW(DNG) images with rawpy and stores the visible sensor data (raw_image_visible)
+  as uint16 .npy files in a cache directory
+- Identifies each cached image by the path, size and modification time of its DNG file,
+  so edited or recaptured images are decoded again automatically
+- Returns cached images as read-only memory-mapped arrays (no decoding, no copy)
+- Keeps the cache below a size limit by deleting the least recently used images
+
+Purpose:
+- Speeds up repeated runs of the analysis programs (apv_calculator.py,
+  water_diff_image_generator(raw).py, etc.) when tuning their parameters,
+  since every DNG is decoded only once
+
+Date: 2026-10
+"""
+
+import os
+import hashlib
+import numpy as np
+import rawpy
+
+CACHE_ENABLED = True                 # Set to False to always decode the DNG files directly
+CACHE_DIR = os.environ.get(          # Directory in which the decoded images are stored
+    "RAW_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".raw_cache")
+)
+CACHE_MAX_BYTES = 20 * 1024 ** 3     # Maximum total size of the cache (20 GB)
+
+# Estimated total size of every cache directory used by this process: the size found by the last scan of
+# the directory plus the files written since then. The directory is only scanned again (and the least
+# recently used files deleted) when the estimate exceeds the size limit.
+_cache_bytes = {}
+
+
+# Build the cache file name from the identity (path, size, modification time) of a DNG file
+def cache_key(dng_path):
+    st = os.stat(dng_path)
+    identity = f"{os.path.abspath(dng_path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+# Decode a DNG file without using the cache
+def decode_raw_visible(dng_path):
+    with rawpy.imread(dng_path) as raw:
+        return raw.raw_image_visible.astype(np.uint16, copy=True)
+
+
+# Delete the least recently used cache files until the cache fits into max_bytes.
+# Returns the total size of the remaining cache files.
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    entries = []
+    total = 0
+
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".npy"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    # Oldest (least recently used) files first
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            # File may still be memory-mapped (Windows) or removed by another process
+            continue
+
+    return total
+
+
+# Add a newly written cache file to the estimated cache size and evict when the estimate exceeds max_bytes
+# (files written by other processes are counted by the scan of the first call and of every eviction)
+def add_to_cache_size(cache_dir, size, max_bytes):
+    key = os.path.abspath(cache_dir)
+    if key not in _cache_bytes:
+        _cache_bytes[key] = evict(cache_dir, max_bytes)
+        return
+
+    _cache_bytes[key] += size
+    if _cache_bytes[key] > max_bytes:
+        _cache_bytes[key] = evict(cache_dir, max_bytes)
+
+
+# Return the visible RAW sensor data of a DNG file, decoding it only if it is not cached yet
+def read_raw_visible(dng_path, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+
+    if not CACHE_ENABLED:
+        return decode_raw_visible(dng_path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, cache_key(dng_path) + ".npy")
+
+    # Cache hit: mark the file as recently used and memory-map it
+    if os.path.exists(cache_path):
+        try:
+            os.utime(cache_path)
+            return np.load(cache_path, mmap_mode="r")
+        except (OSError, ValueError):
+            # Damaged cache file, decode again
+            pass
+
+    # Cache miss: decode, write to a temporary file and move it into place,
+    # so other processes never read a partially written file
+    img = decode_raw_visible(dng_path)
+
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, img)
+    os.replace(tmp_path, cache_path)
+
+    add_to_cache_size(cache_dir, os.path.getsize(cache_path), max_bytes)
+
+    return img
@@ -0,0 +1,203 @@
+"""
+Per-pixel RAW time series (cube) program for experiments with the plant-based meat sample
+
+This program:
+- Loads the illuminated (n0) and noise (f0) RAW(DNG) images of one shutter speed from all time (stage) folders
+  of an experiment conducted with capture.py
+- Performs dark-frame correction (black level and noise subtraction, like apv_calculator.py) and optionally bins
+  every 2x2 Bayer block into one pixel (BINNED)
+- Stores the frames as a memory-mapped time x height x width cube (.npy) inside root_dir/raw_cube, which is only
+  rebuilt when the DNG files or the processing parameters change
+- Computes per-pixel drying kinetics over time, CHUNK_ROWS image rows at a time, so the whole cube is never
+  loaded into memory:
+  - slope: least-squares slope of the pixel value over time [a.u./min]
+  - time to plateau: first time after which the pixel stays within PLATEAU_TOLERANCE of its final change [min]
+  - relative change versus t0: (I(t) - I(t0)) / I(t0) for every time point (saved as a second cube)
+- Saves the maps as .npy files and as color-mapped PNG images
+
+Purpose:
+- Extends the 8-bit JPEG difference images of sample_diff_img_generator.py to the RAW data, so that the drying
+  kinetics of every pixel (not only the regional means of apv_calculator.py) can be inspected
+
+Date: 2026-10
+"""
+
+import os
+import json
+import cv2
+import numpy as np
+import apv_calculator as apv
+
+root_dir = r"file_path"        # Directory of the experiment
+SHUTTER = None                 # Shutter speed folder (e.g. "20000"), None = first shutter speed
+BINNED = True                  # Bin every 2x2 Bayer block into one pixel (4x smaller cube)
+CHUNK_ROWS = 64                # Image rows processed at a time by the per-pixel operations
+PLATEAU_TOLERANCE = 0.05       # Plateau: pixel within 5 % of its total change (|I(t_end) - I(t0)|) from I(t_end)
+SAVE_RELATIVE_CUBE = True      # Save the relative change of every time point (same size as the cube)
+CUBE_DIRNAME = "raw_cube"      # Output folder inside root_dir
+
+
+# Dark-frame corrected (and binned) RAW frame of a (time, shutter) folder
+def corrected_frame(root_dir, t, shutter, binned=BINNED):
+    n0_dng = os.path.join(root_dir, t, shutter, "n0.dng")
+    f0_dng = os.path.join(root_dir, t, shutter, "f0.dng")
+
+    img = apv.load_corrected_raw(n0_dng, f0_dng)
+    return apv.bin_bayer(img) if binned else img
+
+
+# Parameters and input files of a cube (the cube is rebuilt when any of them changes)
+def cube_identity(root_dir, times, shutter, binned):
+    sources = []
+    for t in times:
+        for name in ("n0.dng", "f0.dng"):
+            path = os.path.join(root_dir, t, shutter, name)
+            if os.path.exists(path):
+                st = os.stat(path)
+                sources.append([t, name, st.st_size, st.st_mtime_ns])
+
+    return {
+        "shutter": shutter,
+        "times_min": [float(t) for t in times],
+        "binned": binned,
+        "black_level": apv.BLACK_LEVEL,
+        "master_dark": apv.MASTER_DARK,
+        "sources": sources
+    }
+
+
+# Build (or reuse) the memory-mapped time x height x width cube of one shutter speed
+def build_cube(root_dir, shutter, binned=BINNED):
+    out_dir = os.path.join(root_dir, CUBE_DIRNAME)
+    os.makedirs(out_dir, exist_ok=True)
+    cube_path = os.path.join(out_dir, f"cube_{shutter}.npy")
+    info_path = os.path.join(out_dir, f"cube_{shutter}.json")
+
+    times = [t for t in apv.list_time_folders(root_dir)
+             if os.path.exists(os.path.join(root_dir, t, shutter, "n0.dng"))]
+    if not times:
+        raise ValueError(f"No n0.dng images found for shutter {shutter}")
+
+    identity = cube_identity(root_dir, times, shutter, binned)
+
+    # Reuse the existing cube if nothing has changed
+    if os.path.exists(cube_path) and os.path.exists(info_path):
+        with open(info_path) as f:
+            if json.load(f) == identity:
+                print(f"Using existing cube: {cube_path}")
+                return np.load(cube_path, mmap_mode="r"), np.array(identity["times_min"])
+
+    # Frames are written one at a time, only one frame is kept in memory
+    first = corrected_frame(root_dir, times[0], shutter, binned)
+    cube = np.lib.format.open_memmap(cube_path, mode="w+", dtype=first.dtype,
+                                     shape=(len(times),) + first.shape)
+    cube[0] = first
+
+    for i, t in enumerate(times[1:], start=1):
+        print(f"Time {t}: adding frame {i + 1}/{len(times)}")
+        cube[i] = corrected_frame(root_dir, t, shutter, binned)
+
+    cube.flush()
+    del cube
+
+    with open(info_path, "w") as f:
+        json.dump(identity, f)
+
+    return np.load(cube_path, mmap_mode="r"), np.array(identity["times_min"])
+
+
+# Least-squares slope of every pixel over time [a.u./min]
+def pixel_slope(chunk, times):
+    dt = (times - times.mean()).astype(np.float32)
+    denom = float(np.sum(dt ** 2))
+    if denom == 0:
+        return np.zeros(chunk.shape[1:], np.float32)
+
+    # sum((t - t_mean) * I(t)) / sum((t - t_mean)^2); the mean of I cancels out
+    return np.tensordot(dt, chunk, axes=(0, 0)).astype(np.float32) / denom
+
+
+# First time after which every pixel stays within the plateau tolerance of its final value [min]
+def time_to_plateau(chunk, times, tolerance=PLATEAU_TOLERANCE):
+    chunk = chunk.astype(np.float32)
+    final = chunk[-1]
+    band = tolerance * np.abs(final - chunk[0])
+
+    within = np.abs(chunk - final) <= band
+
+    # A pixel has reached its plateau at time index i if it stays within the band for all later times
+    stays = np.logical_and.accumulate(within[::-1], axis=0)[::-1]
+    return times[np.argmax(stays, axis=0)].astype(np.float32)
+
+
+# Relative change of every pixel versus the first time point (NaN where I(t0) is 0)
+def relative_change(chunk):
+    chunk = chunk.astype(np.float32)
+    ref = chunk[0]
+    out = np.full(chunk.shape, np.nan, np.float32)
+    np.divide(chunk - ref, ref, out=out, where=ref > 0)
+    return out
+
+
+# Run the per-pixel operations chunk by chunk (CHUNK_ROWS rows of all time points at a time)
+def analyze_cube(cube, times, out_dir, shutter, chunk_rows=CHUNK_ROWS, save_relative=SAVE_RELATIVE_CUBE):
+    _, h, w = cube.shape
+
+    slope = np.empty((h, w), np.float32)
+    plateau = np.empty((h, w), np.float32)
+    relative_final = np.empty((h, w), np.float32)
+
+    relative = None
+    if save_relative:
+        relative = np.lib.format.open_memmap(os.path.join(out_dir, f"relative_change_{shutter}.npy"),
+                                             mode="w+", dtype=np.float32, shape=cube.shape)
+
+    for y in range(0, h, chunk_rows):
+        chunk = np.asarray(cube[:, y:y + chunk_rows])
+
+        slope[y:y + chunk_rows] = pixel_slope(chunk, times)
+        plateau[y:y + chunk_rows] = time_to_plateau(chunk, times)
+
+        rel = relative_change(chunk)
+        relative_final[y:y + chunk_rows] = rel[-1]
+        if relative is not None:
+            relative[:, y:y + chunk_rows] = rel
+
+    if relative is not None:
+        relative.flush()
+
+    return {"slope": slope, "time_to_plateau": plateau, "relative_change_final": relative_final}
+
+
+# Save a map as a color-mapped PNG image (scaled between the 1st and 99th percentile)
+def save_color_map(path, values):
+    finite = values[np.isfinite(values)]
+    lo, hi = np.percentile(finite, (1, 99)) if finite.size else (0.0, 1.0)
+    if hi <= lo:
+        hi = lo + 1.0
+
+    scaled = np.clip((np.nan_to_num(values, nan=lo) - lo) / (hi - lo) * 255, 0, 255).astype(np.uint8)
+    cv2.imwrite(path, cv2.applyColorMap(scaled, cv2.COLORMAP_JET))
+    print(f"{os.path.basename(path)}: {lo:.4g} (blue) .. {hi:.4g} (red)")
+
+
+def raw_cube(root_dir, shutter=SHUTTER, binned=BINNED):
+    if shutter is None:
+        shutter = apv.list_shutters(root_dir, apv.list_time_folders(root_dir))[0]
+
+    cube, times = build_cube(root_dir, shutter, binned)
+    print(f"Cube: {cube.shape[0]} time points x {cube.shape[1]} x {cube.shape[2]} px ({cube.dtype})")
+
+    out_dir = os.path.join(root_dir, CUBE_DIRNAME)
+    maps = analyze_cube(cube, times, out_dir, shutter)
+
+    for name, values in maps.items():
+        np.save(os.path.join(out_dir, f"{name}_{shutter}.npy"), values)
+        save_color_map(os.path.join(out_dir, f"{name}_{shutter}.png"), values)
+
+    print("Saved to:", out_dir)
+    return maps
+
+
+if __name__ == "__main__":
+    raw_cube(root_dir)
@@ -3,7 +3,8 @@ Color-mapped difference image generator program for experiments with the plant-b
 
 This program:
 - Loads all of the illuminated (n0) and noise (f0) JPEG images from the directory in which they are stored in
-- Performs noise reduction (subtracts f0.jpeg from n0.jpeg)
+- Performs noise reduction (subtracts f0.jpeg, or the master dark frame averaged from all noise images
+  with the same capture settings (MASTER_DARK, see master_dark.py), from n0.jpeg)
 - Sets the initial(t=0) noise reduced(clean) image as a reference image and then subtracts the clean images from
   other states by this image.
 - Plots these differences using color mapping, where red pixels indicate an increase in pixel intensity(brightening)
@@ -19,10 +20,12 @@ Date 2026-03
 import os
 import cv2
 import numpy as np
+from master_dark import master_dark_for
 
 root_dir = r"C:\path\to\images"          # Directory where input images are stored
 output_dir_red = r"C:\path\to\red"      # Output path for brightened (red) area images
 output_dir_blue = r"C:\path\to\blue"    # Output path for darkened (blue) area images
+MASTER_DARK = False                     # Subtract the master dark frame instead of f0.jpg
 
 clean_images = {}
 
@@ -45,7 +48,7 @@ for time_name in sorted(os.listdir(root_dir), key=lambda x: float(x) if x.replac
         if not (os.path.exists(f0_path) and os.path.exists(n0_path)):
             continue
 
-        f0 = cv2.imread(f0_path)
+        f0 = master_dark_for(f0_path) if MASTER_DARK else cv2.imread(f0_path)
         n0 = cv2.imread(n0_path)
 
         if f0 is None or n0 is None:
@@ -0,0 +1,191 @@
+"""
+Sample shrinkage tracker program
+
+This program:
+- Loads the illuminated (n0) and noise (f0) JPEG images of every time point and shutter speed
+  of an experiment conducted with capture.py
+- Detects the sample at the first time point with the full-frame method of apv_calculator.py (get_mask)
+- Tracks the sample through the following time points starting from the previous mask: only a band of
+  TRACK_BAND pixels around the previous contour is searched, with a threshold adapted to the local contrast
+  in that band (Otsu threshold of the band pixels) instead of the fixed THRESH_VALUE
+- Falls back to the full-frame detection if the band has too little contrast or the tracked mask
+  differs too much from the previous one (MIN_CONTRAST, MIN_TRACK_IOU)
+- Saves the sample area, the area relative to the first time point and the IoU with the previous mask
+  of every time point to shrinkage.csv inside root_dir (optionally compared with the full-frame detection)
+
+Purpose:
+- Fixed thresholds can misdetect the sample edge as the surface dries; following the contour from one
+  time point to the next is more stable over long experiments and faster than a full-frame search
+
+Date: 2026-10
+"""
+
+import os
+import time
+import cv2
+import numpy as np
+import pandas as pd
+from apv_calculator import (list_time_folders, list_shutters, gray_image, get_mask, band_tiles, refine_band,
+                            GAUSSIAN_KERNEL, EDGE_KERNEL, REFINE_TILE)
+
+root_dir = r"file_path"       # Directory of the experiment
+TRACK_BAND = 16               # [px] Half width of the band around the previous contour that is searched
+MIN_CONTRAST = 10             # Minimum difference between the sample and background means in the band
+MIN_TRACK_IOU = 0.8           # Tracked masks with a lower IoU with the previous mask are detected again
+COMPARE_FULL = False          # Also run the full-frame detection at every time point (IoU and speedup)
+
+
+# Outer contour of a mask (uint8, 0/255) and the mask filled inside it (None, None for an empty mask)
+def outer_contour(mask):
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None, None
+
+    contour = max(contours, key=cv2.contourArea)
+    filled = np.zeros(mask.shape, np.uint8)
+    cv2.drawContours(filled, [contour], -1, 255, -1)
+    return filled, contour
+
+
+# Intersection over union of two uint8 masks
+def iou_u8(a, b):
+    union = cv2.countNonZero(cv2.bitwise_or(a, b))
+    return cv2.countNonZero(cv2.bitwise_and(a, b)) / union if union else 0.0
+
+
+# Track the sample starting from the mask (uint8, 0/255) and contour of the previous time point.
+# Everything is computed inside the bounding box of the previous contour (grown by the band), and only the
+# tiles which the band passes through are converted to grayscale, thresholded and refined
+# (same steps as the band refinement of apv_calculator.py).
+# Returns the new mask, its contour, the band threshold and the IoU with the previous mask
+# (mask None if the band has too little contrast).
+def track_mask(img, noise, prev_mask, prev_contour, band=TRACK_BAND):
+
+    h, w = prev_mask.shape
+    margin = max(GAUSSIAN_KERNEL) // 2 + max(EDGE_KERNEL) // 2 + 1
+
+    # Bounding box of the previous contour and the band around it
+    x, y, bw, bh = cv2.boundingRect(prev_contour)
+    x0, y0 = max(0, x - band - margin), max(0, y - band - margin)
+    x1, y1 = min(w, x + bw + band + margin), min(h, y + bh + band + margin)
+    ch, cw = y1 - y0, x1 - x0
+    contour = prev_contour - [x0, y0]
+    tiles = band_tiles(contour, (ch, cw), band, REFINE_TILE)
+
+    # Noise subtraction and grayscale conversion of the band tiles only
+    gray = np.zeros((ch, cw), np.uint8)
+    for ty0, ty1, tx0, tx1 in tiles:
+        Y0, Y1 = y0 + max(0, ty0 - margin), y0 + min(ch, ty1 + margin)
+        X0, X1 = x0 + max(0, tx0 - margin), x0 + min(cw, tx1 + margin)
+        tile_noise = noise[Y0:Y1, X0:X1] if noise is not None else None
+        gray[Y0 - y0:Y1 - y0, X0 - x0:X1 - x0] = gray_image(img[Y0:Y1, X0:X1], tile_noise)
+
+    # Pixels within "band" pixels of the previous contour
+    band_mask = np.zeros((ch, cw), np.uint8)
+    cv2.drawContours(band_mask, [contour], -1, 255, 2 * band + 1)
+    values = np.concatenate([gray[ty0:ty1, tx0:tx1][band_mask[ty0:ty1, tx0:tx1] > 0]
+                             for ty0, ty1, tx0, tx1 in tiles])
+
+    # Threshold adapted to the local contrast in the band (Otsu threshold of the band pixels)
+    threshold, _ = cv2.threshold(values.reshape(1, -1), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    bright = values > threshold
+    if bright.all() or not bright.any() or values[bright].mean() - values[~bright].mean() < MIN_CONTRAST:
+        return None, None, threshold, 0.0
+
+    # Inside the band the new threshold decides, outside of it the previous mask is kept
+    prev_crop = prev_mask[y0:y1, x0:x1]
+    crop = prev_crop.copy()
+    refine_band(gray, crop, contour, band, REFINE_TILE, threshold)
+
+    # Keep the largest outer contour (fills holes and removes small bright spots in the band)
+    crop, contour = outer_contour(crop)
+    if crop is None:
+        return None, None, threshold, 0.0
+
+    # Both masks are empty outside the bounding box, so the IoU is computed inside it
+    iou = iou_u8(crop, prev_crop)
+
+    mask = np.zeros((h, w), np.uint8)
+    mask[y0:y1, x0:x1] = crop
+    return mask, contour + [x0, y0], threshold, iou
+
+
+# Detect (full frame) or track the sample of one image pair and measure the time
+def detect(img, noise, prev_mask, prev_contour):
+    start = time.perf_counter()
+
+    if prev_mask is not None:
+        mask, contour, threshold, iou = track_mask(img, noise, prev_mask, prev_contour)
+        if mask is not None and iou >= MIN_TRACK_IOU:
+            return mask, contour, "tracked", threshold, time.perf_counter() - start
+
+    mask = get_mask(img, noise)
+    if mask is None:
+        return None, None, "full", np.nan, time.perf_counter() - start
+
+    mask, contour = outer_contour(mask.astype(np.uint8) * 255)
+    return mask, contour, "full", np.nan, time.perf_counter() - start
+
+
+def track_experiment(root_dir, compare_full=COMPARE_FULL):
+    time_folders = list_time_folders(root_dir)
+    rows = []
+
+    for shutter in list_shutters(root_dir, time_folders):
+        print(f"\nTracking shutter {shutter}")
+        prev_mask = None
+        prev_contour = None
+        area0 = None
+
+        for t in time_folders:
+            n0_jpg = os.path.join(root_dir, t, shutter, "n0.jpg")
+            f0_jpg = os.path.join(root_dir, t, shutter, "f0.jpg")
+
+            if not os.path.exists(n0_jpg):
+                continue
+
+            img = cv2.imread(n0_jpg)
+            noise = cv2.imread(f0_jpg) if os.path.exists(f0_jpg) else None
+
+            mask, contour, method, threshold, seconds = detect(img, noise, prev_mask, prev_contour)
+            if mask is None:
+                print(f"Time {t}: no sample detected")
+                continue
+
+            area = cv2.countNonZero(mask)
+            area0 = area if area0 is None else area0
+
+            row = {
+                "Time_min": float(t),
+                "Shutter_us": int(shutter),
+                "Method": method,
+                "Area_px": area,
+                "Area_ratio": area / area0,
+                "IoU_prev": iou_u8(mask, prev_mask) if prev_mask is not None else np.nan,
+                "Threshold": threshold,
+                "Time_s": seconds
+            }
+
+            # Comparison with the full-frame detection of the same images
+            if compare_full:
+                start = time.perf_counter()
+                mask_full = get_mask(img, noise)
+                time_full = time.perf_counter() - start
+                row["IoU_full"] = iou_u8(mask, mask_full.astype(np.uint8) * 255) if mask_full is not None else 0.0
+                row["Time_full_s"] = time_full
+                row["Speedup"] = time_full / seconds if seconds > 0 else np.nan
+
+            rows.append(row)
+            print(f"Time {t}: {method}, area {area} px ({100 * area / area0:.1f} %)")
+            prev_mask, prev_contour = mask, contour
+
+    df = pd.DataFrame(rows)
+    out_csv = os.path.join(root_dir, "shrinkage.csv")
+    df.to_csv(out_csv, index=False)
+
+    print("\nSaved to:", out_csv)
+    return df
+
+
+if __name__ == "__main__":
+    track_experiment(root_dir)
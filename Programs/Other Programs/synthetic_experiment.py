@@ -0,0 +1,215 @@
+"""
+Synthetic experiment generator program
+
+This program:
+- Writes an experiment directory with the same layout as capture.py:
+  <stage>/<shutter>/n{i}, f{i} and l{i} images (.jpg, .dng), the metadata manifest of every shutter folder
+  (metadata.jsonl) and <stage>/<stage>.json weights
+- Simulates a plant-based meat sample on a dark tray that shrinks and darkens while it dries,
+  sensor read noise and dark signal, lamp drift between stages and lamp flicker between frames,
+  a slowly warming sensor (growing dark signal and SensorTemperature metadata) and a noisy scale
+  (raw_samples and clean_samples like capture.py)
+- Writes the RAW images as uncompressed 10-bit Bayer (RGGB) DNG files that rawpy can read,
+  and the JPEG images from the same RAW data
+- Has configurable resolution, number of stages, shutter speeds, image counts, noise level and lamp drift
+
+Purpose:
+- Allows apv_calculator.py, metadata_extractor.py, weight_extractor.py and the other analysis programs
+  to be tested and benchmarked without the Raspberry Pi, the camera and a real sample
+
+Date: 2026-10
+"""
+
+import os
+import sys
+import json
+import cv2
+import numpy as np
+
+# dng_writer.py is in the Capture Software folder (shared with the simulated camera)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Capture Software"))
+import dng_writer
+
+root_dir = r"file_path"        # Output directory of the synthetic experiment
+
+WIDTH = 4608                   # [px] Sensor width (Raspberry Pi Camera Module 3)
+HEIGHT = 2592                  # [px] Sensor height
+STAGES = 10                    # Number of stages (time points)
+STAGE_INTERVAL = 20.0          # [min] Time between stages
+SHUTTERS = (20000,)            # [us] Shutter speeds of the illuminated and noise images
+IMAGE_COUNT = 1                # Illuminated images per shutter speed (n0..)
+NOISE_COUNT = 1                # Noise images per shutter speed (f0..)
+LED_COUNT = 1                  # LED images per shutter speed (l0.., 0 = no LED images)
+LED_EXPOSURE = 300000          # [us] Exposure time of the LED images (fixed in capture.py)
+ANALOGUE_GAIN = 1.0            # Analogue gain written to the metadata
+MANIFEST_NAME = "metadata.jsonl"   # Metadata manifest of a shutter folder (same as capture.py)
+
+BLACK_LEVEL = 64               # Sensor black level [DN]
+WHITE_LEVEL = 1023             # 10-bit saturation level [DN]
+READ_NOISE = 2.0               # [DN] Standard deviation of the read noise
+DARK_SIGNAL = 1e-4             # [DN/us] Dark signal (grows with the exposure time)
+SIGNAL = 0.03                  # [DN/us] Signal of a white surface with the lamp on
+JPEG_GAIN = 0.25               # JPEG value per RAW value above the black level
+
+SAMPLE_SIZE = 0.35             # Initial half height of the sample (fraction of the image height)
+SAMPLE_ASPECT = 1.3            # Width / height of the sample
+SHRINK = 0.015                 # Fraction of the sample size lost per stage
+SAMPLE_REFLECTANCE = 0.6       # Initial reflectance of the sample
+DARKENING = 0.02               # Fraction of the reflectance lost per stage
+TRAY_REFLECTANCE = 0.05        # Reflectance of the background (tray)
+COLOUR = (1.0, 0.75, 0.55)     # Relative reflectance of the sample in the R, G and B channels
+
+LAMP_DRIFT = -0.002            # Lamp intensity change per stage (fraction)
+LAMP_FLICKER = 0.002           # Standard deviation of the lamp intensity between frames (fraction)
+SENSOR_TEMPERATURE = 35.0      # [C] Sensor temperature at the first stage (DARK_SIGNAL is given at this temperature)
+SENSOR_WARMING = 0.1           # [C] Sensor temperature increase per stage
+DARK_DOUBLING = 6.0            # [C] Temperature increase which doubles the dark signal
+
+WEIGHT = 35.0                  # [g] Initial weight of the sample
+WEIGHT_LOSS = 0.03             # Fraction of the remaining water lost per stage
+WATER_FRACTION = 0.6           # Fraction of the initial weight that can evaporate
+SCALE_NUM = 20                 # Scale readings per stage
+SCALE_NOISE = 0.05             # [g] Standard deviation of a single scale reading
+SCALE_TRIM = 3                 # Readings removed from both ends before averaging (same as capture.py)
+
+SEED = 0                       # Random seed (same seed = same experiment)
+
+
+# Write a synthetic RAW frame as DNG file (see dng_writer.py in Capture Software, shared with the simulated camera)
+def write_dng(path, raw, black_level=BLACK_LEVEL, white_level=WHITE_LEVEL):
+    dng_writer.write_dng(path, raw, black_level, white_level, "Synthetic", "Synthetic Camera")
+
+
+# Reflectance of every sensor pixel (RGGB mosaic) at a stage: sample ellipse on the tray
+def reflectance_mosaic(stage_index, width, height, rng_texture):
+    yy, xx = np.ogrid[:height, :width]
+    size = SAMPLE_SIZE * height * (1 - SHRINK) ** stage_index
+    inside = ((yy - height / 2) / size) ** 2 + ((xx - width / 2) / (size * SAMPLE_ASPECT)) ** 2 < 1
+
+    # Reflectance of each Bayer channel (R at even rows/columns, B at odd rows/columns)
+    colour = np.empty((height, width), np.float32)
+    colour[0::2, 0::2] = COLOUR[0]
+    colour[0::2, 1::2] = COLOUR[1]
+    colour[1::2, 0::2] = COLOUR[1]
+    colour[1::2, 1::2] = COLOUR[2]
+
+    sample = SAMPLE_REFLECTANCE * (1 - DARKENING) ** stage_index * rng_texture
+    return np.where(inside, sample * colour, TRAY_REFLECTANCE).astype(np.float32)
+
+
+# Sensor temperature [C] at a stage
+def sensor_temperature(stage_index):
+    return SENSOR_TEMPERATURE + SENSOR_WARMING * stage_index
+
+
+# Simulated RAW frame [DN] for a reflectance mosaic, exposure time, lamp intensity (0 = lamp off)
+# and sensor temperature (the dark signal doubles every DARK_DOUBLING degrees)
+def raw_frame(rng, reflectance, exposure, lamp, temperature=SENSOR_TEMPERATURE):
+    dark_signal = DARK_SIGNAL * 2 ** ((temperature - SENSOR_TEMPERATURE) / DARK_DOUBLING)
+    signal = BLACK_LEVEL + dark_signal * exposure + SIGNAL * exposure * lamp * reflectance
+    signal += rng.normal(0, READ_NOISE, reflectance.shape).astype(np.float32)
+    return np.clip(np.rint(signal), 0, WHITE_LEVEL).astype(np.uint16)
+
+
+# JPEG image of a RAW frame (black level removal, gain and demosaicing)
+def jpeg_image(raw):
+    mosaic = np.clip((raw.astype(np.float32) - BLACK_LEVEL) * JPEG_GAIN, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(mosaic, cv2.COLOR_BayerBG2BGR)     # OpenCV calls the RGGB pattern "BG"
+
+
+# Metadata of an image in the format written by capture.py
+def metadata(exposure, stage_index, frame_index, lamp, requested, image_count):
+    return {
+        "image_count": image_count,
+        "requested": requested,
+        "metadata": {
+            "ExposureTime": int(exposure),
+            "AnalogueGain": ANALOGUE_GAIN,
+            "DigitalGain": 1.0,
+            "ColourGains": [1.0, 1.0],
+            "ColourTemperature": 3000 if lamp else 0,
+            "Lux": round(400.0 * lamp, 3),
+            "FocusFoM": 1000 + stage_index,
+            "LensPosition": 1.0,
+            "SensorTemperature": round(sensor_temperature(stage_index), 2),
+            "SensorTimestamp": int((stage_index * STAGE_INTERVAL * 60 + frame_index) * 1e9)
+        }
+    }
+
+
+# Save one image (.jpg, .dng and its line of the metadata manifest) of a shutter folder
+def save_image(folder, name, raw, meta):
+    cv2.imwrite(os.path.join(folder, f"{name}.jpg"), jpeg_image(raw))
+    write_dng(os.path.join(folder, f"{name}.dng"), raw)
+    with open(os.path.join(folder, MANIFEST_NAME), "a") as f:
+        f.write(json.dumps(dict(name=name, **meta)) + "\n")
+
+
+# Scale readings and the weight file of a stage (same structure as capture.py)
+def save_weight(stage_folder, stage, stage_index, rng):
+    weight = WEIGHT * (1 - WATER_FRACTION * (1 - (1 - WEIGHT_LOSS) ** stage_index))
+    samples = list(weight + rng.normal(0, SCALE_NOISE, SCALE_NUM))
+    clean_samples = sorted(samples)[SCALE_TRIM:-SCALE_TRIM]
+
+    with open(os.path.join(stage_folder, f"{stage}.json"), "w") as f:
+        json.dump(
+            {
+                "Weight(g)": round(abs(sum(clean_samples) / len(clean_samples)), 2),
+                "Scale": {
+                    "num_samples": SCALE_NUM,
+                    "trim": SCALE_TRIM,
+                    "delay_s": 0.2,
+                    "raw_samples": samples,
+                    "clean_samples": clean_samples
+                }
+            },
+            f,
+            indent=4
+        )
+
+
+def generate_experiment(root_dir, width=WIDTH, height=HEIGHT, stages=STAGES, shutters=SHUTTERS,
+                        image_count=IMAGE_COUNT, noise_count=NOISE_COUNT, led_count=LED_COUNT, seed=SEED):
+    rng = np.random.default_rng(seed)
+
+    # Surface texture of the sample (fixed over the experiment)
+    texture = (1 + 0.05 * rng.standard_normal((height, width))).astype(np.float32)
+    texture = cv2.GaussianBlur(texture, (0, 0), 3)
+
+    for i in range(stages):
+        stage = float(i * STAGE_INTERVAL)
+        stage_folder = os.path.join(root_dir, str(stage))
+        os.makedirs(stage_folder, exist_ok=True)
+        print(f"Stage {i + 1}/{stages}: {stage} min")
+
+        save_weight(stage_folder, stage, i, rng)
+        reflectance = reflectance_mosaic(i, width, height, texture)
+        lamp = 1 + LAMP_DRIFT * i
+        temperature = sensor_temperature(i)
+
+        for shutter in shutters:
+            folder = os.path.join(stage_folder, str(shutter))
+            os.makedirs(folder, exist_ok=True)
+            requested = {"ExposureTime": shutter, "AnalogueGain": ANALOGUE_GAIN,
+                         "ColourGains": [1.0, 1.0], "LensPosition": 1.0}
+
+            # Noise images (lamp off), LED images and illuminated images, in the order of capture.py
+            for k in range(noise_count):
+                save_image(folder, f"f{k}", raw_frame(rng, reflectance, shutter, 0.0, temperature),
+                           metadata(shutter, i, k, 0.0, requested, noise_count))
+
+            for k in range(led_count):
+                led = 0.02 * (1 + rng.normal(0, LAMP_FLICKER))
+                save_image(folder, f"l{k}", raw_frame(rng, reflectance, LED_EXPOSURE, led, temperature),
+                           metadata(LED_EXPOSURE, i, k, led, {}, led_count))
+
+            for k in range(image_count):
+                frame_lamp = lamp * (1 + rng.normal(0, LAMP_FLICKER))
+                save_image(folder, f"n{k}", raw_frame(rng, reflectance, shutter, frame_lamp, temperature),
+                           metadata(shutter, i, k, frame_lamp, requested, image_count))
+
+    print("Synthetic experiment saved in:", root_dir)
+
+
+if __name__ == "__main__":
+    generate_experiment(root_dir)
@@ -0,0 +1,89 @@
+"""
+Test of apv_watcher.py against apv_calculator.py
+
+This test:
+- Generates a small synthetic experiment (synthetic_experiment.py) and copies it stage by stage into
+  the watched directory, as capture.py would write it
+- Processes the complete folders with the watcher after every stage
+- Compares the watcher row of the last stage with the row of the batch program for the same stage
+  (both use the master dark frame of the noise frames of all stages)
+
+Usage:
+    python -m pytest test_apv_watcher.py
+
+Date: 2026-10
+"""
+
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+import apv_calculator as apv
+import apv_watcher
+import master_dark
+import raw_cache
+import synthetic_experiment as syn
+
+WIDTH = 576                # [px] Image size of the synthetic experiment (small to keep the test fast)
+HEIGHT = 324
+STAGES = 3
+
+
+def test_watcher_row_matches_batch_row(tmp_path, monkeypatch):
+    # Decode the DNG files directly, nothing is written to the RAW cache of the user
+    monkeypatch.setattr(raw_cache, "CACHE_ENABLED", False)
+
+    source = str(tmp_path / "source")
+    watched = str(tmp_path / "watched")
+    os.makedirs(watched)
+    syn.generate_experiment(source, width=WIDTH, height=HEIGHT, stages=STAGES, noise_count=2)
+
+    # Sample area limits are set for the full sensor size
+    area_scale = WIDTH * HEIGHT / (syn.WIDTH * syn.HEIGHT)
+    monkeypatch.setattr(apv, "AREA_MIN", apv.AREA_MIN * area_scale)
+    monkeypatch.setattr(apv, "AREA_MAX", apv.AREA_MAX * area_scale)
+    monkeypatch.setattr(apv, "MASTER_DARK", True)
+
+    # Stages appear one after another while the watcher is running
+    out_csv = os.path.join(watched, apv.OUT_CSV_NAME)
+    done, masks = set(), {}
+    for t in apv.list_time_folders(source):
+        shutil.copytree(os.path.join(source, t), os.path.join(watched, t))
+        apv_watcher.process_ready(watched, out_csv, done, masks, time.time() + apv_watcher.SETTLE_TIME)
+
+    watcher_rows = pd.read_csv(out_csv)
+    assert len(watcher_rows) == STAGES
+
+    # The batch program runs in a new process (no dark frame groups scanned before)
+    monkeypatch.setattr(master_dark, "_groups", {})
+    batch_rows = pd.DataFrame(apv.process_experiment(watched, num_workers=1, incremental=False))
+    last = watcher_rows["Time_min"].max()
+    watcher_row = watcher_rows[watcher_rows["Time_min"] == last].iloc[0]
+    batch_row = batch_rows[batch_rows["Time_min"] == last].iloc[0]
+
+    assert list(watcher_rows.columns) == list(batch_rows.columns)
+    np.testing.assert_allclose(watcher_row.to_numpy(float), batch_row.to_numpy(float), rtol=1e-9, equal_nan=True)
+
+
+def test_averaged_folder_waits_for_all_frames(tmp_path, monkeypatch):
+    monkeypatch.setattr(raw_cache, "CACHE_ENABLED", False)
+    monkeypatch.setattr(apv, "AVERAGE_FRAMES", True)
+    source = str(tmp_path / "source")
+    syn.generate_experiment(source, width=WIDTH, height=HEIGHT, stages=1, image_count=3)
+
+    # Only the first of the three frames has been captured (the manifest line of every frame exists)
+    t = apv.list_time_folders(source)[0]
+    shutter = apv.list_shutters(source, [t])[0]
+    folder = os.path.join(source, t, shutter)
+    later = {name: os.path.join(str(tmp_path), name) for name in os.listdir(folder) if name[:2] in ("n1", "n2")}
+    for name, path in later.items():
+        shutil.move(os.path.join(folder, name), path)
+
+    now = time.time() + apv_watcher.SETTLE_TIME
+    assert apv_watcher.expected_frames(folder) == 3
+    assert not apv_watcher.is_complete(folder, now)
+
+    for name, path in later.items():
+        shutil.move(path, os.path.join(folder, name))
+    assert apv_watcher.is_complete(folder, now)
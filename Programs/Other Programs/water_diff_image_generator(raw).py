@@ -3,7 +3,9 @@ Fixed-scale difference color map program for reflectance and transmittance water
 
 This program:
 - Loads RAW(DNG format) water cell(with and without water) and noise images
-- Subtracts noise from the water cell images (performs dark-mage correction)
+- Subtracts noise from the water cell images (performs dark-mage correction), either the f0 image of each
+  volume folder or the master dark frame averaged from the f0 images of all volume folders of the same
+  exposure time (MASTER_DARK, cached in root_dir/master_dark, see master_dark.py)
 - Computes the difference between different states of the water cell
 - Plots these differences using color mapping, where red pixels indicate a decrease in
   light intensity, blue pixels indicate an increase in light intensity, and white pixels indicate no change
@@ -17,23 +19,34 @@ Date: 2026-02
 
 import os
 import numpy as np
-import rawpy
 import matplotlib.pyplot as plt
 from matplotlib.colors import TwoSlopeNorm
+from raw_cache import read_raw_visible
+from master_dark import master_dark, MASTER_DARK_DIRNAME
 
 root_dir = r"file_path" # Directory in which the images are saved in
 main_folders = ["50000", "100000", "150000"] # Folders used, which were named based on the exposure times
+MASTER_DARK = False # Subtract the master dark frame of each exposure time instead of the f0 image of the folder
 
 # Read DNG images and convert their pixel values to float for subtraction
 def read_dng_gray_float(path):
     if not os.path.exists(path):
         raise FileNotFoundError(f"Missing file: {path}")
-    with rawpy.imread(path) as raw:
-        raw_img = raw.raw_image_visible.astype(np.float32)
+    raw_img = read_raw_visible(path).astype(np.float32) # Decoded once and then read from the RAW cache
     if raw_img.ndim == 3:
         raw_img = raw_img.mean(axis=2)
     return raw_img
 
+# Master dark frame of an exposure time: average of the noise images (f0) of all volume folders
+def master_dark_exposure(main_folder):
+    main_path = os.path.join(root_dir, main_folder)
+    f_paths = [os.path.join(main_path, vol_folder, main_folder, "f0.dng")
+               for vol_folder in sorted(os.listdir(main_path))]
+    f_paths = [p for p in f_paths if os.path.exists(p)]
+    if not f_paths:
+        raise FileNotFoundError(f"No noise images found in: {main_path}")
+    return master_dark(f_paths, os.path.join(root_dir, MASTER_DARK_DIRNAME), f"dark_{main_folder}us_dng")
+
 # Perform dark-frame correction (illuminated image (w0) minus dark image (f0))
 def corrected_image_dng(main_folder, vol_folder):
     inner_dir = os.path.join(root_dir, main_folder, vol_folder, main_folder)
@@ -41,7 +54,7 @@ def corrected_image_dng(main_folder, vol_folder):
     f_path = os.path.join(inner_dir, "f0.dng") # Path of the noise image(non-illuminated image)
 
     w = read_dng_gray_float(w_path)
-    f = read_dng_gray_float(f_path)
+    f = master_dark_exposure(main_folder) if MASTER_DARK else read_dng_gray_float(f_path)
 
     return w - f
 